@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Columnar Note Extractor
+Streams a set's MIDI clips into flat note, clip and track columns
+
+Auditing finished sets (chord usage, note density per track, clip
+lengths) used to mean walking an ElementTree with one Python object per
+note. extract_notes() instead runs expat over the decompressed stream in
+chunks, like als_stream.py, but keeps no elements at all: each
+MidiNoteEvent becomes one row appended to typed arrays.
+
+    notes   track u16, clip u32, time f64, pitch u8, duration f64,
+            velocity f32, enabled u8
+    clips   track u16, location u8 (0 session, 1 arrangement, 2 other,
+            e.g. take lanes), slot i32 (-1 outside the session), time f64,
+            start f64, end f64, loop_start f64, loop_end f64, looped u8,
+            color i16, name, note_index u32[n+1]
+    tracks  kind ('MidiTrack', 'AudioTrack', ...), name, color i16,
+            clip_index u32[n+1]
+
+Note times are in beats from the clip's start, as Live stores them.
+Index arrays are prefix offsets: clip i's notes are rows
+note_index[i]:note_index[i+1], and likewise for a track's clips. Only
+clips on tracks under LiveSet/Tracks are read (not the groove pool).
+
+With NumPy installed the columns are NumPy arrays (zero-copy views of
+the typed arrays), so a whole library of sets can be audited with
+vectorized operations; without it they stay array.array.
+"""
+
+import argparse
+import gzip
+import json
+import sys
+import xml.parsers.expat
+from array import array
+from collections import Counter
+from pathlib import Path
+
+from als_stream import CHUNK_SIZE, read_chunks
+
+try:
+    import numpy as np
+except ImportError:  # optional; columns stay array.array
+    np = None
+
+TRACK_TAGS = {'MidiTrack', 'AudioTrack', 'GroupTrack', 'ReturnTrack'}
+SESSION, ARRANGEMENT, OTHER = 0, 1, 2
+PITCH_NAMES = ('C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B')
+
+NOTE_COLUMNS = (('track', 'H'), ('clip', 'I'), ('time', 'd'), ('pitch', 'B'),
+                ('duration', 'd'), ('velocity', 'f'), ('enabled', 'B'))
+CLIP_COLUMNS = (('track', 'H'), ('location', 'B'), ('slot', 'i'), ('time', 'd'),
+                ('start', 'd'), ('end', 'd'), ('loop_start', 'd'), ('loop_end', 'd'),
+                ('looped', 'B'), ('color', 'h'), ('note_index', 'I'))
+TRACK_COLUMNS = (('color', 'h'), ('clip_index', 'I'))
+
+
+class SetNotes:
+    """Note, clip and track columns of one set (dicts of name -> column)"""
+
+    def __init__(self, path, notes, clips, tracks):
+        self.path = path
+        self.notes = notes
+        self.clips = clips
+        self.tracks = tracks
+
+    @property
+    def note_count(self):
+        return len(self.notes['time'])
+
+    @property
+    def clip_count(self):
+        return len(self.clips['time'])
+
+    def clip_notes(self, clip):
+        """The note columns sliced to one clip"""
+        start, end = self.clips['note_index'][clip], self.clips['note_index'][clip + 1]
+        return {name: column[start:end] for name, column in self.notes.items()}
+
+    def as_numpy(self):
+        """Columns as NumPy arrays sharing the typed arrays' memory"""
+        if np is None:
+            raise RuntimeError("NumPy is not installed")
+
+        def columns(table):
+            return {name: (np.frombuffer(column, dtype=np.dtype(column.typecode))
+                           if isinstance(column, array) else np.array(column))
+                    for name, column in table.items()}
+        return SetNotes(self.path, columns(self.notes), columns(self.clips),
+                        columns(self.tracks))
+
+
+class _Extractor:
+    """expat handlers tracking just enough context to place each note"""
+
+    def __init__(self):
+        self.notes = {name: array(code) for name, code in NOTE_COLUMNS}
+        self.clips = {name: array(code) for name, code in CLIP_COLUMNS}
+        self.clips['name'] = []
+        self.clips['note_index'].append(0)
+        self.tracks = {name: array(code) for name, code in TRACK_COLUMNS}
+        self.tracks['kind'] = []
+        self.tracks['name'] = []
+        self.tracks['clip_index'].append(0)
+
+        self.depth = 0
+        self.in_tracks = False
+        self.track = None           # index of the open track
+        self.track_name = False     # inside the track's own <Name>
+        self.session_depth = self.arranger_depth = None
+        self.slot = -1
+        self.clip = None            # index of the open clip
+        self.clip_depth = None
+        self.key_start = None       # first note row of the open KeyTrack
+        self.key = 0
+
+    def start(self, tag, attrs):
+        depth = self.depth
+        self.depth += 1
+        if self.track is None:
+            if depth == 2 and tag == 'Tracks':
+                self.in_tracks = True
+            elif depth == 3 and self.in_tracks and tag in TRACK_TAGS:
+                self.track = len(self.tracks['kind'])
+                self.tracks['kind'].append(tag)
+                self.tracks['name'].append('')
+                self.tracks['color'].append(-1)
+            return
+
+        if self.clip is not None:
+            if tag == 'MidiNoteEvent':
+                notes = self.notes
+                notes['time'].append(float(attrs['Time']))
+                notes['pitch'].append(0)
+                notes['duration'].append(float(attrs['Duration']))
+                notes['velocity'].append(float(attrs.get('Velocity', 100)))
+                notes['enabled'].append(attrs.get('IsEnabled', 'true') == 'true')
+            elif tag == 'KeyTrack':
+                self.key_start = len(self.notes['time'])
+                self.key = 0
+            elif tag == 'MidiKey':
+                self.key = int(attrs['Value'])
+            elif depth == self.clip_depth + 1:
+                self._clip_field(tag, attrs)
+            elif depth == self.clip_depth + 2 and tag in ('LoopStart', 'LoopEnd', 'LoopOn'):
+                self._clip_field(tag, attrs)
+        elif tag == 'MidiClip':
+            self._open_clip(depth, attrs)
+        elif depth == 4:
+            if tag == 'Name':
+                self.track_name = True
+            elif tag == 'Color':
+                self.tracks['color'][self.track] = int(attrs['Value'])
+        elif depth == 5 and self.track_name and tag == 'EffectiveName':
+            self.tracks['name'][self.track] = attrs['Value']
+        elif tag == 'ClipSlotList':
+            self.session_depth = depth
+            self.slot = -1
+        elif tag == 'ClipSlot' and self.session_depth == depth - 1:
+            self.slot += 1
+        elif tag == 'ArrangerAutomation':
+            self.arranger_depth = depth
+
+    def _open_clip(self, depth, attrs):
+        clips = self.clips
+        self.clip = len(clips['time'])
+        self.clip_depth = depth
+        if self.session_depth is not None:
+            location, slot = SESSION, self.slot
+        else:
+            location, slot = (ARRANGEMENT if self.arranger_depth is not None else OTHER), -1
+        clips['track'].append(self.track)
+        clips['location'].append(location)
+        clips['slot'].append(slot)
+        clips['time'].append(float(attrs.get('Time', 0)))
+        for name in ('start', 'end', 'loop_start', 'loop_end'):
+            clips[name].append(0.0)
+        clips['looped'].append(0)
+        clips['color'].append(-1)
+        clips['name'].append('')
+
+    _CLIP_FIELDS = {'CurrentStart': 'start', 'CurrentEnd': 'end',
+                    'LoopStart': 'loop_start', 'LoopEnd': 'loop_end'}
+
+    def _clip_field(self, tag, attrs):
+        clips, clip = self.clips, self.clip
+        if tag in self._CLIP_FIELDS:
+            clips[self._CLIP_FIELDS[tag]][clip] = float(attrs['Value'])
+        elif tag == 'LoopOn':
+            clips['looped'][clip] = attrs['Value'] == 'true'
+        elif tag == 'Name':
+            clips['name'][clip] = attrs['Value']
+        elif tag == 'Color':
+            clips['color'][clip] = int(attrs['Value'])
+
+    def end(self, tag):
+        self.depth -= 1
+        depth = self.depth
+        if self.clip is not None:
+            if tag == 'KeyTrack' and self.key_start is not None:
+                pitch = self.notes['pitch']
+                count = len(pitch) - self.key_start
+                pitch[self.key_start:] = array('B', [self.key]) * count
+                self.key_start = None
+            elif depth == self.clip_depth:
+                # track, clip (and pitch, per KeyTrack) are filled in bulk
+                notes = self.notes
+                count = len(notes['time']) - len(notes['clip'])
+                notes['track'].extend(array('H', [self.track]) * count)
+                notes['clip'].extend(array('I', [self.clip]) * count)
+                self.clips['note_index'].append(len(notes['time']))
+                self.clip = self.clip_depth = None
+        elif self.track is not None:
+            if depth == 3:
+                self.tracks['clip_index'].append(len(self.clips['time']))
+                self.track = None
+            elif depth == 4 and tag == 'Name':
+                self.track_name = False
+            elif depth == self.session_depth:
+                self.session_depth = None
+            elif depth == self.arranger_depth:
+                self.arranger_depth = None
+        elif depth == 2 and tag == 'Tracks':
+            self.in_tracks = False
+
+
+def extract_notes(path, chunk_size=CHUNK_SIZE, numpy=True):
+    """Stream a gzipped .als into a SetNotes
+
+    Columns are NumPy arrays when NumPy is installed and numpy is set,
+    array.array otherwise (names and kinds are lists either way).
+    """
+    extractor = _Extractor()
+    parser = xml.parsers.expat.ParserCreate()
+    parser.StartElementHandler = extractor.start
+    parser.EndElementHandler = extractor.end
+    with gzip.open(path, 'rb') as f:
+        for data in read_chunks(f, chunk_size):
+            parser.Parse(data, False)
+    parser.Parse(b'', True)
+    result = SetNotes(str(path), extractor.notes, extractor.clips, extractor.tracks)
+    return result.as_numpy() if numpy and np is not None else result
+
+
+def summarize(set_notes):
+    """Per-track note and clip counts, note density and pitch-class usage
+
+    Works on either column type; clip lengths are end - start in beats.
+    """
+    notes, clips, tracks = set_notes.notes, set_notes.clips, set_notes.tracks
+    per_track = Counter(int(t) for t in notes['track'])
+    beats = Counter()
+    for track, start, end in zip(clips['track'], clips['start'], clips['end']):
+        beats[int(track)] += max(0.0, float(end) - float(start))
+    summary = {'file': set_notes.path, 'tracks': [], 'notes': set_notes.note_count,
+               'clips': set_notes.clip_count}
+    for index, (kind, name) in enumerate(zip(tracks['kind'], tracks['name'])):
+        first, last = int(tracks['clip_index'][index]), int(tracks['clip_index'][index + 1])
+        summary['tracks'].append({
+            'track': index, 'kind': kind, 'name': name, 'clips': last - first,
+            'notes': per_track[index], 'clip_beats': beats[index],
+            'notes_per_beat': per_track[index] / beats[index] if beats[index] else 0.0,
+        })
+    pitch_classes = Counter(int(p) % 12 for p in notes['pitch'])
+    summary['pitch_classes'] = {PITCH_NAMES[pc]: pitch_classes[pc] for pc in range(12)}
+    return summary
+
+
+def save_npz(set_notes, path):
+    """Write every column to one compressed .npz (note_*, clip_*, track_*)"""
+    if np is None:
+        raise RuntimeError("NumPy is not installed; --npz needs it")
+    set_notes = set_notes if not isinstance(set_notes.notes['time'], array) \
+        else set_notes.as_numpy()
+    columns = {}
+    for prefix, table in (('note', set_notes.notes), ('clip', set_notes.clips),
+                          ('track', set_notes.tracks)):
+        for name, column in table.items():
+            columns[f'{prefix}_{name}'] = np.asarray(column)
+    np.savez_compressed(path, **columns)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Power Trio Arranger - Columnar Note Extractor")
+    parser.add_argument('sets', nargs='+', help=".als files")
+    parser.add_argument('--npz', metavar='DIR', help="write <set>.npz columns (needs NumPy)")
+    parser.add_argument('--json', action='store_true', help="print summaries as JSON")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    summaries = []
+    for path in args.sets:
+        try:
+            set_notes = extract_notes(path, numpy=False)
+            if args.npz:
+                Path(args.npz).mkdir(parents=True, exist_ok=True)
+                save_npz(set_notes, Path(args.npz) / (Path(path).stem + '.npz'))
+        except (OSError, EOFError, xml.parsers.expat.ExpatError, RuntimeError) as e:
+            print(f"❌ {path}: {e}")
+            return 1
+        summaries.append(summarize(set_notes))
+
+    if args.json:
+        print(json.dumps(summaries, indent=2, ensure_ascii=False))
+        return 0
+    for summary in summaries:
+        print(f"\n🎼 {summary['file']}: {summary['notes']} note(s) in {summary['clips']} clip(s)")
+        for track in summary['tracks']:
+            if track['clips']:
+                print(f"   {track['track'] + 1}. {track['name'] or track['kind']}: "
+                      f"{track['clips']} clip(s), {track['notes']} note(s), "
+                      f"{track['notes_per_beat']:.2f} notes/beat")
+        used = {pc: n for pc, n in summary['pitch_classes'].items() if n}
+        if used:
+            print("   Pitch classes: " + ', '.join(f"{pc} {n}" for pc, n in used.items()))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Byte-level .als Patch Engine
+Applies a declarative list of edits to a gunzipped set in one pass
+
+Edits are plain dicts:
+
+    {"track": 0, "name": "1-Chord Lab", "annotation": "...", "color": "10"}
+    {"root": "Creator", "value": "Power Trio Arranger"}
+
+A single compiled regex walks the raw XML bytes once. Each match either
+starts a new track (MidiTrack/AudioTrack/ReturnTrack/GroupTrack under
+LiveSet/Tracks), or is a Value="..." attribute that belongs to the current
+track's header. Ableton writes the track header (Name, Color,
+TrackUnfolded) before the DeviceChain, so the first occurrence after a
+track's start tag is the track's own field. Replacements are collected as
+(start, end, bytes) spans and written out as memoryview slices, so the
+document is never rebuilt as a string and the cost is linear in the set
+size regardless of how many tracks are renamed.
+"""
+
+import re
+from xml.sax.saxutils import escape, unescape
+
+# Edit key -> header element holding the track's Value attribute
+TRACK_FIELDS = {
+    'name': 'EffectiveName',
+    'user_name': 'UserName',
+    'annotation': 'Annotation',
+    'color': 'Color',
+    'unfolded': 'TrackUnfolded',
+}
+
+TRACK_TAGS = ('MidiTrack', 'AudioTrack', 'ReturnTrack', 'GroupTrack')
+
+_ATTR_ENTITIES = {'"': '&quot;', '\n': '&#10;', '\t': '&#09;'}
+_UNESCAPE_ENTITIES = {'&quot;': '"', '&#10;': '\n', '&#09;': '\t'}
+
+_PATTERN = re.compile(
+    rb'<(?P<track>' + b'|'.join(t.encode() for t in TRACK_TAGS) + rb')[\s>]'
+    rb'|<(?P<field>' + b'|'.join(f.encode() for f in TRACK_FIELDS.values()) +
+    rb') Value="(?P<value>[^"]*)"'
+)
+
+_ROOT_TAG = re.compile(rb'<Ableton\b[^>]*>')
+
+
+class AlsPatchError(Exception):
+    """Raised for malformed edit lists"""
+
+
+def encode_value(value):
+    """Escape a Python value for use inside a Value="..." attribute"""
+    if isinstance(value, bool):
+        value = 'true' if value else 'false'
+    return escape(str(value), _ATTR_ENTITIES).encode('utf-8')
+
+
+def decode_value(raw):
+    """Inverse of encode_value, for reporting old values"""
+    return unescape(bytes(raw).decode('utf-8'), _UNESCAPE_ENTITIES)
+
+
+def compile_edits(edits):
+    """Group a declarative edit list into per-track and root-attribute maps"""
+    tracks = {}
+    root = {}
+    for edit in edits:
+        if 'track' in edit:
+            fields = tracks.setdefault(int(edit['track']), {})
+            for key, value in edit.items():
+                if key == 'track':
+                    continue
+                if key not in TRACK_FIELDS:
+                    raise AlsPatchError(f"Unknown track field '{key}'")
+                fields[TRACK_FIELDS[key].encode()] = (key, encode_value(value))
+        elif 'root' in edit:
+            root[edit['root']] = encode_value(edit['value'])
+        else:
+            raise AlsPatchError(f"Edit has neither 'track' nor 'root': {edit}")
+    return tracks, root
+
+
+def plan_patch(data, edits):
+    """Scan data once and return (spans, report)
+
+    spans is a sorted list of (start, end, replacement) byte ranges.
+    report lists every applied edit as dicts with old and new values.
+    """
+    tracks, root = compile_edits(edits)
+    spans = []
+    report = []
+
+    pos = 0
+    if root:
+        tag = _ROOT_TAG.search(data)
+        if tag is None:
+            raise AlsPatchError("Root <Ableton> tag not found")
+        pos = tag.end()
+        for attr, value in root.items():
+            m = re.compile(rb'\s' + re.escape(attr.encode()) + rb'="([^"]*)"').search(
+                data, tag.start(), tag.end())
+            if m is None:
+                spans.append((tag.end() - 1, tag.end() - 1,
+                              b' ' + attr.encode() + b'="' + value + b'"'))
+                old = None
+            else:
+                spans.append((m.start(1), m.end(1), value))
+                old = decode_value(m.group(1))
+            report.append({'root': attr, 'old': old, 'new': decode_value(value)})
+
+    if not tracks:
+        return sorted(spans), report
+
+    last_track = max(tracks)
+    index = -1
+    pending = {}
+    for m in _PATTERN.finditer(data, pos):
+        if m.group('track'):
+            index += 1
+            if index > last_track:
+                break
+            pending = dict(tracks.get(index, {}))
+            continue
+        field = m.group('field')
+        if field not in pending:
+            continue
+        key, value = pending.pop(field)
+        spans.append((m.start('value'), m.end('value'), value))
+        report.append({'track': index, 'field': key,
+                       'old': decode_value(m.group('value')),
+                       'new': decode_value(value)})
+        if not pending and index == last_track:
+            break
+
+    return sorted(spans), report
+
+
+def iter_patched(data, spans):
+    """Yield memoryview slices of data with spans substituted"""
+    view = memoryview(data)
+    pos = 0
+    for start, end, replacement in spans:
+        yield view[pos:start]
+        yield replacement
+        pos = end
+    yield view[pos:]
+
+
+def patch_als_bytes(data, edits, output):
+    """Apply edits to raw set XML, writing the result to a binary stream
+
+    Returns the report from plan_patch.
+    """
+    spans, report = plan_patch(data, edits)
+    for part in iter_patched(data, spans):
+        output.write(part)
+    return report
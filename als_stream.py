@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Streaming .als Reader/Writer
+Rewrites Ableton Live sets without loading the whole document
+
+An .als file is a gzipped XML document. Production sets reach 50-200 MB
+uncompressed, so instead of gunzip -> ET.fromstring -> ET.tostring -> gzip
+this module feeds the decompressed stream through expat in fixed-size
+chunks and copies every byte outside the rewritten containers straight to
+the output. Only the direct children of a registered container (for
+example each track under LiveSet/Tracks) are materialized, one at a time,
+as ElementTree elements.
+
+Memory ceiling
+--------------
+Peak memory is bounded by
+
+    chunk_size + max_element_bytes * ~10
+
+independent of the total set size: one read chunk, the raw bytes of the
+child element currently being rewritten, and its parsed ElementTree form
+(roughly ten times the raw size). With the defaults (1 MB chunks, 64 MB
+element limit) that is well under 1 GB even for the largest single track
+we have seen; ordinary tracks are a few hundred KB. A child larger than
+max_element_bytes raises AlsStreamError instead of growing without bound.
+"""
+
+import gzip
+import itertools
+import xml.parsers.expat
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+from atomic_file import AtomicOutput
+from gzip_writer import DEFAULT_LEVEL, GzipBlockWriter
+from profiling import NULL_PROFILER
+
+CHUNK_SIZE = 1 << 20            # 1 MB of decompressed XML per read
+MAX_ELEMENT_BYTES = 64 << 20    # largest single child element we will buffer
+
+_ATTR_ENTITIES = {'"': '&quot;', '\n': '&#10;', '\t': '&#09;'}
+
+
+class AlsStreamError(Exception):
+    """Raised when a set cannot be streamed within the memory ceiling"""
+
+
+class ContainerRewrite:
+    """Callbacks applied to the direct children of one container element
+
+    on_child(elem) returns an iterable of elements to write in place of
+    elem (an empty list drops it). on_close() returns an iterable of
+    elements appended just before the container's closing tag; it may be
+    a generator, items are serialized and written one at a time. Either
+    callback may also yield already-serialized bytes.
+    """
+
+    def __init__(self, on_child=None, on_close=None):
+        self.on_child = on_child or (lambda elem: [elem])
+        self.on_close = on_close or (lambda: [])
+
+
+def _tag_end(buf, pos):
+    """Return the offset just past the '>' of the tag starting at pos"""
+    quote = None
+    i = pos
+    n = len(buf)
+    while i < n:
+        c = buf[i]
+        if quote is not None:
+            if c == quote:
+                quote = None
+        elif c in (0x22, 0x27):  # " or '
+            quote = c
+        elif c == 0x3E:  # >
+            return i + 1
+        i += 1
+    raise AlsStreamError(f"Unterminated tag at byte {pos}")
+
+
+def serialize_element(elem):
+    """Serialize a single element without its tail"""
+    if isinstance(elem, (bytes, bytearray, memoryview)):
+        return elem
+    elem.tail = None
+    return ET.tostring(elem, encoding='utf-8')
+
+
+class AlsStream:
+    """Incremental expat pass over a decompressed .als byte stream
+
+    Bytes outside the registered containers are copied to `output`
+    unchanged. Direct children of each container are cut out of the
+    stream, parsed with ET.fromstring and handed to the container's
+    callbacks. With output=None the stream is read-only and parsed
+    children are collected in self.ready for the caller to consume.
+
+    attr_overrides maps element paths ('' for the root tag) to attributes
+    rewritten on that element's start tag. Start-tag attributes of every
+    path in `watch` are recorded in self.values.
+    """
+
+    def __init__(self, containers, output=None, root_attrs=None,
+                 max_element_bytes=MAX_ELEMENT_BYTES, attr_overrides=None,
+                 watch=()):
+        self.containers = containers
+        self.output = output
+        self.attr_overrides = dict(attr_overrides or {})
+        if root_attrs:
+            self.attr_overrides[''] = dict(root_attrs, **self.attr_overrides.get('', {}))
+        self.watch = set(watch)
+        self.values = {}
+        self.max_element_bytes = max_element_bytes
+        self.ready = []
+        self.stats = {
+            'bytes_in': 0,
+            'bytes_out': 0,
+            'children_parsed': 0,
+            'largest_child': 0,
+            'containers_seen': [],
+        }
+
+        self._buf = bytearray()
+        self._base = 0          # absolute offset of self._buf[0]
+        self._emit_pos = 0      # input consumed (written or dropped) up to here
+        self._stack = []
+        self._open = None       # (path, depth, start_offset, had_children, indent)
+        self._capture = None    # (start_offset, depth, whitespace_before)
+        self._last_event = 0
+        self._last_start = None
+
+        parser = xml.parsers.expat.ParserCreate()
+        parser.buffer_text = True
+        parser.StartElementHandler = self._start
+        parser.EndElementHandler = self._end
+        self._parser = parser
+
+    # -- byte buffer helpers -------------------------------------------------
+
+    def _slice(self, start, end):
+        return bytes(self._buf[start - self._base:end - self._base])
+
+    def _write(self, data):
+        if self.output is not None and data:
+            self.output.write(data)
+            self.stats['bytes_out'] += len(data)
+
+    def _passthrough(self, end):
+        if end > self._emit_pos:
+            self._write(self._slice(self._emit_pos, end))
+            self._emit_pos = end
+
+    def _trim(self):
+        keep_from = self._emit_pos
+        if self._capture is not None:
+            keep_from = min(keep_from, self._capture[0])
+        drop = keep_from - self._base
+        if drop > 0:
+            del self._buf[:drop]
+            self._base = keep_from
+
+    def _element_end(self, pos, empty):
+        if empty:
+            return pos
+        return self._base + _tag_end(self._buf, pos - self._base)
+
+    # -- expat handlers ------------------------------------------------------
+
+    def _start(self, name, attrs):
+        pos = self._parser.CurrentByteIndex
+        self._last_event = pos
+        self._last_start = len(self._stack)
+        depth = len(self._stack)
+        self._stack.append(name)
+
+        if self._capture is not None:
+            return
+
+        if self._open is not None and depth == self._open[1] + 1:
+            path, cdepth, cstart, _, _ = self._open
+            whitespace = self._slice(self._emit_pos, pos)
+            if whitespace.strip():
+                self._passthrough(pos)
+                whitespace = b''
+            else:
+                self._emit_pos = pos
+            self._open = (path, cdepth, cstart, True, whitespace)
+            self._capture = (pos, depth, whitespace)
+            return
+
+        path = '/'.join(self._stack[1:])
+        if path in self.watch:
+            self.values[path] = dict(attrs)
+
+        if path in self.attr_overrides:
+            self._passthrough(pos)
+            end = _tag_end(self._buf, pos - self._base)
+            merged = dict(attrs)
+            merged.update(self.attr_overrides[path])
+            tag = '<' + name + ''.join(
+                f' {k}="{escape(str(v), _ATTR_ENTITIES)}"' for k, v in merged.items())
+            tag += ' />' if self._buf[end - 2] == 0x2F else '>'
+            self._write(tag.encode('utf-8'))
+            self._emit_pos = self._base + end
+            if path not in self.containers:
+                return
+
+        if path in self.containers:
+            self.stats['containers_seen'].append(path)
+            end = _tag_end(self._buf, pos - self._base)
+            if self._buf[end - 2] == 0x2F:
+                self._passthrough(pos)
+            else:
+                self._passthrough(self._base + end)
+            self._open = (path, depth, pos, False, b'\n')
+
+    def _end(self, name):
+        pos = self._parser.CurrentByteIndex
+        depth = len(self._stack) - 1
+        empty = (self._last_start == depth and
+                 self._buf[pos - self._base - 2:pos - self._base] == b'/>')
+        self._stack.pop()
+        self._last_event = pos
+        self._last_start = None
+
+        if self._capture is not None:
+            start, cdepth, whitespace = self._capture
+            if depth != cdepth:
+                return
+            self._capture = None
+            end = self._element_end(pos, empty)
+            raw = self._slice(start, end)
+            self.stats['children_parsed'] += 1
+            self.stats['largest_child'] = max(self.stats['largest_child'], len(raw))
+            if len(raw) > self.max_element_bytes:
+                raise AlsStreamError(
+                    f"Element under {self._open[0]} exceeds "
+                    f"{self.max_element_bytes} bytes")
+            elem = ET.fromstring(raw)
+            self._emit_pos = end
+            rewrite = self.containers[self._open[0]]
+            if self.output is None:
+                self.ready.append((self._open[0], elem))
+                return
+            for out in rewrite.on_child(elem):
+                self._write(whitespace + serialize_element(out))
+            path, cdepth, cstart, had, _ = self._open
+            self._open = (path, cdepth, cstart, had, whitespace)
+            return
+
+        if self._open is not None and depth == self._open[1]:
+            path, _, cstart, had_children, indent = self._open
+            self._open = None
+            end = self._element_end(pos, empty)
+            rewrite = self.containers[path]
+            if self.output is None:
+                return
+            items = iter(rewrite.on_close())
+            first = next(items, None)
+            if first is None:
+                self._passthrough(end)
+                return
+            added = (serialize_element(e) for e in itertools.chain([first], items))
+            if empty:
+                # <Tracks /> -> <Tracks>children</Tracks>
+                tag = self._slice(self._emit_pos, end)
+                head = tag[:tag.rfind(b'/')].rstrip() + b'>'
+                self._write(head)
+                for data in added:
+                    self._write(b'\n' + data)
+                self._write(b'\n</' + name.encode('utf-8') + b'>')
+                self._emit_pos = end
+                return
+            closing = self._slice(self._emit_pos, pos)
+            if not had_children:
+                indent = closing + b'\t' if not closing.strip() else b'\n'
+            for data in added:
+                self._write(indent + data)
+            self._passthrough(end)
+
+    # -- driving -------------------------------------------------------------
+
+    def feed(self, data):
+        """Feed a chunk of decompressed XML"""
+        self._buf += data
+        self.stats['bytes_in'] += len(data)
+        self._parser.Parse(data, False)
+        if self._capture is not None:
+            held = self._base + len(self._buf) - self._capture[0]
+            if held > self.max_element_bytes:
+                raise AlsStreamError(
+                    f"Element under {self._open[0]} exceeds "
+                    f"{self.max_element_bytes} bytes")
+        elif self._open is None:
+            # Inside a container only the whitespace run before the next
+            # child is held back; everywhere else bytes up to the last
+            # parser event are final.
+            self._passthrough(self._last_event)
+        self._trim()
+
+    def close(self):
+        """Finish parsing and flush the remaining bytes"""
+        self._parser.Parse(b'', True)
+        self._passthrough(self._base + len(self._buf))
+        self._trim()
+        return self.stats
+
+
+def read_chunks(stream, chunk_size=CHUNK_SIZE):
+    """Yield fixed-size chunks from a binary stream"""
+    while True:
+        data = stream.read(chunk_size)
+        if not data:
+            break
+        yield data
+
+
+def iter_als_children(path, container='LiveSet/Tracks', chunk_size=CHUNK_SIZE,
+                      max_element_bytes=MAX_ELEMENT_BYTES):
+    """Yield each direct child of `container` as a parsed element
+
+    Only one child is held in memory at a time; stop iterating early to
+    avoid decompressing the rest of the set.
+    """
+    stream = AlsStream({container: ContainerRewrite()},
+                       max_element_bytes=max_element_bytes)
+    with gzip.open(path, 'rb') as f:
+        for data in read_chunks(f, chunk_size):
+            stream.feed(data)
+            while stream.ready:
+                yield stream.ready.pop(0)[1]
+        stream.close()
+    while stream.ready:
+        yield stream.ready.pop(0)[1]
+
+
+def rewrite_als(input_path, output_path, containers, root_attrs=None,
+                chunk_size=CHUNK_SIZE, max_element_bytes=MAX_ELEMENT_BYTES,
+                attr_overrides=None, profiler=NULL_PROFILER,
+                compresslevel=DEFAULT_LEVEL, threads=None, mtime=None):
+    """Stream input_path to output_path, rewriting the given containers
+
+    containers maps element paths below the root (e.g. 'LiveSet/Tracks')
+    to ContainerRewrite callbacks. root_attrs overrides attributes on the
+    root <Ableton> tag, attr_overrides on any other element path.
+    Returns the stream statistics.
+
+    The output is compressed in parallel blocks (see gzip_writer.py) at
+    compresslevel with up to `threads` threads and the given gzip header
+    mtime (None: now). With a PhaseProfiler, file I/O, gzip, expat and
+    the container callbacks are charged to
+    read/decompress/parse/transform/compress/write. The set is written
+    beside output_path and renamed over it only once the whole template
+    has been streamed, so a failure leaves any previous output untouched.
+    """
+    if profiler.enabled:
+        containers = {
+            path: ContainerRewrite(profiler.wrap(rewrite.on_child, 'transform'),
+                                   profiler.wrap(rewrite.on_close, 'transform'))
+            for path, rewrite in containers.items()
+        }
+    with open(input_path, 'rb') as raw_in, AtomicOutput(output_path) as raw_out, \
+            gzip.GzipFile(fileobj=profiler.reader(raw_in, 'read'), mode='rb') as src, \
+            GzipBlockWriter(profiler.writer(raw_out, 'write'), compresslevel, threads,
+                            filename=str(output_path), mtime=mtime) as dst:
+        stream = AlsStream(containers, output=profiler.writer(dst, 'compress'),
+                           root_attrs=root_attrs,
+                           max_element_bytes=max_element_bytes,
+                           attr_overrides=attr_overrides)
+        for data in read_chunks(profiler.reader(src, 'decompress'), chunk_size):
+            with profiler.phase('parse'):
+                stream.feed(data)
+        with profiler.phase('parse'):
+            return stream.close()
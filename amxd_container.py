@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - .amxd Container Reader/Writer
+Indexes Max for Live device chunks and parses only the patcher payload
+
+A saved .amxd is a flat sequence of chunks, each a 4-byte tag followed by
+a little-endian uint32 payload length:
+
+    ampf  4  'mmmm'          device type (mmmm midi, aaaa audio, iiii instrument)
+    meta  4  01 00 00 00
+    ptch  N  {...patcher JSON...}\\n\\0
+
+Some devices in the repo (and every .maxpat) are bare patcher JSON with
+no chunk header; those are exposed as a single 'ptch' chunk with
+bare=True. The index is built from the length fields over a memoryview
+of a single read, so nothing but the ptch payload is ever decoded.
+
+Older versions of fix_devices.py wrote a longer JSON payload back behind
+the original ptch length. When the last chunk is ptch and its declared
+length stops short of the end of the file, the reader extends it to EOF
+and sets stale_length; writing the container recomputes every length.
+"""
+
+import io
+import json
+import os
+import struct
+from collections import namedtuple
+
+from profiling import NULL_PROFILER
+
+CHUNK_HEADER = struct.Struct('<4sI')
+PATCHER_TAG = b'ptch'
+
+Chunk = namedtuple('Chunk', ['tag', 'start', 'offset', 'size'])
+
+
+class AmxdError(Exception):
+    """Raised when a device file cannot be indexed or parsed"""
+
+
+class AmxdContainer:
+    """Chunk index over the raw bytes of one .amxd/.maxpat file"""
+
+    def __init__(self, data, strict=False):
+        self.data = data
+        self.view = memoryview(data)
+        self.chunks = []
+        self.bare = False
+        self.stale_length = False
+        self._index(strict)
+
+    @classmethod
+    def read(cls, filename, strict=False):
+        """Read a device with one read() call and index it"""
+        with open(filename, 'rb') as f:
+            return cls(f.read(), strict=strict)
+
+    def _index(self, strict):
+        data = self.view
+        n = len(data)
+        if n == 0:
+            raise AmxdError("Empty device file")
+        if bytes(data[:4]) != b'ampf':
+            # Bare patcher JSON (.maxpat, or an .amxd saved without header)
+            self.bare = True
+            self.chunks.append(Chunk(PATCHER_TAG, 0, 0, n))
+            return
+
+        pos = 0
+        while pos + CHUNK_HEADER.size <= n:
+            tag, size = CHUNK_HEADER.unpack_from(data, pos)
+            offset = pos + CHUNK_HEADER.size
+            end = offset + size
+            if not tag.isalnum() or end > n:
+                break
+            self.chunks.append(Chunk(tag, pos, offset, size))
+            pos = end
+
+        if pos != n:
+            last = self.chunks[-1] if self.chunks else None
+            if strict or last is None or last.tag != PATCHER_TAG:
+                raise AmxdError(
+                    f"{n - pos} bytes at offset {pos} do not form a chunk")
+            self.chunks[-1] = Chunk(last.tag, last.start, last.offset, n - last.offset)
+            self.stale_length = True
+
+    @property
+    def device_type(self):
+        """Four-letter device type from the ampf chunk, or None for bare files"""
+        chunk = self.chunk(b'ampf')
+        if chunk is None:
+            return None
+        return bytes(self.view[chunk.offset:chunk.offset + chunk.size]).decode('ascii', 'replace')
+
+    def chunk(self, tag):
+        """Return the first chunk with the given tag, or None"""
+        for chunk in self.chunks:
+            if chunk.tag == tag:
+                return chunk
+        return None
+
+    def payload(self, tag=PATCHER_TAG):
+        """Zero-copy view of a chunk payload"""
+        chunk = self.chunk(tag)
+        if chunk is None:
+            raise AmxdError(f"No {tag.decode()} chunk")
+        return self.view[chunk.offset:chunk.offset + chunk.size]
+
+    def patcher_bytes(self):
+        """The ptch payload with trailing NUL/whitespace padding removed"""
+        payload = self.payload()
+        end = len(payload)
+        while end and payload[end - 1] in (0, 0x0A, 0x0D, 0x20, 0x09):
+            end -= 1
+        payload = payload[:end]
+        if not payload or payload[0] != 0x7B:  # {
+            head = bytes(payload[:4])
+            raise AmxdError(f"Unsupported ptch payload (starts with {head!r})")
+        return payload
+
+    def patcher(self):
+        """Parse and return the patcher JSON"""
+        try:
+            return json.loads(bytes(self.patcher_bytes()))
+        except ValueError as e:
+            raise AmxdError(f"Invalid patcher JSON: {e}") from e
+
+    def serialize(self, patcher_payload):
+        """Return the container bytes with a new ptch payload
+
+        Every chunk is rewritten with its length recomputed; bare files
+        stay bare.
+        """
+        if self.bare:
+            return bytes(patcher_payload)
+        parts = []
+        for chunk in self.chunks:
+            if chunk.tag == PATCHER_TAG:
+                body = patcher_payload
+            else:
+                body = self.view[chunk.offset:chunk.offset + chunk.size]
+            parts.append(CHUNK_HEADER.pack(chunk.tag, len(body)))
+            parts.append(body)
+        return b''.join(parts)
+
+    def write(self, filename, patcher_payload):
+        """Write the container with a new ptch payload to filename"""
+        data = self.serialize(patcher_payload)
+        with open(filename, 'wb') as f:
+            f.write(data)
+        return len(data)
+
+
+class _ChunkReader(io.RawIOBase):
+    """Raw reader over the next `size` bytes of an open file"""
+
+    def __init__(self, f, size):
+        self._f = f
+        self._left = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._f.read(min(len(buffer), self._left))
+        buffer[:len(data)] = data
+        self._left -= len(data)
+        return len(data)
+
+    def close(self):
+        self._f.close()
+        super().close()
+
+
+def _payload_size(f, offset, size, n):
+    """ptch payload size, following the chunk rules of AmxdContainer._index
+
+    The declared length holds when the chunks after it tile the file; a
+    stale length of a last ptch chunk extends to EOF.
+    """
+    pos = offset + size
+    if pos > n:
+        start = offset - CHUNK_HEADER.size
+        raise AmxdError(f"{n - start} bytes at offset {start} do not form a chunk")
+    last = True
+    while pos + CHUNK_HEADER.size <= n:
+        f.seek(pos)
+        tag, length = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))
+        if not tag.isalnum() or pos + CHUNK_HEADER.size + length > n:
+            break
+        pos += CHUNK_HEADER.size + length
+        last = False
+    if pos == n:
+        return size
+    if last:
+        return n - offset
+    raise AmxdError(f"{n - pos} bytes at offset {pos} do not form a chunk")
+
+
+def open_patcher_stream(filename):
+    """Open a device as a binary stream of its ptch payload alone
+
+    Only the chunk headers are read; every chunk before ptch is seeked
+    over and the stream ends where the payload does, so chunks after it
+    are never decoded. The caller reads the patcher JSON from the
+    returned file and closes it.
+    """
+    f = open(filename, 'rb')
+    try:
+        n = os.fstat(f.fileno()).st_size
+        head = f.read(CHUNK_HEADER.size)
+        if not head:
+            raise AmxdError("Empty device file")
+        if head[:4] != b'ampf':
+            f.seek(0)
+            return f
+        while len(head) == CHUNK_HEADER.size:
+            tag, size = CHUNK_HEADER.unpack(head)
+            if tag == PATCHER_TAG:
+                offset = f.tell()
+                size = _payload_size(f, offset, size, n)
+                f.seek(offset)
+                return io.BufferedReader(_ChunkReader(f, size))
+            if not tag.isalnum():
+                break
+            f.seek(size, 1)
+            head = f.read(CHUNK_HEADER.size)
+        raise AmxdError("No ptch chunk")
+    except BaseException:
+        f.close()
+        raise
+
+
+def dump_patcher(patcher, bare=False):
+    """Serialize a patcher dict the way Max saves it"""
+    text = json.dumps(patcher, indent="\t", ensure_ascii=False)
+    data = text.encode('utf-8') + b'\n'
+    if not bare:
+        data += b'\0'
+    return data
+
+
+def extract_patcher(filename, profiler=NULL_PROFILER):
+    """Extract JSON patcher data from .amxd file
+
+    Returns (container, patcher), or (None, None) if the file cannot be read.
+    """
+    try:
+        with profiler.phase('read'):
+            container = AmxdContainer.read(filename)
+        with profiler.phase('parse'):
+            return container, container.patcher()
+    except (OSError, AmxdError) as e:
+        print(f"Error parsing JSON: {e}")
+        return None, None
+
+
+def save_patcher(filename, container, patcher):
+    """Save patcher data back to .amxd file with recomputed chunk sizes"""
+    container.write(filename, dump_patcher(patcher, bare=container.bare))
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Device Analysis Cache
+Persistent, size-bounded cache of analyze_devices.py results
+
+Entries live in a small SQLite database keyed by the device path and the
+check parameters (display name, expected script, role and the analyzer's
+RULES_VERSION). A lookup is tiered:
+
+1. size + mtime match the stored stat       -> hit, the file is not read
+2. the file's blake2b digest matches        -> hit (touched but unchanged,
+                                               or the same bytes elsewhere)
+3. otherwise                                -> miss, the caller re-checks
+
+Stored results are evicted least-recently-used first once their total
+size exceeds max_bytes.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = Path.home() / '.cache' / 'powertrio' / 'device_analysis.sqlite'
+DEFAULT_MAX_BYTES = 32 << 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    path        TEXT NOT NULL,
+    params      TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    mtime_ns    INTEGER NOT NULL,
+    digest      TEXT NOT NULL,
+    result      TEXT NOT NULL,
+    nbytes      INTEGER NOT NULL,
+    last_used   REAL NOT NULL,
+    PRIMARY KEY (path, params)
+);
+CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest, params);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_used);
+"""
+
+
+def file_digest(path):
+    """blake2b digest of a file's contents"""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class AnalysisCache:
+    """SQLite-backed result cache with LRU eviction"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path))
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self.evict()
+        self._db.commit()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def params_key(*params):
+        return json.dumps(params, separators=(',', ':'))
+
+    def lookup(self, path, params):
+        """Return (result, stat_token) for path, result None on a miss
+
+        stat_token is handed back to store() so the file is hashed at
+        most once per run.
+        """
+        path = str(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.misses += 1
+            return None, None
+        token = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'digest': None}
+
+        row = self._db.execute(
+            "SELECT size, mtime_ns, digest, result FROM entries WHERE path=? AND params=?",
+            (path, params)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            self._touch(path, params)
+            self.hits += 1
+            return json.loads(row[3]), token
+
+        token['digest'] = file_digest(path)
+        row = self._db.execute(
+            "SELECT result FROM entries WHERE digest=? AND params=? LIMIT 1",
+            (token['digest'], params)).fetchone()
+        if row:
+            result = json.loads(row[0])
+            result['file'] = path
+            self.store(path, params, result, token)
+            self.hits += 1
+            return result, token
+
+        self.misses += 1
+        return None, token
+
+    def store(self, path, params, result, token=None):
+        """Record a result for path; token comes from lookup()"""
+        path = str(path)
+        if token is None or token.get('size') is None:
+            st = os.stat(path)
+            token = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'digest': None}
+        if token['digest'] is None:
+            token['digest'] = file_digest(path)
+        data = json.dumps(result, ensure_ascii=False)
+        self._db.execute(
+            "INSERT OR REPLACE INTO entries "
+            "(path, params, size, mtime_ns, digest, result, nbytes, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, params, token['size'], token['mtime_ns'], token['digest'],
+             data, len(data), time.time()))
+
+    def _touch(self, path, params):
+        self._db.execute(
+            "UPDATE entries SET last_used=? WHERE path=? AND params=?",
+            (time.time(), path, params))
+
+    def evict(self):
+        """Drop least-recently-used entries until under max_bytes"""
+        total = self._db.execute("SELECT COALESCE(SUM(nbytes), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+        evicted = 0
+        rows = self._db.execute(
+            "SELECT rowid, nbytes FROM entries ORDER BY last_used").fetchall()
+        for rowid, nbytes in rows:
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM entries WHERE rowid=?", (rowid,))
+            total -= nbytes
+            evicted += 1
+        return evicted
+
+    def stats(self):
+        entries, total = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM entries").fetchone()
+        return {'hits': self.hits, 'misses': self.misses,
+                'entries': entries, 'bytes': total}
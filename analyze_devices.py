@@ -4,212 +4,246 @@ Device Analyzer and Fixer for Power Trio Arranger
 Analyzes .amxd files and reports issues, optionally fixes them
 """
 
+import argparse
+import glob
 import json
 import sys
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 
-def extract_patcher(filename):
-    """Extract JSON patcher data from .amxd file"""
-    with open(filename, 'rb') as f:
-        data = f.read()
-        json_start = data.find(b'{')
-        if json_start != -1:
-            # Store header for later reconstruction
-            header = data[:json_start]
-            json_data = data[json_start:].decode('utf-8', errors='ignore')
-            json_end = json_data.rfind('}') + 1
-            json_data = json_data[:json_end]
-            try:
-                patcher = json.loads(json_data)
-                return header, patcher
-            except Exception as e:
-                print(f"Error parsing JSON: {e}")
-                return None, None
-    return None, None
-
-def save_patcher(filename, header, patcher):
-    """Save patcher data back to .amxd file"""
-    with open(filename, 'wb') as f:
-        f.write(header)
-        json_str = json.dumps(patcher, indent=4)
-        f.write(json_str.encode('utf-8'))
-
-def find_node_script(patcher):
-    """Find node.script object in patcher"""
-    boxes = patcher.get('patcher', {}).get('boxes', [])
-    for i, box in enumerate(boxes):
-        obj = box.get('box', {})
-        text = obj.get('text', '')
-        if 'node.script' in text:
-            return i, obj
-    return None, None
-
-def find_dict_object(patcher):
-    """Find dict ---power_trio_brain object"""
-    boxes = patcher.get('patcher', {}).get('boxes', [])
-    for i, box in enumerate(boxes):
-        obj = box.get('box', {})
-        text = obj.get('text', '')
-        if 'dict ---power_trio_brain' in text:
-            return i, obj
-    return None, None
-
-def find_object_by_text(patcher, search_text):
-    """Find object by text content"""
-    boxes = patcher.get('patcher', {}).get('boxes', [])
-    for i, box in enumerate(boxes):
-        obj = box.get('box', {})
-        text = obj.get('text', '')
-        if search_text in text:
-            return i, obj
-    return None, None
-
-def check_dict_response_loop(patcher):
-    """Check if dict response loop exists"""
-    has_prepend = find_object_by_text(patcher, 'prepend dict_response')[0] is not None
-    
-    # Check connections
-    dict_idx, dict_obj = find_dict_object(patcher)
-    script_idx, script_obj = find_node_script(patcher)
-    prepend_idx, prepend_obj = find_object_by_text(patcher, 'prepend dict_response')
-    
-    if not all([dict_obj, script_obj, prepend_obj]):
-        return False, "Missing objects"
-    
-    # Check if dict left outlet connects to prepend
-    lines = patcher.get('patcher', {}).get('lines', [])
-    dict_to_prepend = False
-    prepend_to_script = False
-    
-    dict_id = dict_obj.get('id')
-    prepend_id = prepend_obj.get('id')
-    script_id = script_obj.get('id')
-    
-    for line in lines:
-        pl = line.get('patchline', {})
-        src = pl.get('source', [])
-        dst = pl.get('destination', [])
-        
-        if len(src) >= 2 and len(dst) >= 1:
-            # Check dict outlet 0 (left) to prepend
-            if src[0] == dict_id and src[1] == 0 and dst[0] == prepend_id:
-                dict_to_prepend = True
-            # Check prepend to script inlet 0 (left)
-            if src[0] == prepend_id and dst[0] == script_id and dst[1] == 0:
-                prepend_to_script = True
-    
-    if dict_to_prepend and prepend_to_script:
-        return True, "Complete"
-    elif has_prepend:
-        return False, "Loop exists but not connected properly"
-    else:
-        return False, "Missing prepend dict_response"
+from amxd_container import extract_patcher
+from device_rules import RuleEngine, load_rule_config, rules_for_role
+from patcher_scan import scan_device
+from analysis_cache import AnalysisCache, DEFAULT_CACHE_PATH, DEFAULT_MAX_BYTES
+from profiling import NULL_PROFILER, add_profile_args, profiled
 
-def analyze_device(filename, device_name, expected_script):
-    """Analyze a device file"""
+DEVICES_DIR = Path("/Users/Matthew/PowerTrioArranger/Application Docs/M4LDevices")
+
+# (filename, display name, expected script, role)
+DEVICES = [
+    ("Track_1_Chord_Lab.amxd", "Track 1: Chord Lab", "track_1_chord_lab/logic.js", "chord_lab"),
+    ("Track_2_Sequencer.amxd", "Track 2: Sequencer", "track_2_sequencer/sequencer.js", "sequencer"),
+    ("Track_3_Global_Brain.amxd", "Track 3: Global Brain", "shared/dict_init.js", "global_brain"),
+    ("Track_4_Bridge.amxd", "Track 4: Bridge", "track_4_drums/groove_wanderer_bridge.js", "drums_bridge"),
+    ("Track_5_Bass_Follower.amxd", "Track 5: Bass Follower", "track_5_bass/bass_follower.js", "bass"),
+]
+
+DEVICE_EXTENSIONS = ('.amxd', '.maxpat')
+
+# Bump whenever a check changes so cached results are not reused
+RULES_VERSION = 2
+
+def role_for(device_name):
+    """Guess a role from a display name when no manifest entry gives one"""
+    if 'Sequencer' in device_name:
+        return 'sequencer'
+    if 'Bass' in device_name:
+        return 'bass'
+    return None
+
+def check_device(filename, device_name, expected_script=None, role=None, rules=None,
+                 profiler=NULL_PROFILER, patcher=None, scan=False):
+    """Run every check on a device and return a JSON-serializable result
+    
+    An already-parsed patcher (watch mode) skips reading the file. With
+    scan, only the boxes the rules select are read from the file (see
+    patcher_scan.py) instead of parsing the whole patcher.
+    """
+    result = {
+        'file': str(filename),
+        'device': device_name,
+        'role': role or role_for(device_name),
+        'expected_script': expected_script,
+        'ok': False,
+        'error': None,
+        'node_script': None,
+        'dict': None,
+        'response_loop': None,
+        'rules': [],
+        'issues': [],
+        'warnings': [],
+    }
+    
+    # All rules for this role are evaluated in one traversal
+    rules = rules if rules is not None else rules_for_role(result['role'])
+    engine = RuleEngine(rules)
+    if patcher is None:
+        if scan:
+            patcher = scan_device(filename, engine.matches, profiler)
+        else:
+            _, patcher = extract_patcher(filename, profiler)
+    if not patcher:
+        result['error'] = "Could not read patcher data"
+        return result
+    
+    with profiler.phase('transform'):
+        engine.run(patcher, result, {'expected_script': expected_script})
+    
+    result['ok'] = not result['issues']
+    return result
+
+def print_device_report(result):
+    """Print the human-readable report for one check_device() result"""
     print(f"\n{'='*60}")
-    print(f"Device: {device_name}")
+    print(f"Device: {result['device']}")
     print(f"{'='*60}")
     
-    header, patcher = extract_patcher(filename)
-    if not patcher:
-        print("❌ Could not read patcher data")
+    if result['error']:
+        print(f"❌ {result['error']}")
         return
     
-    issues = []
-    warnings = []
-    
-    # Check node.script
-    script_idx, script_obj = find_node_script(patcher)
-    if not script_obj:
-        issues.append("❌ node.script object not found")
-    else:
-        text = script_obj.get('text', '')
-        textfile = script_obj.get('textfile', {})
-        saved_attrs = script_obj.get('saved_object_attributes', {})
-        
+    info = result['node_script']
+    if info:
         print(f"\n📝 Node.script Configuration:")
-        print(f"   Text: {text}")
-        print(f"   Filename: {textfile.get('filename', 'N/A')}")
-        print(f"   Autostart: {saved_attrs.get('autostart', 'N/A')}")
-        
-        # Check script path
-        filename_field = textfile.get('filename', '')
-        if expected_script not in filename_field:
-            issues.append(f"❌ Script path is '{filename_field}', should be '{expected_script}'")
-        else:
+        print(f"   Text: {info['text']}")
+        print(f"   Filename: {info['filename']}")
+        print(f"   Autostart: {info['autostart']}")
+        if info['path_ok']:
             print(f"   ✅ Script path correct")
-        
-        # Check autostart
-        if saved_attrs.get('autostart') != 1:
-            issues.append(f"❌ @autostart is {saved_attrs.get('autostart')}, should be 1")
-        else:
+        if info['autostart_ok']:
             print(f"   ✅ Autostart enabled")
     
-    # Check dict object
-    dict_idx, dict_obj = find_dict_object(patcher)
-    if not dict_obj:
-        issues.append("❌ dict ---power_trio_brain object not found")
-    else:
-        saved_attrs = dict_obj.get('saved_object_attributes', {})
-        embed = saved_attrs.get('embed', 0)
-        if embed == 1:
-            issues.append("❌ Dict has @embed 1, should be 0 (shared dict)")
-        else:
-            print(f"\n📚 Dictionary:")
-            print(f"   ✅ Correctly references shared dict (@embed 0)")
+    if result['dict'] and result['dict']['ok']:
+        print(f"\n📚 Dictionary:")
+        print(f"   ✅ Correctly references shared dict (@embed 0)")
     
-    # Check response loop (for Sequencer and Bass only)
-    if 'Sequencer' in device_name or 'Bass' in device_name:
+    loop = result['response_loop']
+    if loop:
         print(f"\n🔄 Dict Response Loop:")
-        has_loop, status = check_dict_response_loop(patcher)
-        if has_loop:
+        if loop['ok']:
             print(f"   ✅ Response loop present and connected")
         else:
-            issues.append(f"❌ CRITICAL: Response loop issue - {status}")
-            print(f"   ❌ {status}")
+            print(f"   ❌ {loop['status']}")
     
     # Summary
+    issues = result['issues']
+    warnings = result['warnings']
     print(f"\n{'─'*60}")
     if not issues:
         print("✅ Device looks good!")
     else:
         print(f"❌ Issues found: {len(issues)}")
         for issue in issues:
-            print(f"   {issue}")
+            print(f"   ❌ {issue}")
     
     if warnings:
         print(f"\n⚠️  Warnings: {len(warnings)}")
         for warning in warnings:
             print(f"   {warning}")
-    
-    return len(issues) == 0
 
-def main():
-    devices_dir = Path("/Users/Matthew/PowerTrioArranger/Application Docs/M4LDevices")
+def analyze_device(filename, device_name, expected_script):
+    """Analyze a device file"""
+    result = check_device(filename, device_name, expected_script)
+    print_device_report(result)
+    if result['error']:
+        return
+    return result['ok']
+
+def _check_job(job, scan=False):
+    """Process-pool entry point: job is (path, name, expected_script, role, rules)"""
+    return check_device(*job, scan=scan)
+
+def load_manifest(path):
+    """Load a device manifest
     
-    devices = [
-        ("Track_1_Chord_Lab.amxd", "Track 1: Chord Lab", "track_1_chord_lab/logic.js"),
-        ("Track_2_Sequencer.amxd", "Track 2: Sequencer", "track_2_sequencer/sequencer.js"),
-        ("Track_3_Global_Brain.amxd", "Track 3: Global Brain", "shared/dict_init.js"),
-        ("Track_4_Bridge.amxd", "Track 4: Bridge", "track_4_drums/groove_wanderer_bridge.js"),
-        ("Track_5_Bass_Follower.amxd", "Track 5: Bass Follower", "track_5_bass/bass_follower.js"),
-    ]
+    JSON object mapping device filename to {"script": ..., "role": ...,
+    "name": ..., "rules": [...]}; every key is optional.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def default_manifest():
+    """Manifest equivalent to the built-in DEVICES table"""
+    return {
+        filename: {'name': name, 'script': script, 'role': role}
+        for filename, name, script, role in DEVICES
+    }
+
+def expand_paths(patterns):
+    """Expand files, directories and globs into a sorted list of device paths"""
+    found = set()
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            for ext in DEVICE_EXTENSIONS:
+                found.update(path.rglob(f'*{ext}'))
+        else:
+            found.update(Path(p) for p in glob.glob(pattern, recursive=True))
+    return sorted(p for p in found if p.suffix in DEVICE_EXTENSIONS and p.is_file())
+
+def build_jobs(paths, manifest, rule_config=None):
+    """Pair each device path with its manifest entry and rule set
     
-    print("Power Trio Arranger - Device Analyzer")
-    print("="*60)
+    A manifest entry may list "rules" explicitly; otherwise the rules
+    come from the role via the rule config.
+    """
+    jobs = []
+    for path in paths:
+        entry = manifest.get(path.name, {})
+        name = entry.get('name', path.stem)
+        role = entry.get('role') or role_for(name)
+        rules = entry.get('rules') or rules_for_role(role, rule_config)
+        jobs.append((str(path), name, entry.get('script'), role, tuple(rules)))
+    return jobs
+
+def run_batch(jobs, workers=None, cache=None, profiler=NULL_PROFILER, scan=False):
+    """Check every job across a process pool, results in job order
     
-    all_good = True
-    for filename, name, expected_script in devices:
-        filepath = devices_dir / filename
-        if filepath.exists():
-            device_ok = analyze_device(filepath, name, expected_script)
-            all_good = all_good and device_ok
+    With a cache, unchanged devices are answered from it and only the
+    misses are sent to the pool. While profiling, jobs run in this
+    process so every phase is recorded.
+    """
+    results = [None] * len(jobs)
+    pending = []
+    for i, job in enumerate(jobs):
+        if cache is None:
+            pending.append((i, job, None, None))
+            continue
+        params = cache.params_key(RULES_VERSION, *job[1:])
+        with profiler.phase('cache'):
+            result, token = cache.lookup(job[0], params)
+        if result is None:
+            pending.append((i, job, params, token))
         else:
-            print(f"\n❌ {filename} not found")
-            all_good = False
+            result['device'] = job[1]
+            results[i] = result
     
+    todo = [job for _, job, _, _ in pending]
+    if profiler.enabled:
+        fresh = [check_device(*job, profiler=profiler, scan=scan) for job in todo]
+    elif workers == 1 or len(todo) < 2:
+        fresh = [_check_job(job, scan) for job in todo]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(todo) // ((workers or os.cpu_count() or 1) * 4))
+            fresh = list(pool.map(partial(_check_job, scan=scan), todo, chunksize=chunksize))
+    
+    for (i, job, params, token), result in zip(pending, fresh):
+        results[i] = result
+        if cache is not None and token is not None and not result['error']:
+            with profiler.phase('cache'):
+                cache.store(job[0], params, result, token)
+    return results
+
+def write_results(results, json_path=None, ndjson_path=None):
+    """Write machine-readable results next to the human report"""
+    if ndjson_path:
+        with open(ndjson_path, 'w', encoding='utf-8') as f:
+            for result in results:
+                f.write(json.dumps(result, ensure_ascii=False) + '\n')
+    if json_path:
+        summary = {
+            'devices': len(results),
+            'ok': sum(1 for r in results if r['ok']),
+            'failed': sum(1 for r in results if not r['ok']),
+        }
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'results': results}, f,
+                      indent=2, ensure_ascii=False)
+
+def print_summary(all_good):
     print(f"\n{'='*60}")
     print("Summary")
     print(f"{'='*60}")
@@ -220,6 +254,78 @@ def main():
         print("\nSee issues above and refer to:")
         print("- DEVICE_ALIGNMENT_PROCEDURE.md")
         print("- VISUAL_WIRING_GUIDE.md")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Power Trio Arranger - Device Analyzer")
+    parser.add_argument('paths', nargs='*',
+                        help="device files, directories or globs (batch mode)")
+    parser.add_argument('--manifest', help="JSON manifest: filename -> {script, role, name}")
+    parser.add_argument('--rules', help="JSON rule config: role -> [rule names]")
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help="worker processes (default: CPU count)")
+    parser.add_argument('--json', dest='json_path', help="write results as JSON")
+    parser.add_argument('--ndjson', dest='ndjson_path', help="write results as NDJSON")
+    parser.add_argument('--cache', default=str(DEFAULT_CACHE_PATH),
+                        help="analysis cache database (default: %(default)s)")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_BYTES >> 20,
+                        help="cache size limit in MB (default: %(default)s)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="re-check every device")
+    parser.add_argument('--quiet', '-q', action='store_true',
+                        help="only print failing devices and the summary")
+    parser.add_argument('--scan', action='store_true',
+                        help="stream each patcher and read only the boxes the rules need")
+    add_profile_args(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    with profiled(args, 'analyze_devices') as profiler:
+        return _main(args, profiler)
+
+def _main(args, profiler):
+    manifest = load_manifest(args.manifest) if args.manifest else default_manifest()
+    rule_config = load_rule_config(args.rules) if args.rules else None
+    
+    print("Power Trio Arranger - Device Analyzer")
+    print("="*60)
+    
+    all_good = True
+    if args.paths:
+        paths = expand_paths(args.paths)
+        jobs = build_jobs(paths, manifest, rule_config)
+        print(f"Checking {len(jobs)} device(s)...")
+    else:
+        jobs = []
+        for filename, name, expected_script, role in DEVICES:
+            filepath = DEVICES_DIR / filename
+            if filepath.exists():
+                rules = tuple(rules_for_role(role, rule_config))
+                jobs.append((str(filepath), name, expected_script, role, rules))
+            else:
+                print(f"\n❌ {filename} not found")
+                all_good = False
+    
+    cache = None
+    if not args.no_cache:
+        cache = AnalysisCache(args.cache, max_bytes=args.cache_size << 20)
+    try:
+        results = run_batch(jobs, args.jobs, cache, profiler, args.scan)
+    finally:
+        if cache is not None:
+            stats = cache.stats()
+            cache.close()
+    
+    for result in results:
+        if not (args.quiet and result['ok']):
+            print_device_report(result)
+        all_good = all_good and result['ok']
+    
+    with profiler.phase('write'):
+        write_results(results, args.json_path, args.ndjson_path)
+    print_summary(all_good)
+    if cache is not None:
+        print(f"\n💾 Cache: {stats['hits']} hit(s), {stats['misses']} miss(es)")
     
     return 0 if all_good else 1
 
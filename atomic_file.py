@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Atomic File Writes
+Replaces a file so readers see either the old or the new bytes, never half
+
+The data goes to a temporary file in the same directory, which is
+fsynced and renamed over the target; the directory is fsynced after the
+rename where the platform allows it. The target's permission bits are
+kept. atomic_write() does this for bytes already in memory; AtomicOutput
+is the streaming form, for writers that produce a file piece by piece
+and must leave the old one untouched when they fail half way. Used by
+fix_devices.py for device rewrites, by backup_store.py for restores and
+by the set generators for their .als output.
+"""
+
+import os
+import secrets
+import shutil
+from pathlib import Path
+
+
+def _fsync_dir(path):
+    try:
+        dir_fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+class AtomicOutput:
+    """Binary file written beside path and renamed over it on commit()
+
+    As a context manager it commits when the block succeeds and discards
+    the temporary file when it raises.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.tmp_path = self.path.with_name(
+            f'.{self.path.name}.{os.getpid()}.{secrets.token_hex(4)}.tmp')
+        self.file = open(self.tmp_path, 'xb')
+
+    def write(self, data):
+        return self.file.write(data)
+
+    def flush(self):
+        self.file.flush()
+
+    def commit(self):
+        """fsync the data and move it into place"""
+        try:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            if self.path.exists():
+                shutil.copymode(self.path, self.tmp_path)
+            os.replace(self.tmp_path, self.path)
+        except BaseException:
+            self.discard()
+            raise
+        _fsync_dir(self.path.parent)
+
+    def discard(self):
+        """Drop the temporary file; the target is left as it was"""
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.unlink(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+
+def atomic_write(path, data):
+    """Write data to path via temp file + fsync + rename"""
+    with AtomicOutput(path) as f:
+        f.write(data)
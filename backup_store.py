@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Backup Store
+Content-addressed, deduplicated history of every device the fixer touches
+
+fix_devices.py used to keep one '<name>.amxd.backup' copy per device,
+written on the first fix only. Every fix now records a revision here
+instead. Revisions are split into content-defined chunks: a chunk ends
+after a line whose crc32 has its low CHUNK_BITS bits clear, so an edit
+only changes the chunks around it. Chunks are stored once, zlib-compressed
+and keyed by their blake2b digest, in a small SQLite database:
+
+    chunks      digest -> compressed bytes
+    revisions   digest of the whole file -> size and chunk list
+    history     (path, revision, time, note), appended on every snapshot
+
+Re-snapshotting an unchanged file, or a device that shares most of its
+patcher with another one, adds only a history row. Revisions are named
+by their digest, and any unique prefix of at least four characters works.
+
+    python3 backup_store.py log [FILE]
+    python3 backup_store.py restore FILE [REVISION]
+    python3 backup_store.py import M4LDevices      # existing .backup copies
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from pathlib import Path
+
+from atomic_file import atomic_write
+
+DEFAULT_STORE_PATH = Path.home() / '.cache' / 'powertrio' / 'device_backups.sqlite'
+
+CHUNK_BITS = 6              # ~64 lines (about 1 KB of patcher JSON) per chunk
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+MAX_CHUNK_LINES = 1024
+MAX_LINE = 64 << 10         # longer lines (binary data) are cut into pieces
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    digest      TEXT PRIMARY KEY,
+    data        BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS revisions (
+    digest      TEXT PRIMARY KEY,
+    size        INTEGER NOT NULL,
+    chunks      TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS history (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    path        TEXT NOT NULL,
+    revision    TEXT NOT NULL,
+    time        REAL NOT NULL,
+    note        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_path ON history (path, id);
+"""
+
+
+class BackupError(ValueError):
+    """Raised for an unknown or ambiguous revision"""
+
+
+def digest(data):
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def split_chunks(data):
+    """Content-defined chunks of data; joined they give data back"""
+    chunks = []
+    start = end = lines = 0
+    for line in data.splitlines(keepends=True):
+        pieces = [line] if len(line) <= MAX_LINE else \
+            [line[i:i + MAX_LINE] for i in range(0, len(line), MAX_LINE)]
+        for piece in pieces:
+            end += len(piece)
+            lines += 1
+            if zlib.crc32(piece) & CHUNK_MASK == 0 or lines >= MAX_CHUNK_LINES:
+                chunks.append(data[start:end])
+                start, lines = end, 0
+    if start < len(data):
+        chunks.append(data[start:])
+    return chunks
+
+
+class BackupStore:
+    """SQLite-backed revision store shared by every device"""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # The fixer's worker processes snapshot concurrently
+        self._db = sqlite3.connect(str(self.path), timeout=30)
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def snapshot(self, path, data=None, note=''):
+        """Record the current contents of path (or data) as a revision
+
+        Returns the revision digest. Nothing is added to the history when
+        the path's latest revision already has these bytes.
+        """
+        path = str(Path(path).resolve())
+        if data is None:
+            data = Path(path).read_bytes()
+        data = bytes(data)
+        revision = digest(data)
+        with self._db:
+            if self.latest(path) == revision:
+                return revision
+            if not self._db.execute("SELECT 1 FROM revisions WHERE digest=?",
+                                    (revision,)).fetchone():
+                keys = []
+                for chunk in split_chunks(data):
+                    key = digest(chunk)
+                    keys.append(key)
+                    self._db.execute("INSERT OR IGNORE INTO chunks (digest, data) VALUES (?, ?)",
+                                     (key, zlib.compress(chunk, 9)))
+                self._db.execute("INSERT OR IGNORE INTO revisions (digest, size, chunks) "
+                                 "VALUES (?, ?, ?)", (revision, len(data), ' '.join(keys)))
+            self._db.execute("INSERT INTO history (path, revision, time, note) "
+                             "VALUES (?, ?, ?, ?)", (path, revision, time.time(), note))
+        return revision
+
+    def latest(self, path):
+        """Digest of the newest revision recorded for path, or None"""
+        row = self._db.execute("SELECT revision FROM history WHERE path=? "
+                               "ORDER BY id DESC LIMIT 1",
+                               (str(Path(path).resolve()),)).fetchone()
+        return row[0] if row else None
+
+    def history(self, path=None):
+        """[{path, revision, size, time, note}], oldest first"""
+        query = ("SELECT h.path, h.revision, r.size, h.time, h.note FROM history h "
+                 "JOIN revisions r ON r.digest = h.revision")
+        if path is None:
+            rows = self._db.execute(query + " ORDER BY h.id")
+        else:
+            rows = self._db.execute(query + " WHERE h.path=? ORDER BY h.id",
+                                    (str(Path(path).resolve()),))
+        return [{'path': p, 'revision': rev, 'size': size, 'time': t, 'note': note}
+                for p, rev, size, t, note in rows]
+
+    def resolve(self, prefix):
+        """Full digest for a revision digest or unique prefix"""
+        prefix = prefix.lower()
+        if len(prefix) < 4:
+            raise BackupError(f"Revision '{prefix}' is too short (4+ characters)")
+        rows = self._db.execute("SELECT digest FROM revisions WHERE digest >= ? AND digest < ? "
+                                "LIMIT 2", (prefix, prefix + 'g')).fetchall()
+        if not rows:
+            raise BackupError(f"No revision '{prefix}'")
+        if len(rows) > 1:
+            raise BackupError(f"Revision '{prefix}' is ambiguous")
+        return rows[0][0]
+
+    def read(self, revision):
+        """Bytes of a revision, checked against its digest"""
+        revision = self.resolve(revision)
+        size, keys = self._db.execute("SELECT size, chunks FROM revisions WHERE digest=?",
+                                      (revision,)).fetchone()
+        parts = []
+        for key in keys.split():
+            row = self._db.execute("SELECT data FROM chunks WHERE digest=?", (key,)).fetchone()
+            if row is None:
+                raise BackupError(f"Revision {revision[:12]} is missing chunk {key[:12]}")
+            parts.append(zlib.decompress(row[0]))
+        data = b''.join(parts)
+        if len(data) != size or digest(data) != revision:
+            raise BackupError(f"Revision {revision[:12]} is corrupt")
+        return data
+
+    def previous(self, path):
+        """Newest revision of path whose bytes differ from the file now"""
+        current = digest(Path(path).read_bytes()) if Path(path).exists() else None
+        for entry in reversed(self.history(path)):
+            if entry['revision'] != current:
+                return entry['revision']
+        return None
+
+    def restore(self, path, revision=None):
+        """Write a revision (default: the previous one) back to path
+
+        The contents being replaced are snapshotted first, so a restore
+        can itself be undone. Returns the restored revision digest.
+        """
+        revision = self.resolve(revision) if revision else self.previous(path)
+        if revision is None:
+            raise BackupError(f"No earlier revision of {path}")
+        data = self.read(revision)
+        if Path(path).exists():
+            self.snapshot(path, note='before restore')
+        atomic_write(path, data)
+        self.snapshot(path, data, note=f'restored {revision[:12]}')
+        return revision
+
+    def stats(self):
+        revisions, logical = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM revisions").fetchone()
+        chunks, stored = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM chunks").fetchone()
+        entries = self._db.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+        return {'history': entries, 'revisions': revisions, 'chunks': chunks,
+                'logical_bytes': logical, 'stored_bytes': stored}
+
+
+def import_backups(store, paths):
+    """Snapshot legacy '<device>.backup' copies as history of their device"""
+    imported = []
+    for root in paths:
+        root = Path(root)
+        backups = [root] if root.is_file() else sorted(root.glob('*.backup'))
+        for backup in backups:
+            device = backup.with_name(backup.name[:-len('.backup')])
+            store.snapshot(device, backup.read_bytes(),
+                           note=f'imported {backup.name} '
+                                f'({time.strftime("%Y-%m-%d", time.localtime(backup.stat().st_mtime))})')
+            imported.append(backup)
+    return imported
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Power Trio Arranger - Backup Store")
+    parser.add_argument('--store', default=str(DEFAULT_STORE_PATH),
+                        help="store database (default: %(default)s)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    snap = sub.add_parser('snapshot', help="record the current contents of files")
+    snap.add_argument('files', nargs='+')
+    snap.add_argument('--note', default='manual snapshot')
+    log = sub.add_parser('log', help="list revisions, of one file or of all")
+    log.add_argument('file', nargs='?')
+    restore = sub.add_parser('restore', help="write a revision back (default: previous)")
+    restore.add_argument('file')
+    restore.add_argument('revision', nargs='?')
+    cat = sub.add_parser('cat', help="write a revision's bytes to stdout or a file")
+    cat.add_argument('revision')
+    cat.add_argument('--output', '-o')
+    imp = sub.add_parser('import', help="import existing .backup copies")
+    imp.add_argument('paths', nargs='+', help=".backup files or directories holding them")
+    sub.add_parser('stats', help="store size and deduplication")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        with BackupStore(args.store) as store:
+            return _run(args, store)
+    except (OSError, sqlite3.Error, BackupError) as e:
+        print(f"❌ {e}")
+        return 1
+
+def _run(args, store):
+    if args.command == 'snapshot':
+        for path in args.files:
+            print(f"📦 {path}: {store.snapshot(path, note=args.note)[:12]}")
+    elif args.command == 'log':
+        entries = store.history(args.file)
+        for entry in entries:
+            stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry['time']))
+            where = '' if args.file else f"  {os.path.basename(entry['path'])}"
+            print(f"{entry['revision'][:12]}  {stamp}  {entry['size']:>8} B{where}  {entry['note']}")
+        if not entries:
+            print("ℹ️  No revisions recorded")
+    elif args.command == 'restore':
+        revision = store.restore(args.file, args.revision)
+        print(f"✅ Restored {args.file} to {revision[:12]}")
+    elif args.command == 'cat':
+        data = store.read(args.revision)
+        if args.output:
+            Path(args.output).write_bytes(data)
+        else:
+            sys.stdout.buffer.write(data)
+    elif args.command == 'import':
+        imported = import_backups(store, args.paths)
+        print(f"✅ Imported {len(imported)} backup(s); the .backup files can now be removed")
+    elif args.command == 'stats':
+        stats = store.stats()
+        ratio = stats['logical_bytes'] / stats['stored_bytes'] if stats['stored_bytes'] else 0
+        print(f"📦 {stats['history']} snapshot(s), {stats['revisions']} revision(s), "
+              f"{stats['chunks']} chunk(s)")
+        print(f"   {stats['logical_bytes']} B of revisions in {stats['stored_bytes']} B "
+              f"({ratio:.1f}x)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
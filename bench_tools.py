@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Tooling Benchmarks
+Times the Python tooling on synthetic large fixtures against JSON baselines
+
+Fixtures are generated once into a cache directory:
+
+- a .amxd device with a nested patcher of --boxes boxes (subpatchers
+  several levels deep) that also carries the node.script / shared dict /
+  dict_response wiring the analyzer rules look for
+- a .als set with --tracks MIDI tracks, each holding --clips chord clips,
+  rendered from the repo's DefaultLiveSet.als (about 0.65 MB of XML per
+  track, so the default is well over 100 MB decompressed)
+
+Each benchmark runs in a fresh worker process so its peak RSS is its
+own. The best of --repeat runs is compared against the baseline file;
+a benchmark that is slower than baseline * (1 + --time-tolerance) or
+uses more than baseline * (1 + --rss-tolerance) memory fails the run.
+--update records the current numbers as the new baseline. Without a
+baseline for the requested sizes and benchmarks there is nothing to
+check against, and the run fails unless --update is given.
+"""
+
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+from amxd_container import CHUNK_HEADER, dump_patcher
+from gzip_writer import open_gzip_writer
+from profiling import peak_rss_mb
+
+ROOT = Path(__file__).resolve().parent
+TEMPLATE_PATH = ROOT / "Application Docs" / "DefaultLiveSet.als"
+BASELINE_PATH = ROOT / "bench_baseline.json"
+FIXTURE_DIR = Path.home() / '.cache' / 'powertrio' / 'bench'
+
+DEFAULT_BOXES = 12000
+DEFAULT_TRACKS = 160
+DEFAULT_CLIPS = 8
+
+BOX_TEXTS = ['t b b', 'route chord bass', 'pack 0 0', 'unpack i i', 'zl.group 64',
+             'prepend set', 'sel 0 1', 'metro 125', 'counter 0 63', '+ 1']
+
+
+# -- fixture generators ---------------------------------------------------------
+
+def _box(box_id, text, x, **extra):
+    box = {'id': box_id, 'maxclass': 'newobj', 'text': text,
+           'numinlets': 2, 'numoutlets': 2, 'outlettype': ['', ''],
+           'patching_rect': [x % 1200, (x // 1200) * 22.0, 80.0, 22.0]}
+    box.update(extra)
+    return {'box': box}
+
+
+def _line(src, dst, outlet=0, inlet=0):
+    return {'patchline': {'source': [src, outlet], 'destination': [dst, inlet]}}
+
+
+def make_patcher_level(count, depth, fanout=4):
+    """One patcher level with count boxes in total, nested depth levels"""
+    own = count if depth == 0 else count // 2
+    child = (count - own) // fanout if depth else 0
+    boxes, lines = [], []
+    for i in range(own):
+        boxes.append(_box(f'obj-{i + 1}', BOX_TEXTS[i % len(BOX_TEXTS)], i * 90))
+        if i:
+            lines.append(_line(f'obj-{i}', f'obj-{i + 1}'))
+    for j in range(fanout if depth else 0):
+        box_id = f'obj-{own + j + 1}'
+        boxes.append(_box(box_id, f'p sub_{depth}_{j}', j * 90,
+                          patcher=make_patcher_level(child, depth - 1, fanout)))
+        lines.append(_line('obj-1', box_id))
+    return {'fileversion': 1, 'rect': [0, 0, 1200, 800], 'boxes': boxes, 'lines': lines}
+
+
+def make_patcher(boxes=DEFAULT_BOXES, depth=3):
+    """A device patcher with about `boxes` boxes and the Power Trio wiring"""
+    level = make_patcher_level(boxes, depth)
+    level['boxes'] += [
+        _box('obj-script', 'node.script bench.js @autostart 1', 0,
+             textfile={'filename': 'bench.js'},
+             saved_object_attributes={'autostart': 1}),
+        _box('obj-dict', 'dict ---power_trio_brain', 90,
+             saved_object_attributes={'embed': 0}),
+        _box('obj-prepend', 'prepend dict_response', 180),
+    ]
+    level['lines'] += [_line('obj-dict', 'obj-prepend'),
+                       _line('obj-prepend', 'obj-script'),
+                       _line('obj-script', 'obj-dict')]
+    return {'patcher': level}
+
+
+def write_amxd(path, patcher):
+    """Write a chunked midi .amxd around a patcher"""
+    payload = dump_patcher(patcher)
+    with open(path, 'wb') as f:
+        f.write(CHUNK_HEADER.pack(b'ampf', 4) + b'mmmm')
+        f.write(CHUNK_HEADER.pack(b'meta', 4) + b'\x01\x00\x00\x00')
+        f.write(CHUNK_HEADER.pack(b'ptch', len(payload)) + payload)
+
+
+def make_als(path, tracks=DEFAULT_TRACKS, clips=DEFAULT_CLIPS, template=TEMPLATE_PATH):
+    """Render a large set with chord clips on every track"""
+    from compile_song import midi_clip
+    from set_factory import compile_template
+
+    prototype = compile_template(template)
+    events = [None] * 64
+    for step in range(0, 64, 2):
+        events[step] = {'midi_notes': [48 + step % 12, 52 + step % 12, 55 + step % 12]}
+    clip = midi_clip({'length_beats': 16, 'events': events}, 'Bench', 10)
+    configs = [{'name': f'Bench {i + 1}', 'color': str(i % 70), 'annotation': ''}
+               for i in range(tracks)]
+    slots = {i: {s: clip for s in range(clips)} for i in range(tracks)}
+    with open_gzip_writer(path, level=1) as f:
+        for data in prototype.render(configs, scene_count=max(clips, 8), clips=slots):
+            f.write(data)
+
+
+def fixtures(directory, boxes, tracks, clips):
+    """Paths of the fixtures for these sizes, generating any that are missing"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    amxd = directory / f'bench_{boxes}_boxes.amxd'
+    als = directory / f'bench_{tracks}_tracks_{clips}_clips.als'
+    if not amxd.exists():
+        print(f"🛠️  Generating {amxd.name}...")
+        write_amxd(amxd, make_patcher(boxes))
+    if not als.exists():
+        print(f"🛠️  Generating {als.name}...")
+        make_als(als, tracks, clips)
+    return {'amxd': str(amxd), 'als': str(als)}
+
+
+# -- benchmarks -----------------------------------------------------------------
+
+def bench_extract_patcher(paths, scratch):
+    from amxd_container import extract_patcher
+    container, patcher = extract_patcher(paths['amxd'])
+    assert patcher is not None
+
+
+def bench_save_patcher(paths, scratch):
+    from amxd_container import extract_patcher, save_patcher
+    container, patcher = extract_patcher(paths['amxd'])
+    start = time.perf_counter()
+    save_patcher(os.path.join(scratch, 'saved.amxd'), container, patcher)
+    return time.perf_counter() - start
+
+
+def bench_check_device(paths, scratch):
+    from analyze_devices import check_device
+    result = check_device(paths['amxd'], 'Bench', 'bench.js', role='sequencer')
+    assert result['ok'], result['issues']
+
+
+def bench_scan_device(paths, scratch):
+    from analyze_devices import check_device
+    result = check_device(paths['amxd'], 'Bench', 'bench.js', role='sequencer', scan=True)
+    assert result['ok'], result['issues']
+
+
+def bench_create_power_trio_set(paths, scratch):
+    from create_power_trio_set import create_power_trio_set
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert create_power_trio_set(paths['als'], os.path.join(scratch, 'set.als'))
+
+
+def bench_create_simple_set(paths, scratch):
+    # The create_simple_set.py path: whole-file read + byte-level patch
+    from als_patch import patch_als_bytes
+    with gzip.open(paths['als'], 'rb') as f:
+        data = f.read()
+    edits = [{'track': i, 'name': f'{i + 1}-Track', 'annotation': 'bench'} for i in range(5)]
+    edits.append({'root': 'Creator', 'value': 'Power Trio Arranger'})
+    with open_gzip_writer(os.path.join(scratch, 'simple.als')) as f:
+        patch_als_bytes(data, edits, f)
+
+
+BENCHMARKS = {
+    'extract_patcher': bench_extract_patcher,
+    'save_patcher': bench_save_patcher,
+    'check_device': bench_check_device,
+    'scan_device': bench_scan_device,
+    'create_power_trio_set': bench_create_power_trio_set,
+    'create_simple_set': bench_create_simple_set,
+}
+
+
+def _run_one(name, paths):
+    with tempfile.TemporaryDirectory() as scratch:
+        start = time.perf_counter()
+        timed = BENCHMARKS[name](paths, scratch)
+        elapsed = time.perf_counter() - start
+    return {'seconds': elapsed if timed is None else timed, 'peak_rss_mb': peak_rss_mb()}
+
+
+def run_benchmark(name, paths, repeat=3):
+    """Best-of-repeat time and peak RSS, each run in a fresh process"""
+    runs = []
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+            runs.append(pool.submit(_run_one, name, paths).result())
+    return {'seconds': round(min(r['seconds'] for r in runs), 4),
+            'peak_rss_mb': round(min(r['peak_rss_mb'] for r in runs), 1)}
+
+
+# -- baselines ------------------------------------------------------------------
+
+def load_baseline(path):
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(results, baseline, time_tolerance, rss_tolerance):
+    """Return a list of regression messages"""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get('benchmarks', {}).get(name)
+        if base is None:
+            regressions.append(f"{name}: no baseline recorded")
+            continue
+        if current['seconds'] > base['seconds'] * (1 + time_tolerance):
+            regressions.append(f"{name}: {current['seconds']:.3f}s vs "
+                               f"baseline {base['seconds']:.3f}s")
+        if current['peak_rss_mb'] > base['peak_rss_mb'] * (1 + rss_tolerance):
+            regressions.append(f"{name}: peak RSS {current['peak_rss_mb']:.1f} MB vs "
+                               f"baseline {base['peak_rss_mb']:.1f} MB")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Power Trio Arranger - Tooling Benchmarks")
+    parser.add_argument('names', nargs='*',
+                        help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument('--update', action='store_true', help="write results as the baseline")
+    parser.add_argument('--fixtures', default=FIXTURE_DIR, help="fixture cache directory")
+    parser.add_argument('--boxes', type=int, default=DEFAULT_BOXES)
+    parser.add_argument('--tracks', type=int, default=DEFAULT_TRACKS)
+    parser.add_argument('--clips', type=int, default=DEFAULT_CLIPS)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--time-tolerance', type=float, default=0.25,
+                        help="allowed slowdown as a fraction (default 0.25)")
+    parser.add_argument('--rss-tolerance', type=float, default=0.15,
+                        help="allowed peak RSS growth as a fraction (default 0.15)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = args.names or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        print(f"❌ Unknown benchmark(s): {', '.join(unknown)}")
+        return 2
+    sizes = {'boxes': args.boxes, 'tracks': args.tracks, 'clips': args.clips}
+
+    print("Power Trio Arranger - Tooling Benchmarks")
+    print("="*60)
+    paths = fixtures(args.fixtures, **sizes)
+    for kind, path in paths.items():
+        print(f"📦 {kind}: {Path(path).name} ({os.path.getsize(path):,} bytes)")
+    print()
+
+    results = {}
+    for name in names:
+        results[name] = run_benchmark(name, paths, args.repeat)
+        print(f"   ⏱️  {name:<24} {results[name]['seconds']:>8.3f}s "
+              f"{results[name]['peak_rss_mb']:>8.1f} MB")
+
+    baseline = load_baseline(args.baseline)
+    if args.update:
+        merged = dict(baseline['benchmarks']) if baseline and baseline.get('sizes') == sizes else {}
+        merged.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'sizes': sizes,
+                       'python': platform.python_version(),
+                       'machine': platform.machine(),
+                       'benchmarks': merged}, f, indent=2)
+            f.write('\n')
+        print(f"\n💾 Baseline written to {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print(f"\n❌ No baseline at {args.baseline}; run with --update to record one")
+        return 2
+    if baseline.get('sizes') != sizes:
+        print(f"\n❌ Baseline was recorded for {baseline.get('sizes')}; "
+              f"run with --update to record one for {sizes}")
+        return 2
+    regressions = compare(results, baseline, args.time_tolerance, args.rss_tolerance)
+    if regressions:
+        print("\n❌ Regressions:")
+        for message in regressions:
+            print(f"   - {message}")
+        return 1
+    print("\n✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
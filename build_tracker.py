@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Build Tracker
+Remembers what each generated set was built from, so unchanged sets are skipped
+
+For every output the tracker records a fingerprint: the blake2b digest
+of each input file (template, song dump, device files, the generator's
+own modules) and of the build parameters (track configs, scene counts,
+compression settings), plus the digest of the output it wrote. An output
+is up to date when it still has those bytes and every fingerprint part
+matches. Input digests are cached by size and mtime, so a no-op run
+stats the files and hashes nothing.
+
+State is a JSON file under ~/.cache/powertrio. Generators take --force
+to rebuild regardless; with --reproducible (see gzip_writer.py) a forced
+rebuild of unchanged inputs gives the same bytes again.
+
+    python3 build_tracker.py                 # list tracked outputs
+    python3 build_tracker.py --forget FILE   # make FILE rebuild next time
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+from analysis_cache import file_digest
+
+DEFAULT_STATE_PATH = Path.home() / '.cache' / 'powertrio' / 'build_state.json'
+STATE_VERSION = 1
+
+
+def params_digest(params):
+    """Digest of JSON-serializable build parameters, independent of key order"""
+    data = json.dumps(params, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=20).hexdigest()
+
+
+def module_files(*paths):
+    """Source files of the given modules and of every repo module they import
+
+    Imports are read from the source, function-level ones included, and
+    followed transitively as long as they name a .py file next to the
+    importing one. The list does not depend on which modules happen to be
+    loaded, so a check before a build sees the same inputs as the record
+    after it.
+    """
+    found = []
+    pending = [Path(p).resolve() for p in paths]
+    while pending:
+        path = pending.pop()
+        if path in found:
+            continue
+        found.append(path)
+        tree = ast.parse(path.read_bytes(), filename=str(path))
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                source = path.with_name(name.split('.')[0] + '.py')
+                if source.exists():
+                    pending.append(source)
+    return sorted(found)
+
+
+class BuildTracker:
+    """Input fingerprints of generated outputs, persisted as JSON"""
+
+    def __init__(self, path=DEFAULT_STATE_PATH):
+        self.path = Path(path)
+        self.files = {}         # path -> [mtime_ns, size, digest]
+        self.outputs = {}       # path -> {'inputs': {path: digest}, 'params', 'digest'}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get('version') == STATE_VERSION:
+            self.files = state.get('files', {})
+            self.outputs = state.get('outputs', {})
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': STATE_VERSION, 'files': self.files,
+                       'outputs': self.outputs}, f, indent=1)
+        tmp.replace(self.path)
+
+    def digest(self, path):
+        """Digest of a file, rehashed only when its size or mtime changed
+
+        Returns None for a missing file, which then counts as an input
+        state of its own.
+        """
+        path = str(Path(path).resolve())
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.files.pop(path, None)
+            return None
+        cached = self.files.get(path)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        value = file_digest(path)
+        self.files[path] = [st.st_mtime_ns, st.st_size, value]
+        return value
+
+    def fingerprint(self, inputs, params):
+        return {'inputs': {str(Path(p).resolve()): self.digest(p) for p in inputs},
+                'params': params_digest(params)}
+
+    def stale_reason(self, output, inputs, params):
+        """Why output needs a rebuild, or None if it is up to date"""
+        key = str(Path(output).resolve())
+        entry = self.outputs.get(key)
+        if entry is None:
+            return "not built yet"
+        digest = self.digest(output)
+        if digest is None:
+            return "output missing"
+        if digest != entry['digest']:
+            return "output modified"
+        current = self.fingerprint(inputs, params)
+        if current['params'] != entry['params']:
+            return "parameters changed"
+        for path, value in current['inputs'].items():
+            if entry['inputs'].get(path, '') != value:
+                return f"{Path(path).name} changed"
+        if set(entry['inputs']) - set(current['inputs']):
+            return "inputs changed"
+        return None
+
+    def record(self, output, inputs, params):
+        """Store the fingerprint output was just built from"""
+        self.outputs[str(Path(output).resolve())] = dict(
+            self.fingerprint(inputs, params), digest=self.digest(output))
+
+    def forget(self, output):
+        return self.outputs.pop(str(Path(output).resolve()), None) is not None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Power Trio Arranger - Build Tracker")
+    parser.add_argument('--state', default=str(DEFAULT_STATE_PATH),
+                        help="tracker state file (default: %(default)s)")
+    parser.add_argument('--forget', nargs='+', metavar='FILE',
+                        help="drop outputs so the next run rebuilds them")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    tracker = BuildTracker(args.state)
+    if args.forget:
+        for output in args.forget:
+            status = "forgotten" if tracker.forget(output) else "was not tracked"
+            print(f"🧹 {output}: {status}")
+        tracker.save()
+        return 0
+    if not tracker.outputs:
+        print("ℹ️  No outputs tracked")
+    for output, entry in sorted(tracker.outputs.items()):
+        print(f"📦 {output}  ({entry['digest'][:12]}, {len(entry['inputs'])} input(s))")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Song Compiler
+Compiles a song_structure dump straight into Session View clips and scenes
+
+Offline replacement for track_3_conductor/lom_exporter.js, which creates
+every scene and clip through the Live API and sends one set_notes call
+per note per step. Here the song is read from a JSON dump of
+---power_trio_brain (or just its song_structure), every pattern is
+turned into a MidiClip in one pass over its events, and the whole set is
+written by create_power_trio_set() in a single streaming rewrite.
+
+Layout follows the exporter (track_3_conductor/schema.json):
+
+- timeline[i] -> scene i, named Scene_i; null slots give empty scenes
+- pattern events are 16th-note steps (0.25 beats); each chord's
+  midi_notes become 0.25-beat notes at velocity 100
+- the chord clip goes on LOM track 1 (2-Sequencer)
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from als_patch import encode_value
+from create_power_trio_set import TEMPLATE_PATH, TRACK_CONFIGS, create_power_trio_set
+
+SONG_PATH = Path("/Users/Matthew/PowerTrioArranger/song_structure.json")
+OUTPUT_PATH = Path("/Users/Matthew/PowerTrioArranger/PowerTrio_Song.als")
+
+CHORD_TRACK = 1
+STEP_BEATS = 0.25
+NOTE_BEATS = 0.25
+VELOCITY = 100
+STEPS = 64
+
+MIDI_CLIP = (
+    b'<MidiClip Id="0" Time="0"><LomId Value="0" /><LomIdView Value="0" />'
+    b'<CurrentStart Value="0" /><CurrentEnd Value="%(length)s" />'
+    b'<Loop><LoopStart Value="0" /><LoopEnd Value="%(length)s" />'
+    b'<StartRelative Value="0" /><LoopOn Value="true" /><OutMarker Value="%(length)s" />'
+    b'<HiddenLoopStart Value="0" /><HiddenLoopEnd Value="%(length)s" /></Loop>'
+    b'<Name Value="%(name)s" /><Annotation Value="" /><Color Value="%(color)s" />'
+    b'<LaunchMode Value="0" /><LaunchQuantisation Value="0" />'
+    b'<TimeSignature><TimeSignatures><RemoteableTimeSignature Id="0">'
+    b'<Numerator Value="4" /><Denominator Value="4" /><Time Value="0" />'
+    b'</RemoteableTimeSignature></TimeSignatures></TimeSignature>'
+    b'<Envelopes><Envelopes /></Envelopes>'
+    b'<ScrollerTimePreserver><LeftTime Value="0" /><RightTime Value="%(length)s" />'
+    b'</ScrollerTimePreserver>'
+    b'<TimeSelection><AnchorTime Value="0" /><OtherTime Value="0" /></TimeSelection>'
+    b'<Legato Value="false" /><Ram Value="false" />'
+    b'<GrooveSettings><GrooveId Value="-1" /></GrooveSettings>'
+    b'<Disabled Value="false" /><VelocityAmount Value="0" />'
+    b'<FollowAction><FollowTime Value="4" /><IsLinked Value="true" />'
+    b'<LoopIterations Value="1" /><FollowActionA Value="4" /><FollowActionB Value="0" />'
+    b'<FollowChanceA Value="100" /><FollowChanceB Value="0" /><JumpIndexA Value="0" />'
+    b'<JumpIndexB Value="0" /><FollowActionEnabled Value="false" /></FollowAction>'
+    b'<Grid><FixedNumerator Value="1" /><FixedDenominator Value="16" />'
+    b'<GridIntervalPixel Value="20" /><Ntoles Value="2" /><SnapToGrid Value="true" />'
+    b'<Fixed Value="false" /></Grid>'
+    b'<FreezeStart Value="0" /><FreezeEnd Value="0" /><IsWarped Value="true" />'
+    b'<TakeId Value="0" /><IsInKey Value="true" />'
+    b'<ScaleInformation><Root Value="0" /><Name Value="0" /></ScaleInformation>'
+    b'<Notes><KeyTracks>%(key_tracks)s</KeyTracks>'
+    b'<PerNoteEventStore><EventLists /></PerNoteEventStore><NoteProbabilityGroups />'
+    b'<ProbabilityGroupIdGenerator><NextId Value="1" /></ProbabilityGroupIdGenerator>'
+    b'<NoteIdGenerator><NextId Value="%(next_note_id)d" /></NoteIdGenerator></Notes>'
+    b'<BankSelectCoarse Value="-1" /><BankSelectFine Value="-1" />'
+    b'<ProgramChange Value="-1" /></MidiClip>'
+)
+NOTE_EVENT = (b'<MidiNoteEvent Time="%s" Duration="%s" Velocity="%d" '
+              b'OffVelocity="64" NoteId="%d" />')
+
+
+def beats(value):
+    """Format a beat position the way Live writes it (no trailing .0)"""
+    if value == int(value):
+        return b'%d' % value
+    return repr(float(value)).encode()
+
+
+def load_song(path):
+    """Read a brain or song_structure dump; returns (timeline, pattern_bank)
+
+    Patterns stored under a top-level 'patterns' dict (the key the
+    exporter reads) are merged into the bank.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    song = data.get('song_structure', data)
+    timeline = song.get('timeline') or []
+    bank = dict(data.get('patterns') or {})
+    bank.update(song.get('pattern_bank') or {})
+    return timeline, bank
+
+
+def resolve_pattern(key, bank):
+    """Pattern data for a timeline entry ('pattern_3', '3' or 3), or None"""
+    if key is None:
+        return None
+    key = str(key)
+    pattern = bank.get(key)
+    if pattern is None and not key.startswith('pattern_'):
+        pattern = bank.get(f'pattern_{key}')
+    if isinstance(pattern, str):
+        try:
+            pattern = json.loads(pattern)
+        except ValueError:
+            pattern = None
+    return pattern if isinstance(pattern, dict) else None
+
+
+def pattern_notes(pattern):
+    """Group a pattern's chord events into {midi key: [step, ...]}"""
+    events = pattern.get('events')
+    if not isinstance(events, list):
+        return {}
+    keys = {}
+    for step, chord in enumerate(events):
+        if not isinstance(chord, dict):
+            continue
+        for note in chord.get('midi_notes') or ():
+            keys.setdefault(int(note), []).append(step)
+    return keys
+
+
+def midi_clip(pattern, name, color=-1):
+    """Serialized MidiClip for one sequencer_buffer-shaped pattern"""
+    events = pattern.get('events')
+    length = pattern.get('length_beats') or \
+        (len(events) if isinstance(events, list) and events else STEPS) * STEP_BEATS
+    duration = beats(NOTE_BEATS)
+
+    key_tracks = []
+    note_id = 1
+    for track_id, (key, steps) in enumerate(sorted(pattern_notes(pattern).items())):
+        notes = []
+        for step in steps:
+            notes.append(NOTE_EVENT % (beats(step * STEP_BEATS), duration, VELOCITY, note_id))
+            note_id += 1
+        key_tracks.append(b'<KeyTrack Id="%d"><Notes>%s</Notes><MidiKey Value="%d" /></KeyTrack>'
+                          % (track_id, b''.join(notes), key))
+
+    return MIDI_CLIP % {
+        b'length': beats(length),
+        b'name': encode_value(name),
+        b'color': b'%d' % int(color),
+        b'key_tracks': b''.join(key_tracks),
+        b'next_note_id': note_id,
+    }
+
+
+def compile_clips(timeline, bank, color=-1):
+    """Scene names and {slot: clip XML} for the chord track"""
+    scene_names = []
+    clips = {}
+    for index, key in enumerate(timeline):
+        scene_names.append(f'Scene_{index}')
+        pattern = resolve_pattern(key, bank)
+        if pattern is not None:
+            name = pattern.get('section_name') or str(key)
+            clips[index] = midi_clip(pattern, name, color)
+    return scene_names, clips
+
+
+def compile_song(song_path=SONG_PATH, output_path=OUTPUT_PATH,
+                 template_path=TEMPLATE_PATH, track_configs=TRACK_CONFIGS):
+    """Write a set with one scene per timeline slot and its chord clips"""
+    song_path = Path(song_path)
+    if not song_path.exists():
+        print(f"❌ Song dump not found: {song_path}")
+        return False
+
+    print(f"📖 Reading {song_path.name}...")
+    timeline, bank = load_song(song_path)
+    if not timeline:
+        print("❌ song_structure.timeline is empty")
+        return False
+
+    color = track_configs[CHORD_TRACK]['color'] if CHORD_TRACK < len(track_configs) else -1
+    scene_names, clips = compile_clips(timeline, bank, color)
+    missing = [str(key) for i, key in enumerate(timeline) if key is not None and i not in clips]
+    print(f"🎼 {len(timeline)} scenes, {len(clips)} chord clips")
+    if missing:
+        print(f"⚠️  Pattern(s) not in bank: {', '.join(missing)}")
+
+    return create_power_trio_set(template_path, output_path, track_configs,
+                                 scene_names=scene_names,
+                                 clips={CHORD_TRACK: clips})
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Power Trio Arranger - Song Compiler")
+    parser.add_argument('song', nargs='?', default=SONG_PATH,
+                        help="JSON dump of ---power_trio_brain or its song_structure")
+    parser.add_argument('--output', '-o', default=OUTPUT_PATH, help="output .als")
+    parser.add_argument('--template', default=TEMPLATE_PATH, help="template .als")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    return 0 if compile_song(args.song, args.output, args.template) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
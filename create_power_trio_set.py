@@ -4,136 +4,155 @@ Power Trio Arranger - Ableton Set Generator
 Creates a properly configured .als file with all 5 devices
 """
 
-import gzip
-import xml.etree.ElementTree as ET
+import argparse
 from pathlib import Path
 from datetime import datetime
-from copy import deepcopy
 
-def create_power_trio_set():
-    """Create a complete Ableton set with all Power Trio devices"""
-    
-    # Read the default set as template
-    template_path = Path("/Users/Matthew/PowerTrioArranger/Application Docs/DefaultLiveSet.als")
+from als_stream import ContainerRewrite, rewrite_als, serialize_element
+from analyze_devices import DEVICES, DEVICES_DIR
+from build_tracker import BuildTracker, module_files
+from gzip_writer import DEFAULT_LEVEL, add_compression_args, header_mtime
+from profiling import NULL_PROFILER, add_profile_args, profiled
+from track_prototype import EMPTY_CLIP_SLOT, IdAllocator, load_track_prototype, scene_list
+
+TEMPLATE_PATH = Path("/Users/Matthew/PowerTrioArranger/Application Docs/DefaultLiveSet.als")
+OUTPUT_PATH = Path("/Users/Matthew/PowerTrioArranger/PowerTrio_Template.als")
+
+# The main track's clip slots, one per scene
+MAIN_CLIP_SLOTS = 'LiveSet/MainTrack/DeviceChain/FreezeSequencer/AudioSequencer/ClipSlotList'
+
+# Define the 5 tracks with proper configuration
+TRACK_CONFIGS = [
+    {
+        "name": "1-Chord Lab",
+        "color": "10",  # Yellow
+        "annotation": "APC64 Pad Input → Chord Generation"
+    },
+    {
+        "name": "2-Sequencer",
+        "color": "15",  # Orange
+        "annotation": "16-Step Chord Sequencer"
+    },
+    {
+        "name": "3-Global Brain",
+        "color": "59",  # Blue
+        "annotation": "Dictionary Manager (LOAD FIRST)"
+    },
+    {
+        "name": "4-Drums Bridge",
+        "color": "12",  # Red
+        "annotation": "GrooveWanderer Integration"
+    },
+    {
+        "name": "5-Bass Follower",
+        "color": "22",  # Green
+        "annotation": "Kick-Triggered Bass"
+    }
+]
+
+def create_power_trio_set(template_path=TEMPLATE_PATH, output_path=OUTPUT_PATH,
+                          track_configs=TRACK_CONFIGS, scene_count=None,
+                          scene_names=None, clips=None, profiler=NULL_PROFILER,
+                          compresslevel=DEFAULT_LEVEL, threads=None, mtime=None):
+    """Create a complete Ableton set with all Power Trio devices
+    
+    The template is streamed (see als_stream.py): only LiveSet/Tracks is
+    rewritten, and tracks are stamped out from a precompiled prototype of
+    its first MIDI track (see track_prototype.py) with fresh pointee ids,
+    so hundreds of tracks cost little more than five. scene_count, if
+    given, resizes the scene list and every track's clip slots;
+    scene_names names the scenes (and implies the count). clips maps a
+    track index to {slot index: serialized clip XML}. profiler (see
+    profiling.py) collects per-phase timings. compresslevel, threads and
+    the header mtime control the gzip writer (see gzip_writer.py).
+    """
+    template_path = Path(template_path)
+    output_path = Path(output_path)
     
     if not template_path.exists():
         print("❌ Template set not found")
         return False
     
-    print("📖 Reading template set...")
-    with gzip.open(template_path, 'rt', encoding='utf-8') as f:
-        content = f.read()
-    
-    print("✅ Template loaded")
-    
-    # Parse the XML
-    root = ET.fromstring(content)
+    print("📖 Streaming template set...")
     
-    # Find the Tracks element
-    liveset = root.find('LiveSet')
-    if liveset is None:
-        print("❌ LiveSet element not found")
-        return False
-    
-    tracks = liveset.find('Tracks')
-    if tracks is None:
-        print("❌ Tracks element not found")
-        return False
-    
-    # Get the first MIDI track as a template
-    template_track = tracks.find('MidiTrack')
-    if template_track is None:
+    try:
+        with profiler.phase('parse'):
+            prototype, next_id, template_scenes = load_track_prototype(template_path)
+    except ValueError:
         print("❌ No MIDI track found in template")
         return False
-    
     print("📋 Using existing MIDI track as template...")
     
-    # Clear existing tracks
-    tracks.clear()
-    
-    # Define the 5 tracks with proper configuration
-    track_configs = [
-        {
-            "name": "1-Chord Lab",
-            "color": "10",  # Yellow
-            "annotation": "APC64 Pad Input → Chord Generation"
-        },
-        {
-            "name": "2-Sequencer",
-            "color": "15",  # Orange
-            "annotation": "16-Step Chord Sequencer"
-        },
-        {
-            "name": "3-Global Brain",
-            "color": "59",  # Blue
-            "annotation": "Dictionary Manager (LOAD FIRST)"
-        },
-        {
-            "name": "4-Drums Bridge",
-            "color": "12",  # Red
-            "annotation": "GrooveWanderer Integration"
-        },
-        {
-            "name": "5-Bass Follower",
-            "color": "22",  # Green
-            "annotation": "Kick-Triggered Bass"
-        }
-    ]
-    
-    print(f"\n🎹 Creating {len(track_configs)} MIDI tracks...\n")
-    
-    for idx, config in enumerate(track_configs):
-        print(f"   Track {idx+1}: {config['name']}")
-        print(f"   └─ {config['annotation']}")
-        
-        # Deep copy the template track
-        track = deepcopy(template_track)
-        track.set('Id', str(idx))
-        
-        # Update track name
-        name_elem = track.find('Name')
-        if name_elem is not None:
-            effective_name = name_elem.find('EffectiveName')
-            if effective_name is not None:
-                effective_name.set('Value', config['name'])
-            annotation = name_elem.find('Annotation')
-            if annotation is not None:
-                annotation.set('Value', config['annotation'])
+    if scene_count is None:
+        scene_count = len(scene_names) if scene_names else template_scenes
+    clips = clips or {}
+    allocator = IdAllocator(next_id)
+    next_pointee_id = next_id + prototype.id_count * len(track_configs)
+    
+    def on_track(track):
+        # Clear existing tracks
+        return []
+    
+    def on_tracks_close():
+        print(f"\n🎹 Creating {len(track_configs)} MIDI tracks...\n")
+        for idx, config in enumerate(track_configs):
+            print(f"   Track {idx+1}: {config['name']}")
+            print(f"   └─ {config['annotation']}")
+            with profiler.phase('serialize'):
+                track = prototype.render(
+                    idx, allocator.allocate(prototype.id_count),
+                    fields={'name': config['name'],
+                            'annotation': config['annotation'],
+                            'color': config['color'],
+                            'unfolded': True},
+                    scene_count=scene_count,
+                    clips=clips.get(idx))
+            yield track
+    
+    containers = {'LiveSet/Tracks': ContainerRewrite(on_track, on_tracks_close)}
+    
+    if scene_count != template_scenes or scene_names:
+        scene = {}
         
-        # Update track color
-        color_elem = track.find('Color')
-        if color_elem is not None:
-            color_elem.set('Value', config['color'])
+        def on_scene(elem):
+            # Keep the first scene as a template
+            scene.setdefault('xml', serialize_element(elem))
+            return []
         
-        # Make track visible (unfolded)
-        unfolded_elem = track.find('TrackUnfolded')
-        if unfolded_elem is not None:
-            unfolded_elem.set('Value', 'true')
-        
-        # Add to tracks
-        tracks.append(track)
-    
-    # Update metadata
-    print("\n📝 Updating set metadata...")
-    root.set('Creator', 'Power Trio Arranger Generator')
-    
-    # Save the new set
-    output_path = Path("/Users/Matthew/PowerTrioArranger/PowerTrio_Template.als")
+        containers['LiveSet/Scenes'] = ContainerRewrite(
+            on_scene, lambda: scene_list(scene['xml'], scene_count, scene_names))
+        containers[MAIN_CLIP_SLOTS] = ContainerRewrite(
+            lambda elem: [], lambda: (EMPTY_CLIP_SLOT % i for i in range(scene_count)))
     
     print(f"\n💾 Saving to {output_path.name}...")
     
-    # Convert tree to string with proper formatting
-    xml_str = ET.tostring(root, encoding='utf-8')
+    # Update metadata on the root tag and NextPointeeId while streaming
+    stats = rewrite_als(
+        template_path,
+        output_path,
+        containers,
+        root_attrs={'Creator': 'Power Trio Arranger Generator'},
+        attr_overrides={'LiveSet/NextPointeeId': {'Value': str(next_pointee_id)}},
+        profiler=profiler,
+        compresslevel=compresslevel,
+        threads=threads,
+        mtime=mtime,
+    )
+    
+    if 'LiveSet/Tracks' not in stats['containers_seen']:
+        print("❌ LiveSet/Tracks element not found")
+        output_path.unlink()
+        return False
     
-    # Compress and save
-    with gzip.open(output_path, 'wb') as f:
-        f.write(xml_str)
+    print(f"✅ Streamed {stats['bytes_in']:,} bytes "
+          f"(largest track {stats['largest_child']:,} bytes)")
     
     print("\n" + "="*60)
     print("✅ SUCCESS - Ableton Set Created!")
     print("="*60)
     print(f"\nFile: {output_path}")
     print(f"Tracks: {len(track_configs)}")
+    print(f"Scenes: {scene_count}")
     print("\nTracks created:")
     for idx, config in enumerate(track_configs):
         print(f"  {idx+1}. {config['name']} - {config['annotation']}")
@@ -150,9 +169,37 @@ def create_power_trio_set():
     
     return True
 
+def build_inputs(template_path=TEMPLATE_PATH):
+    """Files a generated set depends on: template, devices and generator code"""
+    return ([Path(template_path)] + [DEVICES_DIR / filename for filename, *_ in DEVICES]
+            + module_files(__file__))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Power Trio Arranger - Ableton Set Generator")
+    parser.add_argument('--force', '-f', action='store_true',
+                        help="rebuild even if the output is up to date")
+    add_compression_args(parser)
+    add_profile_args(parser)
+    return parser.parse_args(argv)
+
 if __name__ == '__main__':
+    args = parse_args()
     try:
-        create_power_trio_set()
+        tracker = BuildTracker()
+        inputs = build_inputs()
+        params = {'tracks': TRACK_CONFIGS, 'compression': args.compression,
+                  'reproducible': args.reproducible}
+        reason = tracker.stale_reason(OUTPUT_PATH, inputs, params)
+        if reason is None and not args.force:
+            print(f"✅ {OUTPUT_PATH.name} is up to date (--force to rebuild)")
+        else:
+            print(f"🔁 Building {OUTPUT_PATH.name}: {reason or 'forced'}")
+            with profiled(args, 'create_power_trio_set') as profiler:
+                if create_power_trio_set(profiler=profiler, compresslevel=args.compression,
+                                         threads=args.threads,
+                                         mtime=header_mtime(args.reproducible)):
+                    tracker.record(OUTPUT_PATH, inputs, params)
+            tracker.save()
     except Exception as e:
         print(f"\n❌ Error: {e}")
         import traceback
@@ -3,23 +3,18 @@
 Simple approach: Just copy the template and change track names in XML
 """
 
+import argparse
 import gzip
-import re
 from pathlib import Path
 
+from als_patch import iter_patched, plan_patch
+from atomic_file import AtomicOutput
+from gzip_writer import DEFAULT_LEVEL, GzipBlockWriter, add_compression_args, header_mtime
+from profiling import NULL_PROFILER, add_profile_args, profiled
+
 template_path = Path("/Users/Matthew/PowerTrioArranger/Application Docs/DefaultLiveSet.als")
 output_path = Path("/Users/Matthew/PowerTrioArranger/PowerTrio_Template.als")
 
-print("📖 Reading template...")
-with gzip.open(template_path, 'rb') as f:
-    xml_bytes = f.read()
-
-# Decode to string
-xml_str = xml_bytes.decode('utf-8')
-
-print("✅ Template loaded")
-print(f"📏 Size: {len(xml_str)} characters")
-
 # Find all track names and update the first 5
 track_names = [
     "1-Chord Lab",
@@ -37,79 +32,66 @@ annotations = [
     "Kick-Triggered Bass"
 ]
 
-print("\n🎹 Updating track names...\n")
-
-# Find and replace EffectiveName values for the first 5 tracks
-count = 0
-offset = 0
-while count < 5:
-    # Find next EffectiveName
-    pattern = r'<EffectiveName Value="([^"]*)" />'
-    match = re.search(pattern, xml_str[offset:])
-    if not match:
-        break
-    
-    old_name = match.group(1)
-    new_name = track_names[count]
-    
-    # Replace
-    start = offset + match.start()
-    end = offset + match.end()
-    old_tag = xml_str[start:end]
-    new_tag = f'<EffectiveName Value="{new_name}" />'
-    
-    xml_str = xml_str[:start] + new_tag + xml_str[end:]
-    
-    print(f"   Track {count+1}: '{old_name}' → '{new_name}'")
-    
-    # Move past this match
-    offset = start + len(new_tag)
-    count += 1
-
-# Update annotations
-print("\n📝 Adding annotations...\n")
-count = 0
-offset = 0
-while count < 5:
-    # Find next Annotation
-    pattern = r'<Annotation Value="[^"]*" />'
-    match = re.search(pattern, xml_str[offset:])
-    if not match:
-        break
-    
-    # Replace with annotation
-    start = offset + match.start()
-    end = offset + match.end()
-    new_tag = f'<Annotation Value="{annotations[count]}" />'
-    
-    xml_str = xml_str[:start] + new_tag + xml_str[end:]
-    
-    print(f"   Track {count+1}: {annotations[count]}")
-    
-    # Move past this match
-    offset = start + len(new_tag)
-    count += 1
-
-# Update creator
-xml_str = xml_str.replace(
-    'Creator="Ableton Live 12.3.1"',
-    'Creator="Power Trio Arranger"'
-)
-
-print("\n💾 Saving...")
-
-# Encode back to bytes
-xml_bytes = xml_str.encode('utf-8')
-
-# Compress and save
-with gzip.open(output_path, 'wb') as f:
-    f.write(xml_bytes)
-
-print("\n" + "="*60)
-print("✅ SUCCESS - Ableton Set Created!")
-print("="*60)
-print(f"\nFile: {output_path}")
-print("\nTracks (load in this order):")
-for i, (name, desc) in enumerate(zip(track_names, annotations)):
-    print(f"  {i+1}. {name} - {desc}")
-print("\nNow open PowerTrio_Template.als in Ableton!")
+def create_simple_set(template_path=template_path, output_path=output_path,
+                      profiler=NULL_PROFILER, compresslevel=DEFAULT_LEVEL, threads=None,
+                      mtime=None):
+    """Copy the template with the first 5 tracks renamed and annotated"""
+    print("📖 Reading template...")
+    with open(template_path, 'rb') as raw, \
+            gzip.GzipFile(fileobj=profiler.reader(raw, 'read'), mode='rb') as f:
+        xml_bytes = profiler.reader(f, 'decompress').read()
+
+    print("✅ Template loaded")
+    print(f"📏 Size: {len(xml_bytes)} bytes")
+
+    # One declarative edit per track plus the creator attribute; the patch
+    # engine applies them all in a single pass over the raw bytes
+    edits = [
+        {"track": i, "name": name, "annotation": annotation}
+        for i, (name, annotation) in enumerate(zip(track_names, annotations))
+    ]
+    edits.append({"root": "Creator", "value": "Power Trio Arranger"})
+
+    print("\n💾 Patching and saving...")
+
+    with profiler.phase('parse'):
+        spans, report = plan_patch(xml_bytes, edits)
+
+    # Compress and save; the old set stays in place if anything fails
+    with AtomicOutput(output_path) as raw, \
+            GzipBlockWriter(profiler.writer(raw, 'write'), compresslevel, threads,
+                            filename=str(output_path), mtime=mtime) as f:
+        out = profiler.writer(f, 'compress')
+        for part in profiler.wrap(iter_patched, 'serialize')(xml_bytes, spans):
+            out.write(part)
+
+    print("\n🎹 Updated track names...\n")
+    for change in report:
+        if change.get('field') == 'name':
+            print(f"   Track {change['track']+1}: '{change['old']}' → '{change['new']}'")
+
+    print("\n📝 Added annotations...\n")
+    for change in report:
+        if change.get('field') == 'annotation':
+            print(f"   Track {change['track']+1}: {change['new']}")
+
+    print("\n" + "="*60)
+    print("✅ SUCCESS - Ableton Set Created!")
+    print("="*60)
+    print(f"\nFile: {output_path}")
+    print("\nTracks (load in this order):")
+    for i, (name, desc) in enumerate(zip(track_names, annotations)):
+        print(f"  {i+1}. {name} - {desc}")
+    print("\nNow open PowerTrio_Template.als in Ableton!")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Power Trio Arranger - Simple Set Generator")
+    add_compression_args(parser)
+    add_profile_args(parser)
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    args = parse_args()
+    with profiled(args, 'create_simple_set') as profiler:
+        create_simple_set(profiler=profiler, compresslevel=args.compression,
+                          threads=args.threads, mtime=header_mtime(args.reproducible))
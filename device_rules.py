@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Device Rule Engine
+Declarative device checks evaluated in a single patcher traversal
+
+Each rule declares the boxes it cares about (text selectors such as
+'node.script' or 'dict ---power_trio_brain', matched as whole tokens
+against a box's text) and the patchline patterns it needs, as
+(source selector, outlet, destination selector, inlet) with None for
+"any port". RuleEngine compiles the selectors of every active rule into
+token -> selector and (source, destination) -> pattern dispatch tables,
+then walks each patcher level once: boxes first, then only the lines
+touching a matched box. Rule functions run afterwards against the
+collected RuleContext, so adding a rule adds a table entry rather than
+another pass over the device.
+
+Which rules run is chosen per device role (ROLE_RULES), overridable from
+a JSON config mapping role -> [rule names].
+"""
+
+import json
+from collections import defaultdict
+
+from patcher_index import IndexedBox
+
+SCRIPT_BOX = 'node.script'
+DICT_BOX = 'dict ---power_trio_brain'
+PREPEND_BOX = 'prepend dict_response'
+
+RULES = {}
+
+
+class Rule:
+    """A registered check with its box selectors and patchline patterns"""
+
+    def __init__(self, name, func, boxes=(), lines=(), description=''):
+        self.name = name
+        self.func = func
+        self.boxes = tuple(boxes)
+        self.lines = tuple(lines)
+        self.description = description
+
+
+def rule(name, boxes=(), lines=()):
+    """Register a rule function under name"""
+    def register(func):
+        RULES[name] = Rule(name, func, boxes, lines, (func.__doc__ or '').strip())
+        return func
+    return register
+
+
+class RuleContext:
+    """Boxes and patchline matches collected for the active rules"""
+
+    def __init__(self, params):
+        self.params = params
+        self.boxes = defaultdict(list)   # selector -> [IndexedBox]
+        self.links = set()               # (rule name, pattern index)
+
+    def first(self, selector):
+        """First box matching selector, top level first, or None"""
+        found = self.boxes.get(selector)
+        return found[0] if found else None
+
+    def linked(self, rule_name, pattern):
+        """True if the rule's patchline pattern matched at least one line"""
+        return (rule_name, pattern) in self.links
+
+
+class RuleEngine:
+    """Compiles a set of rules into one visitor pass"""
+
+    def __init__(self, rule_names):
+        unknown = [n for n in rule_names if n not in RULES]
+        if unknown:
+            raise KeyError(f"Unknown rule(s): {', '.join(unknown)}")
+        self.rules = [RULES[n] for n in rule_names]
+
+        self._by_token = defaultdict(set)      # first token -> selectors
+        self._patterns = defaultdict(list)     # (src sel, dst sel) -> [(rule, i, outlet, inlet)]
+        for r in self.rules:
+            selectors = list(r.boxes)
+            for i, (src, outlet, dst, inlet) in enumerate(r.lines):
+                selectors += [src, dst]
+                self._patterns[(src, dst)].append((r.name, i, outlet, inlet))
+            for selector in selectors:
+                self._by_token[selector.split()[0]].add(selector)
+        self._want_lines = bool(self._patterns)
+
+    def _match(self, text):
+        tokens = text.split()
+        matched = []
+        for token in set(tokens):
+            for selector in self._by_token.get(token, ()):
+                if selector in text:
+                    matched.append(selector)
+        return matched
+
+    def matches(self, text):
+        """True if some active rule wants a box with this text"""
+        return bool(self._match(text))
+
+    def collect(self, patcher, params=None):
+        """Walk every patcher level once and return the RuleContext"""
+        ctx = RuleContext(params or {})
+        root = patcher.get('patcher', patcher)
+        pending = [((), root)]
+        while pending:
+            path, level = pending.pop(0)
+            selectors_of = {}
+            for i, entry in enumerate(level.get('boxes', [])):
+                box = entry.get('box', {})
+                matched = self._match(box.get('text', ''))
+                if matched:
+                    ref = IndexedBox(path, i, box)
+                    selectors_of[box.get('id')] = matched
+                    for selector in matched:
+                        ctx.boxes[selector].append(ref)
+                if isinstance(box.get('patcher'), dict):
+                    pending.append((path + (box.get('id'),), box['patcher']))
+
+            if not (self._want_lines and selectors_of):
+                continue
+            for entry in level.get('lines', []):
+                line = entry.get('patchline', {})
+                src = line.get('source', [])
+                dst = line.get('destination', [])
+                if len(src) < 2 or len(dst) < 2:
+                    continue
+                src_sels = selectors_of.get(src[0])
+                dst_sels = selectors_of.get(dst[0])
+                if not (src_sels and dst_sels):
+                    continue
+                for s in src_sels:
+                    for d in dst_sels:
+                        for name, i, outlet, inlet in self._patterns.get((s, d), ()):
+                            if (outlet is None or outlet == src[1]) and \
+                               (inlet is None or inlet == dst[1]):
+                                ctx.links.add((name, i))
+        return ctx
+
+    def run(self, patcher, result, params=None):
+        """Evaluate every rule, filling result sections and result['issues']"""
+        ctx = self.collect(patcher, params)
+        for r in self.rules:
+            r.func(ctx, result)
+        result['rules'] = [r.name for r in self.rules]
+        return result
+
+
+# -- rule sets ----------------------------------------------------------------
+
+DEFAULT_RULES = ['node_script', 'shared_dict']
+
+# Roles whose devices read the shared dict through a dict_response loop
+ROLE_RULES = {
+    'sequencer': DEFAULT_RULES + ['dict_response_loop'],
+    'bass': DEFAULT_RULES + ['dict_response_loop'],
+}
+
+
+def load_rule_config(path):
+    """Load a JSON object mapping role -> list of rule names"""
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    for role, names in config.items():
+        unknown = [n for n in names if n not in RULES]
+        if unknown:
+            raise KeyError(f"Role '{role}' uses unknown rule(s): {', '.join(unknown)}")
+    return config
+
+
+def rules_for_role(role, config=None):
+    """Rule names for a role: config first, then ROLE_RULES, then defaults"""
+    if config and role in config:
+        return list(config[role])
+    if config and 'default' in config and role not in ROLE_RULES:
+        return list(config['default'])
+    return list(ROLE_RULES.get(role, DEFAULT_RULES))
+
+
+# -- rules --------------------------------------------------------------------
+
+@rule('node_script', boxes=[SCRIPT_BOX])
+def check_node_script(ctx, result):
+    """node.script exists, points at the expected script and autostarts"""
+    ref = ctx.first(SCRIPT_BOX)
+    if ref is None:
+        result['issues'].append("node.script object not found")
+        return
+    script_obj = ref.box
+    expected_script = ctx.params.get('expected_script')
+    textfile = script_obj.get('textfile', {})
+    saved_attrs = script_obj.get('saved_object_attributes', {})
+    filename_field = textfile.get('filename', '')
+    info = result['node_script'] = {
+        'text': script_obj.get('text', ''),
+        'filename': textfile.get('filename', 'N/A'),
+        'autostart': saved_attrs.get('autostart', 'N/A'),
+        'path_ok': expected_script is None or expected_script in filename_field,
+        'autostart_ok': saved_attrs.get('autostart') == 1,
+    }
+
+    # Check script path
+    if not info['path_ok']:
+        result['issues'].append(
+            f"Script path is '{filename_field}', should be '{expected_script}'")
+
+    # Check autostart
+    if not info['autostart_ok']:
+        result['issues'].append(
+            f"@autostart is {saved_attrs.get('autostart')}, should be 1")
+
+
+@rule('shared_dict', boxes=[DICT_BOX])
+def check_shared_dict(ctx, result):
+    """dict ---power_trio_brain exists and uses the shared dict (@embed 0)"""
+    ref = ctx.first(DICT_BOX)
+    if ref is None:
+        result['issues'].append("dict ---power_trio_brain object not found")
+        return
+    embed = ref.box.get('saved_object_attributes', {}).get('embed', 0)
+    result['dict'] = {'embed': embed, 'ok': embed != 1}
+    if embed == 1:
+        result['issues'].append("Dict has @embed 1, should be 0 (shared dict)")
+
+
+@rule('dict_response_loop',
+      boxes=[DICT_BOX, SCRIPT_BOX, PREPEND_BOX],
+      lines=[(DICT_BOX, 0, PREPEND_BOX, None),
+             (PREPEND_BOX, None, SCRIPT_BOX, 0)])
+def check_dict_response_loop(ctx, result):
+    """dict left outlet -> prepend dict_response -> node.script left inlet"""
+    if not all(ctx.first(s) for s in (DICT_BOX, SCRIPT_BOX, PREPEND_BOX)):
+        has_loop, status = False, "Missing objects"
+    elif ctx.linked('dict_response_loop', 0) and ctx.linked('dict_response_loop', 1):
+        has_loop, status = True, "Complete"
+    else:
+        has_loop, status = False, "Loop exists but not connected properly"
+    result['response_loop'] = {'ok': has_loop, 'status': status}
+    if not has_loop:
+        result['issues'].append(f"CRITICAL: Response loop issue - {status}")
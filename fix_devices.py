@@ -4,126 +4,228 @@ Device Fixer for Power Trio Arranger
 Automatically fixes .amxd file issues
 """
 
-import json
+import argparse
+import difflib
 import sys
-import shutil
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-def extract_patcher(filename):
-    """Extract JSON patcher data from .amxd file"""
-    with open(filename, 'rb') as f:
-        data = f.read()
-        json_start = data.find(b'{')
-        if json_start != -1:
-            header = data[:json_start]
-            json_data = data[json_start:].decode('utf-8', errors='ignore')
-            json_end = json_data.rfind('}') + 1
-            json_data = json_data[:json_end]
-            try:
-                patcher = json.loads(json_data)
-                return header, patcher
-            except Exception as e:
-                print(f"Error parsing JSON: {e}")
-                return None, None
-    return None, None
+from amxd_container import AmxdContainer, AmxdError
+from atomic_file import atomic_write
+from backup_store import DEFAULT_STORE_PATH, BackupStore
+from patcher_index import PatcherIndex
+from json_spans import JsonSpanError, replace_values
+from profiling import NULL_PROFILER, add_profile_args, profiled
+import analyze_devices
 
-def save_patcher(filename, header, patcher):
-    """Save patcher data back to .amxd file"""
-    with open(filename, 'wb') as f:
-        f.write(header)
-        json_str = json.dumps(patcher, indent="\t", ensure_ascii=False)
-        f.write(json_str.encode('utf-8'))
-
-def fix_node_script_path(patcher, expected_path):
-    """Fix node.script textfile filename to include folder path"""
-    boxes = patcher.get('patcher', {}).get('boxes', [])
-    fixed = False
-    
-    for box in boxes:
-        obj = box.get('box', {})
-        text = obj.get('text', '')
-        
-        if 'node.script' in text:
-            textfile = obj.get('textfile', {})
-            current_filename = textfile.get('filename', '')
-            
-            if expected_path not in current_filename:
-                print(f"   Fixing: '{current_filename}' → '{expected_path}'")
-                textfile['filename'] = expected_path
-                fixed = True
-            else:
-                print(f"   ✅ Already correct: {current_filename}")
+def plan_script_path_fixes(patcher, expected_path):
+    """Return [(json_path, old, new)] for node.script boxes with a wrong path
     
-    return fixed
+    Only boxes that already carry textfile.filename can be patched in
+    place; others are reported with json_path None.
+    """
+    index = PatcherIndex(patcher)
+    fixes = []
+    for ref in index.find_text('node.script'):
+        textfile = ref.box.get('textfile')
+        if not isinstance(textfile, dict) or 'filename' not in textfile:
+            fixes.append((None, None, expected_path))
+            continue
+        current_filename = textfile['filename']
+        if expected_path not in current_filename:
+            fixes.append((index.json_path(ref, 'textfile', 'filename'),
+                          current_filename, expected_path))
+    return fixes
 
-def fix_device(filename, device_name, expected_script):
-    """Fix a device file"""
-    print(f"\n{'='*60}")
-    print(f"Fixing: {device_name}")
-    print(f"{'='*60}")
+def payload_diff(name, old, new):
+    """Unified diff between two patcher payloads"""
+    old_lines = bytes(old).decode('utf-8', 'replace').rstrip('\0').splitlines(keepends=True)
+    new_lines = bytes(new).decode('utf-8', 'replace').rstrip('\0').splitlines(keepends=True)
+    return ''.join(difflib.unified_diff(old_lines, new_lines, f'a/{name}', f'b/{name}'))
+
+def plan_device_fix(filename, device_name, expected_script, dry_run=False,
+                    profiler=NULL_PROFILER, store_path=DEFAULT_STORE_PATH):
+    """Fix one device, patching only the changed bytes of its ptch payload
     
-    # Backup first
-    backup_path = Path(str(filename) + '.backup')
-    if not backup_path.exists():
-        shutil.copy2(filename, backup_path)
-        print(f"   📦 Backup created: {backup_path.name}")
+    Returns a JSON-serializable result; nothing is written when dry_run
+    is set, and the result then carries a unified diff instead. The
+    device is snapshotted into the backup store before and after it is
+    written, and result['backup'] is the revision it can be restored to.
+    """
+    filename = Path(filename)
+    result = {
+        'file': str(filename),
+        'device': device_name,
+        'changes': [],
+        'skipped': 0,
+        'repair_length': False,
+        'written': False,
+        'backup': None,
+        'diff': '',
+        'error': None,
+    }
+    try:
+        with profiler.phase('read'):
+            container = AmxdContainer.read(filename)
+        with profiler.phase('parse'):
+            raw = container.payload()
+            patcher = container.patcher()
+    except (OSError, AmxdError) as e:
+        result['error'] = f"Could not read patcher data: {e}"
+        return result
     
-    header, patcher = extract_patcher(filename)
-    if not patcher:
-        print("   ❌ Could not read patcher data")
-        return False
+    with profiler.phase('transform'):
+        fixes = plan_script_path_fixes(patcher, expected_script) if expected_script else []
+    changes = {path: new for path, old, new in fixes if path is not None}
+    result['skipped'] = sum(1 for path, _, _ in fixes if path is None)
+    result['changes'] = [{'path': list(path), 'old': old, 'new': new}
+                         for path, old, new in fixes if path is not None]
+    result['repair_length'] = container.stale_length
+    if not changes and not container.stale_length:
+        return result
     
-    # Fix script path
-    fixed = fix_node_script_path(patcher, expected_script)
+    try:
+        with profiler.phase('serialize'):
+            new_payload = replace_values(raw, changes) if changes else bytes(raw)
+    except JsonSpanError as e:
+        result['error'] = f"Could not patch ptch payload: {e}"
+        return result
+    if dry_run:
+        with profiler.phase('serialize'):
+            result['diff'] = payload_diff(filename.name, raw, new_payload)
+        return result
     
-    if fixed:
-        # Save changes
-        save_patcher(filename, header, patcher)
+    with profiler.phase('serialize'):
+        data = container.serialize(new_payload)
+    with profiler.phase('write'), BackupStore(store_path) as store:
+        # Backup first
+        result['backup'] = store.snapshot(filename, note='before fix')
+        atomic_write(filename, data)
+        store.snapshot(filename, data, note='fixed')
+    result['written'] = True
+    return result
+
+def _fix_job(job):
+    """Process-pool entry point: job is (path, name, expected_script, dry_run, store_path)"""
+    *job, store_path = job
+    return plan_device_fix(*job, store_path=store_path)
+
+def print_fix_report(result):
+    """Print the human-readable report for one plan_device_fix() result"""
+    print(f"\n{'='*60}")
+    print(f"Fixing: {result['device']}")
+    print(f"{'='*60}")
+    if result['error']:
+        print(f"   ❌ {result['error']}")
+        return
+    if result['backup']:
+        print(f"   📦 Backup recorded: {result['backup'][:12]}")
+    for change in result['changes']:
+        print(f"   Fixing: '{change['old']}' → '{change['new']}'")
+    if result['skipped']:
+        print(f"   ⚠️  {result['skipped']} node.script box(es) have no textfile.filename")
+    if result['repair_length']:
+        print(f"   Repairing stale ptch chunk length")
+    if result['diff']:
+        print(result['diff'], end='')
+    if result['written']:
         print(f"   ✅ Device updated successfully")
-        return True
-    else:
+    elif not (result['changes'] or result['repair_length']):
         print(f"   ℹ️  No changes needed")
-        return False
 
-def main():
-    devices_dir = Path("/Users/Matthew/PowerTrioArranger/Application Docs/M4LDevices")
+def fix_device(filename, device_name, expected_script, dry_run=False,
+               store_path=DEFAULT_STORE_PATH):
+    """Fix a device file"""
+    result = plan_device_fix(filename, device_name, expected_script, dry_run,
+                             store_path=store_path)
+    print_fix_report(result)
+    return result['written']
+
+def run_fixes(jobs, workers=None, profiler=NULL_PROFILER):
+    """Fix every job across a process pool, results in job order
     
-    devices = [
-        ("Track_1_Chord_Lab.amxd", "Track 1: Chord Lab", "track_1_chord_lab/logic.js"),
-        ("Track_2_Sequencer.amxd", "Track 2: Sequencer", "track_2_sequencer/sequencer.js"),
-        ("Track_3_Global_Brain.amxd", "Track 3: Global Brain", "shared/dict_init.js"),
-        ("Track_4_Bridge.amxd", "Track 4: Bridge", "track_4_drums/groove_wanderer_bridge.js"),
-        ("Track_5_Bass_Follower.amxd", "Track 5: Bass Follower", "track_5_bass/bass_follower.js"),
-    ]
+    While profiling, jobs run in this process so every phase is recorded.
+    """
+    if profiler.enabled:
+        return [plan_device_fix(*job[:4], profiler=profiler, store_path=job[4]) for job in jobs]
+    if workers == 1 or len(jobs) < 2:
+        return [_fix_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_fix_job, jobs))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Power Trio Arranger - Device Fixer")
+    parser.add_argument('paths', nargs='*',
+                        help="device files, directories or globs (batch mode)")
+    parser.add_argument('--manifest', help="JSON manifest: filename -> {script, role, name}")
+    parser.add_argument('--yes', '-y', action='store_true', help="do not ask for confirmation")
+    parser.add_argument('--dry-run', '-n', action='store_true',
+                        help="print a unified diff instead of writing")
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help="worker processes (default: CPU count)")
+    parser.add_argument('--backup-store', default=str(DEFAULT_STORE_PATH),
+                        help="backup store database (default: %(default)s)")
+    add_profile_args(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    with profiled(args, 'fix_devices') as profiler:
+        return _main(args, profiler)
+
+def _main(args, profiler):
     
     print("Power Trio Arranger - Device Fixer")
     print("="*60)
-    print("\nThis will update script paths in all devices.")
-    print("Backups will be created automatically.\n")
+    if args.dry_run:
+        print("\nDry run: showing changes, nothing will be written.\n")
+    else:
+        print("\nThis will update script paths in all devices.")
+        print("Backups will be created automatically.\n")
     
-    response = input("Proceed? [y/N]: ").strip().lower()
-    if response != 'y':
-        print("Cancelled.")
-        return 0
+    if not (args.yes or args.dry_run):
+        response = input("Proceed? [y/N]: ").strip().lower()
+        if response != 'y':
+            print("Cancelled.")
+            return 0
     
+    if args.paths:
+        manifest = (analyze_devices.load_manifest(args.manifest) if args.manifest
+                    else analyze_devices.default_manifest())
+        paths = analyze_devices.expand_paths(args.paths)
+        jobs = [(job[0], job[1], job[2], args.dry_run, args.backup_store)
+                for job in analyze_devices.build_jobs(paths, manifest)]
+    else:
+        jobs = []
+        for filename, name, expected_script, role in analyze_devices.DEVICES:
+            filepath = analyze_devices.DEVICES_DIR / filename
+            if filepath.exists():
+                jobs.append((str(filepath), name, expected_script, args.dry_run,
+                             args.backup_store))
+            else:
+                print(f"\n❌ {filename} not found")
+    
+    results = run_fixes(jobs, args.jobs, profiler)
     fixed_count = 0
-    for filename, name, expected_script in devices:
-        filepath = devices_dir / filename
-        if filepath.exists():
-            if fix_device(filepath, name, expected_script):
-                fixed_count += 1
-        else:
-            print(f"\n❌ {filename} not found")
+    pending_count = 0
+    for result in results:
+        print_fix_report(result)
+        fixed_count += result['written']
+        pending_count += bool(result['changes'] or result['repair_length'])
     
     print(f"\n{'='*60}")
     print("Summary")
     print(f"{'='*60}")
+    if args.dry_run:
+        print(f"{pending_count} device(s) would be changed")
+        return 0
     print(f"Fixed {fixed_count} device(s)")
     print("\nNext steps:")
     print("1. Load devices in Ableton")
     print("2. Check Max Console for startup messages")
     print("3. Test functionality")
-    print("\nIf issues occur, restore from .backup files")
+    print("\nIf issues occur, restore the previous revision with:")
+    print("   python3 backup_store.py restore <device.amxd>")
     
     return 0
 
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Parallel Gzip Writer
+Block-parallel gzip compression for .als output
+
+Live opens any standard single-member gzip file. GzipBlockWriter cuts
+the uncompressed stream into fixed-size blocks and deflates them in a
+thread pool (zlib releases the GIL), the way pigz does:
+
+- every block but the last ends with a sync flush, so the compressed
+  blocks concatenate into one valid deflate stream
+- each block is primed with the last 32 KB of the block before it as a
+  preset dictionary, so matches across block boundaries are not lost
+  and the ratio stays within a fraction of a percent of plain gzip
+- the CRC32 and length in the trailer are accumulated in order as
+  blocks are written
+
+Blocks have a fixed size, so the output bytes do not depend on the
+number of threads. The header's mtime is the only other varying field;
+with --reproducible it is fixed (see header_mtime()) and the same input
+gives byte-identical files. At most 2 * threads blocks are in flight,
+which bounds memory to a few MB regardless of the set size.
+
+Leaving the writer's with block on an exception aborts it: the last
+block and the trailer are never written, so a failed run cannot end in
+a short stream that still gunzips cleanly. open_gzip_writer() also
+writes through an AtomicOutput, so the previous file at the path stays
+in place until the stream is complete.
+"""
+
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from atomic_file import AtomicOutput
+
+BLOCK_SIZE = 1 << 20
+WINDOW = 32 << 10
+
+COMPRESSION_LEVELS = {'fast': 1, 'default': 6, 'max': 9}
+DEFAULT_LEVEL = 9
+
+
+def compression_level(value):
+    """Parse 'fast' / 'default' / 'max' or 0-9 (argparse type)"""
+    if value in COMPRESSION_LEVELS:
+        return COMPRESSION_LEVELS[value]
+    level = int(value)
+    if not 0 <= level <= 9:
+        raise ValueError(f"Compression level must be 0-9, got {level}")
+    return level
+
+
+def _deflate(level, data, dictionary, last):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS,
+                                  zlib.DEF_MEM_LEVEL, zlib.Z_DEFAULT_STRATEGY,
+                                  *([dictionary] if dictionary else []))
+    out = compressor.compress(data)
+    return out + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class GzipBlockWriter:
+    """Write-only file object producing a gzip stream from parallel blocks"""
+
+    def __init__(self, fileobj, level=DEFAULT_LEVEL, threads=None,
+                 block_size=BLOCK_SIZE, filename='', mtime=None):
+        self.fileobj = fileobj
+        self.level = level
+        self.block_size = block_size
+        self.threads = threads or os.cpu_count() or 1
+        self._pool = ThreadPoolExecutor(max_workers=self.threads) if self.threads > 1 else None
+        self._pending = []          # futures (or bytes) in stream order
+        self._buf = bytearray()
+        self._dictionary = b''
+        self._crc = 0
+        self._size = 0
+        self.closed = False
+        self._write_header(filename, mtime)
+
+    def _write_header(self, filename, mtime):
+        name = os.path.basename(filename or '')
+        if name.endswith('.gz'):
+            name = name[:-3]
+        name = name.encode('latin-1', 'replace')
+        flags = 0x08 if name else 0
+        mtime = int(time.time() if mtime is None else mtime)
+        xfl = 2 if self.level == 9 else 4 if self.level == 1 else 0
+        header = b'\x1f\x8b\x08' + struct.pack('<BIBB', flags, mtime, xfl, 255)
+        if name:
+            header += name + b'\0'
+        self.fileobj.write(header)
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("write to closed GzipBlockWriter")
+        view = memoryview(data).cast('B')
+        pos = 0
+        if self._buf:
+            pos = min(len(view), self.block_size - len(self._buf))
+            self._buf += view[:pos]
+            if len(self._buf) < self.block_size:
+                return len(view)
+            self._submit(bytes(self._buf), last=False)
+            self._buf = bytearray()
+        # Whole blocks are cut straight from the caller's buffer
+        while len(view) - pos >= self.block_size:
+            self._submit(bytes(view[pos:pos + self.block_size]), last=False)
+            pos += self.block_size
+        self._buf += view[pos:]
+        return len(view)
+
+    def _submit(self, block, last):
+        self._crc = zlib.crc32(block, self._crc)
+        self._size += len(block)
+        dictionary = self._dictionary
+        self._dictionary = (block if len(block) >= WINDOW else dictionary + block)[-WINDOW:]
+        if self._pool is None:
+            self._pending.append(_deflate(self.level, block, dictionary, last))
+        else:
+            self._pending.append(self._pool.submit(_deflate, self.level, block, dictionary, last))
+        self._drain(2 * self.threads)
+
+    def _drain(self, keep):
+        while len(self._pending) > keep:
+            item = self._pending.pop(0)
+            self.fileobj.write(item if isinstance(item, bytes) else item.result())
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self._submit(bytes(self._buf), last=True)
+            self._buf = bytearray()
+            self._drain(0)
+            self.fileobj.write(struct.pack('<II', self._crc & 0xFFFFFFFF,
+                                           self._size & 0xFFFFFFFF))
+        finally:
+            self.closed = True
+            if self._pool is not None:
+                self._pool.shutdown()
+
+    def abort(self):
+        """Stop without writing the last block or the trailer"""
+        if self.closed:
+            return
+        self.closed = True
+        self._pending = []
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class _OwnedWriter(GzipBlockWriter):
+    """GzipBlockWriter over an AtomicOutput it commits on close"""
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            super().close()
+        except BaseException:
+            self.fileobj.discard()
+            raise
+        self.fileobj.commit()
+
+    def abort(self):
+        super().abort()
+        self.fileobj.discard()
+
+
+def open_gzip_writer(path, level=DEFAULT_LEVEL, threads=None, block_size=BLOCK_SIZE,
+                     mtime=None):
+    """Open path for writing as a parallel gzip stream
+
+    Nothing appears at path until the writer is closed; on abort (or an
+    exception in its with block) the previous file is kept.
+    """
+    output = AtomicOutput(path)
+    try:
+        return _OwnedWriter(output, level, threads, block_size, filename=str(path),
+                            mtime=mtime)
+    except BaseException:
+        output.discard()
+        raise
+
+
+def header_mtime(reproducible):
+    """Gzip header mtime: None (now), or SOURCE_DATE_EPOCH / 0 when reproducible"""
+    if not reproducible:
+        return None
+    return int(os.environ.get('SOURCE_DATE_EPOCH', 0))
+
+
+def add_compression_args(parser):
+    """Add --compression and --threads to an ArgumentParser"""
+    parser.add_argument('--compression', '-z', type=compression_level, default=DEFAULT_LEVEL,
+                        metavar='LEVEL',
+                        help="gzip level: fast, default, max or 0-9 (default: max)")
+    parser.add_argument('--threads', type=int, default=None,
+                        help="compression threads (default: CPU count)")
+    parser.add_argument('--reproducible', action='store_true',
+                        help="byte-identical output: gzip mtime from SOURCE_DATE_EPOCH or 0")
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - JSON Value Spans
+Locates the raw byte span of specific values inside a JSON document
+
+Used to patch a patcher payload in place: instead of re-serializing the
+whole document, only the bytes of the changed values are replaced.
+Paths are tuples of object keys and array indices, for example
+
+    ('patcher', 'boxes', 3, 'box', 'textfile', 'filename')
+
+The locator descends only into containers on the way to a target and
+skips everything else by bracket matching, so the cost is roughly one
+regex scan over the document.
+"""
+
+import json
+import re
+
+_WS = re.compile(rb'[ \t\r\n]*')
+_STRING = re.compile(rb'"(?:[^"\\]|\\.)*"', re.S)
+_SCALAR = re.compile(rb'[^\s,\]}]+')
+_STRUCT = re.compile(rb'["\[\]{}]')
+
+
+class JsonSpanError(ValueError):
+    """Raised when the document is not valid enough to walk"""
+
+
+class _Locator:
+
+    def __init__(self, data, targets):
+        self.data = data
+        self.targets = set(targets)
+        self.prefixes = {t[:i] for t in self.targets for i in range(len(t))}
+        self.found = {}
+
+    def ws(self, pos):
+        return _WS.match(self.data, pos).end()
+
+    def expect(self, pos, char):
+        pos = self.ws(pos)
+        if self.data[pos:pos + 1] != char:
+            raise JsonSpanError(f"Expected {char!r} at byte {pos}")
+        return pos + 1
+
+    def skip(self, pos):
+        data = self.data
+        c = data[pos:pos + 1]
+        if c == b'"':
+            return _STRING.match(data, pos).end()
+        if c in (b'{', b'['):
+            depth = 0
+            while True:
+                m = _STRUCT.search(data, pos)
+                if m is None:
+                    raise JsonSpanError("Unbalanced brackets")
+                ch = m.group()
+                if ch == b'"':
+                    pos = _STRING.match(data, m.start()).end()
+                    continue
+                depth += 1 if ch in (b'{', b'[') else -1
+                pos = m.end()
+                if depth == 0:
+                    return pos
+        m = _SCALAR.match(data, pos)
+        if m is None:
+            raise JsonSpanError(f"Unexpected byte at {pos}")
+        return m.end()
+
+    def value(self, pos, path):
+        data = self.data
+        pos = self.ws(pos)
+        if path in self.targets:
+            end = self.skip(pos)
+            self.found[path] = (pos, end)
+            return end
+        if path not in self.prefixes:
+            return self.skip(pos)
+
+        c = data[pos:pos + 1]
+        if c == b'{':
+            pos = self.ws(pos + 1)
+            if data[pos:pos + 1] == b'}':
+                return pos + 1
+            while True:
+                pos = self.ws(pos)
+                m = _STRING.match(data, pos)
+                if m is None:
+                    raise JsonSpanError(f"Expected key at byte {pos}")
+                key = json.loads(m.group())
+                pos = self.expect(m.end(), b':')
+                pos = self.value(pos, path + (key,))
+                pos = self.ws(pos)
+                if data[pos:pos + 1] == b',':
+                    pos += 1
+                    continue
+                return self.expect(pos, b'}')
+        if c == b'[':
+            pos = self.ws(pos + 1)
+            if data[pos:pos + 1] == b']':
+                return pos + 1
+            index = 0
+            while True:
+                pos = self.value(pos, path + (index,))
+                index += 1
+                pos = self.ws(pos)
+                if data[pos:pos + 1] == b',':
+                    pos += 1
+                    continue
+                return self.expect(pos, b']')
+        return self.skip(pos)
+
+
+def locate(data, targets):
+    """Return {path: (start, end)} for every target path present in data"""
+    locator = _Locator(bytes(data), targets)
+    locator.value(0, ())
+    return locator.found
+
+
+def replace_values(data, changes):
+    """Return data with the values at the given paths replaced
+
+    changes maps path -> new Python value. Raises KeyError listing any
+    path that does not exist in the document.
+    """
+    data = bytes(data)
+    spans = locate(data, changes)
+    missing = [p for p in changes if p not in spans]
+    if missing:
+        raise KeyError(f"Path(s) not found: {missing}")
+    parts = []
+    pos = 0
+    for path, (start, end) in sorted(spans.items(), key=lambda item: item[1]):
+        parts.append(data[pos:start])
+        parts.append(json.dumps(changes[path], ensure_ascii=False).encode('utf-8'))
+        pos = end
+    parts.append(data[pos:])
+    return b''.join(parts)
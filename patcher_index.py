@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Patcher Index
+One-pass index over a Max patcher, including embedded subpatchers
+
+Box ids ("obj-12") are only unique inside one patcher level, so every box
+is addressed by (path, id) where path is the tuple of parent box ids
+leading to its subpatcher; () is the top level. Building the index walks
+each level once and records:
+
+- id -> box
+- object class (first word of text, or maxclass) -> boxes
+- text token -> boxes, for "find the box whose text contains X" queries
+- patchline adjacency in both directions, plus an edge set so
+  "is outlet X of A wired to inlet Y of B" is a dict lookup
+"""
+
+from collections import defaultdict, namedtuple
+
+IndexedBox = namedtuple('IndexedBox', ['path', 'index', 'box'])
+
+
+def box_class(box):
+    """Object class of a box: first word of its text, else its maxclass"""
+    text = box.get('text', '')
+    if box.get('maxclass', 'newobj') == 'newobj' and text:
+        return text.split(None, 1)[0]
+    return box.get('maxclass', '')
+
+
+class PatcherIndex:
+    """Lookup tables for every box and patchline in a patcher tree"""
+
+    def __init__(self, patcher):
+        self.by_id = {}
+        self.by_class = defaultdict(list)
+        self.by_token = defaultdict(list)
+        self.outgoing = defaultdict(list)   # (path, src) -> [(outlet, dst, inlet)]
+        self.incoming = defaultdict(list)   # (path, dst) -> [(inlet, src, outlet)]
+        self.edges = defaultdict(list)      # (path, src, dst) -> [(outlet, inlet)]
+        self.levels = []
+        self.json_prefix = {}               # path -> JSON path of that level
+
+        root = patcher.get('patcher', patcher)
+        prefix = ('patcher',) if root is not patcher else ()
+        pending = [((), root, prefix)]
+        # Breadth-first, so top-level matches come before nested ones
+        while pending:
+            path, level, prefix = pending.pop(0)
+            self.levels.append(path)
+            self.json_prefix[path] = prefix
+            for i, entry in enumerate(level.get('boxes', [])):
+                box = entry.get('box', {})
+                box_id = box.get('id')
+                ref = IndexedBox(path, i, box)
+                self.by_id[(path, box_id)] = ref
+                self.by_class[box_class(box)].append(ref)
+                for token in set(box.get('text', '').split()):
+                    self.by_token[token].append(ref)
+                if isinstance(box.get('patcher'), dict):
+                    pending.append((path + (box_id,), box['patcher'],
+                                    prefix + ('boxes', i, 'box', 'patcher')))
+
+            for entry in level.get('lines', []):
+                line = entry.get('patchline', {})
+                src = line.get('source', [])
+                dst = line.get('destination', [])
+                if len(src) < 2 or len(dst) < 2:
+                    continue
+                self.outgoing[(path, src[0])].append((src[1], dst[0], dst[1]))
+                self.incoming[(path, dst[0])].append((dst[1], src[0], src[1]))
+                self.edges[(path, src[0], dst[0])].append((src[1], dst[1]))
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def box(self, box_id, path=()):
+        """Return the IndexedBox for box_id in the given level, or None"""
+        return self.by_id.get((path, box_id))
+
+    def json_path(self, ref, *keys):
+        """JSON path of a box (or of keys inside it) for json_spans"""
+        return self.json_prefix[ref.path] + ('boxes', ref.index, 'box') + keys
+
+    def find_class(self, name):
+        """All boxes of an object class, top level first"""
+        return self.by_class.get(name, [])
+
+    def find_text(self, search_text):
+        """All boxes whose text contains search_text, top level first
+
+        Candidates come from the token index (the rarest token of the
+        search text); the substring check then confirms the match, so the
+        search text must consist of whole tokens.
+        """
+        tokens = search_text.split()
+        if not tokens:
+            return []
+        candidates = min((self.by_token.get(t, []) for t in tokens), key=len)
+        return [ref for ref in candidates if search_text in ref.box.get('text', '')]
+
+    def first_text(self, search_text):
+        """First box whose text contains search_text, or None"""
+        matches = self.find_text(search_text)
+        return matches[0] if matches else None
+
+    def connected(self, src, outlet, dst, inlet, path=()):
+        """True if outlet of src is wired to inlet of dst
+
+        outlet or inlet may be None to accept any port.
+        """
+        for out_port, in_port in self.edges.get((path, src, dst), ()):
+            if (outlet is None or out_port == outlet) and (inlet is None or in_port == inlet):
+                return True
+        return False
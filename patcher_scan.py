@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Streaming Patcher Scanner
+Reads only the boxes a check asks for out of a device's ptch JSON
+
+extract_patcher() decodes the whole payload into a dict, although the
+device checks look at a handful of boxes (node.script, the shared dict,
+prepend dict_response) and the patchlines between them. scan_patcher()
+tokenizes the payload from the file in CHUNK_SIZE pieces instead and
+builds a pruned patcher of the same shape:
+
+- a box is materialized only when match(text) accepts its text; Max
+  saves box keys sorted, so the few small keys before "text" are held
+  until it is known and everything after it is skipped for other boxes
+- embedded subpatchers are always scanned and kept as {'id', 'patcher'}
+  stubs when something inside them matched
+- patchlines are kept when either end is a kept box
+- patcher-level keys other than boxes/lines, and BLOB_KEYS of any box
+  (embedded JS, snapshots, images) or nested inside a kept one, are
+  skipped by a regex over the structure characters, so their strings
+  are never allocated
+
+Box positions are not preserved, so the result is for read-only checks;
+fixers still parse the full patcher.
+
+    python3 patcher_scan.py DEVICE.amxd node.script dict   # box classes
+"""
+
+import argparse
+import io
+import json
+import json.scanner
+import re
+import sys
+
+from amxd_container import AmxdError, open_patcher_stream
+from profiling import NULL_PROFILER
+
+CHUNK_SIZE = 64 << 10
+
+# Keys inside a box whose values are never needed by a check
+BLOB_KEYS = frozenset({
+    'text',             # textfile.text: embedded JS source (box text is kept)
+    'code',             # codebox / gen~ source
+    'snapshot', 'snapshotlist', 'embedsnapshot',
+    'pic', 'data', 'table_data',
+})
+
+_PUNCT = re.compile(r'[ \t\r\n]*([{}\[\],:])')
+_WS = re.compile(r'[ \t\r\n]*')
+_NUMBER_TAIL = re.compile(r'[0-9.eE+-]*')
+_STRUCTURE = re.compile(r'[^"{}\[\]]*')
+_STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*')
+_scan = json.scanner.make_scanner(json.JSONDecoder())
+
+
+def class_matcher(classes):
+    """match(text) accepting boxes whose first text token is one of classes"""
+    classes = frozenset(classes)
+
+    def match(text):
+        head = text.split(None, 1)
+        return bool(head) and head[0] in classes
+    return match
+
+
+class _Scanner:
+    """Recursive descent over a chunked text buffer of patcher JSON"""
+
+    def __init__(self, fileobj, match, chunk_size=CHUNK_SIZE):
+        self.fileobj = io.TextIOWrapper(fileobj, encoding='utf-8')
+        self.match = match
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.base = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.fileobj.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+        self.base += self.pos
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+
+    def error(self, message):
+        return AmxdError(f"Invalid patcher JSON: {message} at character {self.base + self.pos}")
+
+    def peek(self):
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos:self.pos + 1]
+            self._fill()
+
+    def punct(self, allowed):
+        self.peek()
+        m = _PUNCT.match(self.buf, self.pos)
+        if m is None or m.group(1) not in allowed:
+            raise self.error(f"expected one of {allowed!r}")
+        self.pos = m.end()
+        return m.group(1)
+
+    def decode(self):
+        """Decode the next complete value with the C scanner"""
+        self.peek()
+        while True:
+            try:
+                value, end = _scan(self.buf, self.pos)
+            except (StopIteration, ValueError):
+                value, end = None, None
+            if end is not None:
+                # A number cut off by the end of the buffer may continue
+                cut = not self.eof and type(value) in (int, float) and \
+                    _NUMBER_TAIL.match(self.buf, end).end() == len(self.buf)
+                if not cut:
+                    self.pos = end
+                    return value
+            if self.eof:
+                raise self.error("truncated value")
+            self._fill()
+
+    def _skip_string(self):
+        self.pos += 1
+        while True:
+            # Stops at the closing quote, or before a backslash cut off by
+            # the end of the buffer
+            self.pos = _STRING_BODY.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) and self.buf[self.pos] == '"':
+                self.pos += 1
+                return
+            if self.eof:
+                raise self.error("unterminated string")
+            self._fill()
+
+    def skip(self):
+        """Skip the next value without decoding strings or containers"""
+        char = self.peek()
+        if char == '"':
+            return self._skip_string()
+        if char not in ('{', '['):
+            return self.decode()
+        depth = 0
+        while True:
+            self.pos = _STRUCTURE.match(self.buf, self.pos).end()
+            if self.pos == len(self.buf):
+                if self.eof:
+                    raise self.error("unterminated container")
+                self._fill()
+                continue
+            char = self.buf[self.pos]
+            if char == '"':
+                self._skip_string()
+                continue
+            self.pos += 1
+            depth += 1 if char in '{[' else -1
+            if depth == 0:
+                return
+
+    def members(self):
+        """Yield the keys of the next object; the caller consumes each value"""
+        self.punct('{')
+        if self.peek() == '}':
+            self.punct('}')
+            return
+        while True:
+            if self.peek() != '"':
+                raise self.error("expected an object key")
+            key = self.decode()
+            self.punct(':')
+            yield key
+            if self.punct(',}') == '}':
+                return
+
+    def items(self):
+        """Yield once per item of the next array; the caller consumes each"""
+        self.punct('[')
+        if self.peek() == ']':
+            self.punct(']')
+            return
+        while True:
+            yield
+            if self.punct(',]') == ']':
+                return
+
+    def pruned(self):
+        """Decode the next value, leaving out BLOB_KEYS of nested objects
+
+        Arrays (rects, colors, outlet types) go to the C scanner whole.
+        """
+        char = self.peek()
+        if char == '{':
+            value = {}
+            for key in self.members():
+                if key in BLOB_KEYS:
+                    self.skip()
+                else:
+                    value[key] = self.pruned()
+            return value
+        return self.decode()
+
+    def small(self):
+        """Decode the next container if it ends within the buffer, else None
+
+        The buffer is topped up to at least one chunk first, so anything
+        up to CHUNK_SIZE goes through the C scanner in one call; larger
+        values cost one failed scan of the buffer and are streamed.
+        """
+        self.peek()
+        if not self.eof and len(self.buf) - self.pos < self.chunk_size:
+            self._fill()
+        try:
+            value, end = _scan(self.buf, self.pos)
+        except (StopIteration, ValueError):
+            return None
+        self.pos = end
+        return value
+
+    def box(self):
+        """(box, matched) for one box, streamed key by key"""
+        box = {}
+        matched = None          # unknown until "text" is read
+        for key in self.members():
+            if key == 'patcher' and self.peek() == '{':
+                box[key] = self.level()
+            elif key == 'text' and self.peek() == '"':
+                box[key] = self.decode()
+                matched = self.match(box[key])
+            elif matched is False or key in BLOB_KEYS and key != 'text':
+                self.skip()
+            else:
+                box[key] = self.pruned()
+        return _kept_box(box, matched)
+
+    def boxes(self):
+        """Yield (box, matched) for each entry of the next boxes array"""
+        entries = self.small()
+        if entries is not None:
+            for entry in entries:
+                yield _prune_box(entry.get('box', {}), self.match)
+            return
+        for _ in self.items():
+            entry = self.small()
+            if entry is not None:
+                yield _prune_box(entry.get('box', {}), self.match)
+                continue
+            box = matched = None
+            for key in self.members():
+                if key == 'box':
+                    box, matched = self.box()
+                else:
+                    self.skip()
+            yield box, matched
+
+    def level(self):
+        """Pruned {'boxes', 'lines'} of the next patcher object"""
+        boxes, lines, kept = [], [], set()
+        for key in self.members():
+            if key == 'boxes' and self.peek() == '[':
+                for box, matched in self.boxes():
+                    if box is not None:
+                        boxes.append({'box': box})
+                    if matched:
+                        kept.add(box.get('id'))
+            elif key == 'lines' and self.peek() == '[':
+                entries = self.small()
+                if entries is None:
+                    entries = [self.decode() for _ in self.items()]
+                lines.extend(entries)
+            else:
+                self.skip()
+        return _level(boxes, lines, kept)
+
+    def run(self):
+        if self.peek() != '{':
+            raise AmxdError(f"Unsupported ptch payload (starts with {self.buf[:4]!r})")
+        root = self.small()
+        if root is not None:
+            # The whole payload fit in one chunk
+            if not isinstance(root.get('patcher'), dict):
+                raise self.error("no patcher object")
+            return {'patcher': _prune_level(root['patcher'], self.match)}
+        patcher = None
+        for key in self.members():
+            if key == 'patcher' and self.peek() == '{':
+                patcher = self.level()
+            else:
+                self.skip()
+        if patcher is None:
+            raise self.error("no patcher object")
+        return {'patcher': patcher}
+
+
+def _touches(entry, kept):
+    line = entry.get('patchline', {}) if isinstance(entry, dict) else {}
+    ends = (line.get('source') or [None])[:1] + (line.get('destination') or [None])[:1]
+    return any(end in kept for end in ends)
+
+
+def _level(boxes, lines, kept):
+    return {'boxes': boxes, 'lines': [entry for entry in lines if _touches(entry, kept)]}
+
+
+def _kept_box(box, matched):
+    """(box, matched) to keep for an already pruned box, box None if nothing"""
+    if matched:
+        return box, True
+    sub = box.get('patcher')
+    if sub and sub['boxes']:
+        return {'id': box.get('id'), 'patcher': sub}, False
+    return None, False
+
+
+def _without_blobs(value):
+    if isinstance(value, dict):
+        return {k: _without_blobs(v) for k, v in value.items() if k not in BLOB_KEYS}
+    return value
+
+
+def _prune_box(box, match):
+    """_Scanner.box() for a box the C scanner decoded whole"""
+    text = box.get('text')
+    matched = isinstance(text, str) and match(text)
+    pruned = {}
+    for key, value in box.items():
+        if key == 'patcher' and isinstance(value, dict):
+            pruned[key] = _prune_level(value, match)
+        elif key == 'text' or matched and key not in BLOB_KEYS:
+            pruned[key] = _without_blobs(value)
+    return _kept_box(pruned, matched)
+
+
+def _prune_level(level, match):
+    boxes, kept = [], set()
+    for entry in level.get('boxes', []):
+        box, matched = _prune_box(entry.get('box', {}), match)
+        if box is not None:
+            boxes.append({'box': box})
+        if matched:
+            kept.add(box.get('id'))
+    return _level(boxes, level.get('lines', []), kept)
+
+
+def scan_patcher(filename, match, chunk_size=CHUNK_SIZE):
+    """Pruned patcher of a device holding only the boxes match(text) accepts
+
+    match is a callable on box text, or an iterable of object classes.
+    Raises AmxdError (or OSError) when the device cannot be read.
+    """
+    if not callable(match):
+        match = class_matcher(match)
+    with open_patcher_stream(filename) as f:
+        return _Scanner(f, match, chunk_size).run()
+
+
+def scan_device(filename, match, profiler=NULL_PROFILER):
+    """scan_patcher() with extract_patcher()'s error handling
+
+    Returns the pruned patcher, or None if the file cannot be read.
+    """
+    try:
+        with profiler.phase('parse'):
+            return scan_patcher(filename, match)
+    except (OSError, UnicodeDecodeError, AmxdError) as e:
+        print(f"Error parsing JSON: {e}")
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Power Trio Arranger - Streaming Patcher Scanner")
+    parser.add_argument('device', help=".amxd or .maxpat file")
+    parser.add_argument('classes', nargs='+', help="object classes to keep (e.g. node.script dict)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        patcher = scan_patcher(args.device, args.classes)
+    except (OSError, UnicodeDecodeError, AmxdError) as e:
+        print(f"❌ {e}")
+        return 1
+    json.dump(patcher, sys.stdout, indent=2, ensure_ascii=False)
+    print()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Pattern Library Index
+Compiles the GrooveWanderer drum library into a memory-mappable binary
+
+pattern_library_REFINED.json holds {"layers": {"kick": [...], "snare":
+[...], "hats_ride": [...], "percussion": [...]}}, each pattern an object
+with complexity_score, density_score and pattern.notes[] of
+{beat, velocity, note}. compile_library() writes it as flat arrays so a
+reader never parses or re-serializes more than the pattern it asks for:
+
+    header      '<4sHHIIII'  magic, version, layer count, note count,
+                             offsets of the beat / note / velocity columns
+    directory   '<24sIIIIII' per layer: name, pattern count, offsets of
+                             its complexity, density, JSON index and note
+                             index arrays, and of its JSON blob
+    per layer   complexity f32[n], density f32[n] (NaN when missing),
+                json index u32[n+1], note index u32[n+1],
+                JSON blob '[p0,p1,...]' (compact, as saved)
+    notes       beat f32[N], note u8[N], velocity u8[N] for all layers
+
+Index arrays are prefix offsets: pattern i's notes are the slice
+index[i]:index[i+1] of the note columns, and its JSON is
+index[i]:index[i+1]-1 of the file (each pattern is followed by one ','
+or the closing ']'). The whole layer's JSON, which pattern_loader.js
+sends as layer_patterns, is the blob itself. Every typed column and
+index array starts 8-byte aligned, so the reader hands them out as
+zero-copy memoryviews of the mmap; the JSON blobs are unaligned byte
+ranges.
+"""
+
+import argparse
+import json
+import math
+import mmap
+import struct
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path("/Users/Matthew/PowerTrioArranger")
+LIBRARY_PATH = PROJECT_ROOT / "track_4_drums" / "data" / "pattern_library_REFINED.json"
+
+MAGIC = b'PTPL'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIIII')
+LAYER = struct.Struct('<24sIIIIII')
+LAYER_ORDER = ('kick', 'snare', 'hats_ride', 'percussion')
+
+
+class PatternLibraryError(ValueError):
+    """Raised for a library that cannot be compiled or an invalid index file"""
+
+
+def _align(buf, boundary=8):
+    buf.extend(b'\0' * (-len(buf) % boundary))
+    return len(buf)
+
+
+def _score(pattern, key):
+    value = pattern.get(key)
+    return float(value) if isinstance(value, (int, float)) else math.nan
+
+
+def compile_library(library):
+    """Serialize a loaded library dict into index bytes"""
+    layers = library.get('layers')
+    if not isinstance(layers, dict):
+        raise PatternLibraryError("Library has no 'layers' object")
+    names = [n for n in LAYER_ORDER if n in layers] + \
+            [n for n in layers if n not in LAYER_ORDER]
+
+    beats, notes, velocities = [], [], []
+    out = bytearray(HEADER.size + LAYER.size * len(names))
+    directory = []
+    for name in names:
+        patterns = layers[name]
+        if not isinstance(patterns, list):
+            raise PatternLibraryError(f"Layer '{name}' is not an array")
+        encoded = name.encode('utf-8')
+        if len(encoded) > 24:
+            raise PatternLibraryError(f"Layer name '{name}' is longer than 24 bytes")
+        count = len(patterns)
+
+        complexity_off = _align(out)
+        out += struct.pack(f'<{count}f', *(_score(p, 'complexity_score') for p in patterns))
+        density_off = _align(out)
+        out += struct.pack(f'<{count}f', *(_score(p, 'density_score') for p in patterns))
+
+        note_index = [len(beats)]
+        for i, pattern in enumerate(patterns):
+            for note in (pattern.get('pattern') or {}).get('notes') or ():
+                try:
+                    beats.append(float(note['beat']))
+                    notes.append(int(note['note']))
+                    velocities.append(int(note['velocity']))
+                except (KeyError, TypeError, ValueError):
+                    raise PatternLibraryError(
+                        f"{name}[{i}]: note needs numeric beat, note and velocity") from None
+            note_index.append(len(beats))
+
+        json_index_off = _align(out)
+        out += bytes(4 * (count + 1))
+        note_index_off = _align(out)
+        out += struct.pack(f'<{count + 1}I', *note_index)
+
+        blob_off = len(out)
+        json_index = []
+        out += b'['
+        for i, pattern in enumerate(patterns):
+            if i:
+                out += b','
+            json_index.append(len(out))
+            out += json.dumps(pattern, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        json_index.append(len(out) + 1)     # as if followed by one more ','
+        out += b']'
+        struct.pack_into(f'<{count + 1}I', out, json_index_off, *json_index)
+        directory.append((encoded, count, complexity_off, density_off,
+                          json_index_off, note_index_off, blob_off))
+
+    for note, velocity in zip(notes, velocities):
+        if not (0 <= note <= 127 and 0 <= velocity <= 127):
+            raise PatternLibraryError(f"Note {note} / velocity {velocity} outside 0-127")
+    beat_off = _align(out)
+    out += struct.pack(f'<{len(beats)}f', *beats)
+    note_off = _align(out)
+    out += bytes(notes)
+    velocity_off = _align(out)
+    out += bytes(velocities)
+    if len(out) >= 1 << 32:
+        raise PatternLibraryError("Library is too large for 32-bit offsets")
+
+    HEADER.pack_into(out, 0, MAGIC, VERSION, len(names), len(beats),
+                     beat_off, note_off, velocity_off)
+    for i, entry in enumerate(directory):
+        LAYER.pack_into(out, HEADER.size + i * LAYER.size, *entry)
+    return bytes(out)
+
+
+def build_index(library_path, index_path):
+    """Compile a library JSON file to an index file; returns its size"""
+    with open(library_path, 'r', encoding='utf-8') as f:
+        library = json.load(f)
+    data = compile_library(library)
+    tmp = Path(index_path).with_suffix('.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    tmp.replace(index_path)
+    return len(data)
+
+
+class _Layer:
+
+    def __init__(self, lib, name, count, complexity_off, density_off,
+                 json_index_off, note_index_off, blob_off):
+        self.name = name
+        self.count = count
+        self.complexity = lib._array('f', complexity_off, count)
+        self.density = lib._array('f', density_off, count)
+        self.json_index = lib._array('I', json_index_off, count + 1)
+        self.note_index = lib._array('I', note_index_off, count + 1)
+        self.blob = (blob_off, self.json_index[count])
+
+
+class PatternLibrary:
+    """Read-only, memory-mapped view of a compiled pattern library"""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise PatternLibraryError(f"{path} is empty") from None
+        self.view = memoryview(self._map)
+        try:
+            self._read_header()
+        except (struct.error, TypeError, ValueError) as e:
+            self.close()
+            raise PatternLibraryError(f"{path} is not a pattern library index ({e})") from None
+
+    def _read_header(self):
+        magic, version, layer_count, note_count, beat_off, note_off, velocity_off = \
+            HEADER.unpack_from(self.view, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"magic {magic!r} version {version}")
+        self.beats = self._array('f', beat_off, note_count)
+        self.notes = self.view[note_off:note_off + note_count]
+        self.velocities = self.view[velocity_off:velocity_off + note_count]
+        self._layers = {}
+        for i in range(layer_count):
+            name, *fields = LAYER.unpack_from(self.view, HEADER.size + i * LAYER.size)
+            name = name.rstrip(b'\0').decode('utf-8')
+            self._layers[name] = _Layer(self, name, *fields)
+
+    def _array(self, fmt, offset, count):
+        size = struct.calcsize(fmt) * count
+        if offset + size > len(self.view):
+            raise ValueError(f"array at {offset} runs past the end of the file")
+        return self.view[offset:offset + size].cast(fmt)
+
+    @property
+    def layers(self):
+        return list(self._layers)
+
+    def layer(self, name):
+        try:
+            return self._layers[name]
+        except KeyError:
+            raise KeyError(f"No layer '{name}' (have {', '.join(self._layers)})") from None
+
+    def count(self, layer):
+        return self.layer(layer).count
+
+    def complexity(self, layer):
+        """complexity_score of every pattern in a layer (float32, NaN if missing)"""
+        return self.layer(layer).complexity
+
+    def density(self, layer):
+        """density_score of every pattern in a layer (float32, NaN if missing)"""
+        return self.layer(layer).density
+
+    def _check(self, layer, index):
+        entry = self.layer(layer)
+        if not 0 <= index < entry.count:
+            raise IndexError(f"{layer} has {entry.count} patterns, no index {index}")
+        return entry
+
+    def pattern_json(self, layer, index):
+        """Pattern index of a layer as its saved JSON bytes (a memoryview)"""
+        entry = self._check(layer, index)
+        return self.view[entry.json_index[index]:entry.json_index[index + 1] - 1]
+
+    def pattern(self, layer, index):
+        """Pattern index of a layer, decoded"""
+        return json.loads(bytes(self.pattern_json(layer, index)))
+
+    def layer_json(self, layer):
+        """Every pattern of a layer as one JSON array (a memoryview)"""
+        start, end = self.layer(layer).blob
+        return self.view[start:end]
+
+    def pattern_notes(self, layer, index):
+        """(beats, notes, velocities) memoryviews for one pattern"""
+        entry = self._check(layer, index)
+        start, end = entry.note_index[index], entry.note_index[index + 1]
+        return self.beats[start:end], self.notes[start:end], self.velocities[start:end]
+
+    def close(self):
+        """Release the reader's views and unmap the file
+
+        Views handed out earlier stay valid; the mapping itself goes away
+        with the last of them.
+        """
+        for entry in getattr(self, '_layers', {}).values():
+            for name in ('complexity', 'density', 'json_index', 'note_index'):
+                getattr(entry, name).release()
+        for name in ('beats', 'notes', 'velocities', 'view'):
+            if hasattr(self, name):
+                getattr(self, name).release()
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Power Trio Arranger - Pattern Library Index")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="compile a library JSON into an index")
+    build.add_argument('library', nargs='?', default=str(LIBRARY_PATH),
+                       help="library JSON (default: %(default)s)")
+    build.add_argument('--output', '-o', help="index file (default: library with .ptpl)")
+    show = sub.add_parser('show', help="print layer stats, or one pattern's JSON")
+    show.add_argument('index', help="compiled .ptpl file")
+    show.add_argument('layer', nargs='?')
+    show.add_argument('number', nargs='?', type=int, help="pattern index within the layer")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        if args.command == 'build':
+            output = args.output or str(Path(args.library).with_suffix('.ptpl'))
+            size = build_index(args.library, output)
+            print(f"✅ Wrote {output} ({size / 1024:.0f} KB)")
+            return 0
+
+        with PatternLibrary(args.index) as lib:
+            if args.layer is None:
+                print(f"🥁 {args.index}: {len(lib.notes)} note(s)")
+                for name in lib.layers:
+                    print(f"   {name}: {lib.count(name)} pattern(s)")
+            elif args.number is None:
+                sys.stdout.write(bytes(lib.layer_json(args.layer)).decode('utf-8') + '\n')
+            else:
+                sys.stdout.write(bytes(lib.pattern_json(args.layer, args.number)).decode('utf-8') + '\n')
+    except (OSError, ValueError, KeyError, IndexError) as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
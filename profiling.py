@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Phase Profiler
+Wall time, CPU time and memory per phase for the generators and tools
+
+Phases are exclusive: entering a phase pauses the enclosing one, so a
+gzip writer whose output goes through a timed raw file reports compress
+and write separately even though one call contains the other. The usual
+phases are
+
+    read, decompress, parse, transform, serialize, compress, write
+
+Memory is the process peak RSS (a high-water mark): each phase records
+the peak when it last ended and how much the peak grew while it ran.
+
+Scripts take --profile [FILE] (JSON report, '-' or no value for stdout)
+and --cprofile FILE (a cProfile dump for pstats/snakeviz); see
+add_profile_args() and profiled(). Code that accepts a profiler uses
+NULL_PROFILER by default, whose hooks are no-ops.
+"""
+
+import cProfile
+import json
+import os
+import platform
+import sys
+import time
+import types
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PHASES = ('read', 'decompress', 'parse', 'transform', 'serialize', 'compress', 'write')
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (0 if unknown)"""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+class _TimedFile:
+    """File wrapper that runs read()/write() inside a profiler phase"""
+
+    def __init__(self, profiler, fileobj, phase):
+        self._profiler = profiler
+        self._file = fileobj
+        self._phase = phase
+
+    def read(self, *args):
+        with self._profiler.phase(self._phase):
+            data = self._file.read(*args)
+        self._profiler.count(self._phase, len(data))
+        return data
+
+    def write(self, data):
+        with self._profiler.phase(self._phase):
+            written = self._file.write(data)
+        self._profiler.count(self._phase, len(data))
+        return written
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._file.close()
+
+
+class PhaseProfiler:
+    """Accumulates exclusive wall/CPU time and memory per named phase"""
+
+    enabled = True
+
+    def __init__(self):
+        self.phases = {}
+        self._stack = []    # [name, wall_start, cpu_start, rss_at_enter]
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self.started = datetime.now(timezone.utc)
+
+    def _entry(self, name):
+        entry = self.phases.get(name)
+        if entry is None:
+            entry = self.phases[name] = {'wall_s': 0.0, 'cpu_s': 0.0, 'calls': 0,
+                                         'bytes': 0, 'peak_rss_mb': 0.0,
+                                         'rss_growth_mb': 0.0}
+        return entry
+
+    def _charge(self, frame, wall, cpu):
+        entry = self._entry(frame[0])
+        entry['wall_s'] += wall - frame[1]
+        entry['cpu_s'] += cpu - frame[2]
+
+    @contextmanager
+    def phase(self, name):
+        wall, cpu = time.perf_counter(), time.process_time()
+        if self._stack:
+            self._charge(self._stack[-1], wall, cpu)
+        frame = [name, wall, cpu, peak_rss_mb()]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter(), time.process_time()
+            self._stack.pop()
+            self._charge(frame, wall, cpu)
+            entry = self._entry(name)
+            entry['calls'] += 1
+            rss = peak_rss_mb()
+            entry['peak_rss_mb'] = max(entry['peak_rss_mb'], rss)
+            entry['rss_growth_mb'] += rss - frame[3]
+            if self._stack:
+                self._stack[-1][1:3] = [wall, cpu]
+
+    def count(self, name, nbytes):
+        """Add to the byte count of a phase"""
+        self._entry(name)['bytes'] += nbytes
+
+    def reader(self, fileobj, phase):
+        """Wrap a readable file so read() is charged to phase"""
+        return _TimedFile(self, fileobj, phase)
+
+    def writer(self, fileobj, phase):
+        """Wrap a writable file so write() is charged to phase"""
+        return _TimedFile(self, fileobj, phase)
+
+    def wrap(self, func, phase):
+        """Wrap a callback so its work (and its generator's) is charged to phase"""
+        def run(*args, **kwargs):
+            with self.phase(phase):
+                result = func(*args, **kwargs)
+            if isinstance(result, types.GeneratorType):
+                return self._drain(result, phase)
+            return result
+        return run
+
+    def _drain(self, gen, phase):
+        while True:
+            with self.phase(phase):
+                try:
+                    item = next(gen)
+                except StopIteration:
+                    return
+            yield item
+
+    def report(self, script, **extra):
+        """JSON-serializable summary of everything recorded so far"""
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        order = [p for p in PHASES if p in self.phases]
+        order += sorted(p for p in self.phases if p not in PHASES)
+        phases = {}
+        for name in order:
+            entry = self.phases[name]
+            phases[name] = {key: round(value, 4) if isinstance(value, float) else value
+                            for key, value in entry.items()}
+        attributed = sum(e['wall_s'] for e in self.phases.values())
+        return {
+            'script': script,
+            'argv': sys.argv[1:],
+            'started': self.started.isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'total': {'wall_s': round(wall, 4), 'cpu_s': round(cpu, 4),
+                      'unattributed_s': round(wall - attributed, 4),
+                      'peak_rss_mb': round(peak_rss_mb(), 1)},
+            'phases': phases,
+            **extra,
+        }
+
+
+class NullProfiler:
+    """PhaseProfiler stand-in whose hooks do nothing"""
+
+    enabled = False
+
+    @contextmanager
+    def phase(self, name):
+        yield
+
+    def count(self, name, nbytes):
+        pass
+
+    def reader(self, fileobj, phase):
+        return fileobj
+
+    def writer(self, fileobj, phase):
+        return fileobj
+
+    def wrap(self, func, phase):
+        return func
+
+
+NULL_PROFILER = NullProfiler()
+
+
+def add_profile_args(parser):
+    """Add --profile and --cprofile to an ArgumentParser"""
+    parser.add_argument('--profile', nargs='?', const='-', metavar='FILE',
+                        help="write per-phase timing/memory as JSON ('-' for stdout)")
+    parser.add_argument('--cprofile', metavar='FILE',
+                        help="also write a cProfile dump (implies --profile)")
+
+
+@contextmanager
+def profiled(args, script):
+    """Yield a PhaseProfiler (or NULL_PROFILER) per the parsed CLI args
+
+    The JSON report and cProfile dump are written when the block exits.
+    """
+    if not (getattr(args, 'profile', None) or getattr(args, 'cprofile', None)):
+        yield NULL_PROFILER
+        return
+    profiler = PhaseProfiler()
+    cprof = cProfile.Profile() if args.cprofile else None
+    if cprof is not None:
+        cprof.enable()
+    try:
+        yield profiler
+    finally:
+        if cprof is not None:
+            cprof.disable()
+            cprof.dump_stats(args.cprofile)
+        report = profiler.report(script, cprofile=args.cprofile)
+        text = json.dumps(report, indent=2)
+        target = args.profile or '-'
+        if target == '-':
+            print(text)
+        else:
+            with open(target, 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
+            print(f"⏱️  Profile written to {os.path.abspath(target)}")
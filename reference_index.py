@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Reference Index
+Cross-reference of devices, scripts, required modules and dict names
+
+One scan of the project root records, per file:
+
+- devices (.amxd/.maxpat): node.script targets and [dict NAME] boxes
+- scripts (.js): relative require()s (including the
+  require(path.join(__dirname, "..", "shared", ...)) form), resolved the
+  way Node does at query time; the dict names they address (DICT_NAME
+  constants, outlet("dict", ...) calls) and the dict keys they read or
+  write, with ${...} shown as '*'
+
+The index is saved as JSON with each file's size and mtime, so a later
+run re-parses only files that changed and queries such as "what breaks
+if I move shared/dict_helpers.js" are answered from memory:
+
+    python3 reference_index.py                      # refresh, report problems
+    python3 reference_index.py --impact shared/dict_helpers.js
+    python3 reference_index.py --dict=---power_trio_brain
+    python3 reference_index.py --show track_2_sequencer/sequencer.js
+
+Problems are node.script targets or required modules that do not exist,
+and scripts addressing a dict name that their device has no [dict] box
+for.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+from amxd_container import extract_patcher
+from patcher_index import PatcherIndex
+
+PROJECT_ROOT = Path("/Users/Matthew/PowerTrioArranger")
+DEFAULT_INDEX_PATH = Path.home() / '.cache' / 'powertrio' / 'reference_index.json'
+
+# Bump whenever the recorded facts change so old index files are rebuilt
+INDEX_VERSION = 1
+
+DEVICE_EXTENSIONS = ('.amxd', '.maxpat')
+SCRIPT_EXTENSIONS = ('.js',)
+IGNORED_DIRS = {'node_modules', '.git', '__pycache__'}
+
+# require("./x.js") and require(path.join(__dirname, "..", "shared", "x.js"))
+_REQUIRE = re.compile(r'''require\(\s*(path\.join\(\s*__dirname\s*,[^)]*\)|(["'])[^"']+\2)''')
+_STRING = re.compile(r'''(["'])([^"']*)\1''')
+_CONST = re.compile(r'''\b(?:const|let|var)\s+(\w+)\s*=\s*(["'])([^"'\n]*)\2''')
+_DICT_NAME_VAR = re.compile(r'dict_?name', re.IGNORECASE)
+_DICT_CALL = re.compile(r'''\bdict(?:Get|Replace|Set|Remove|Append)\(\s*([`"'])([^`"'\n]*)\1''')
+_DICT_OUTLET = re.compile(r'''outlet\(\s*["']dict["']\s*,([^)\n]*)''')
+_ARG = re.compile(r'''[`"']([^`"']*)[`"']|([A-Za-z_]\w*)''')
+_TEMPLATE = re.compile(r'\$\{[^}]*\}')
+
+# Messages a [dict] object understands; they are not names or keys
+DICT_MESSAGES = {'get', 'set', 'replace', 'remove', 'append', 'clear', 'getkeys', 'setparse'}
+
+
+def iter_files(roots, extensions):
+    """Yield (path, stat) for matching files under roots"""
+    pending = [Path(r) for r in roots]
+    while pending:
+        directory = pending.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in IGNORED_DIRS:
+                    pending.append(Path(entry.path))
+            elif entry.name.endswith(extensions):
+                try:
+                    yield Path(entry.path), entry.stat()
+                except OSError:
+                    pass
+
+
+def resolve_module(target):
+    """File Node loads for a relative require() target
+
+    Tries the path itself, then .js/.json, then a package directory's
+    package.json "main" or index.js. An unresolved target is returned
+    with .js appended when it has no suffix.
+    """
+    target = Path(target)
+    for candidate in (target, target.with_name(target.name + '.js'),
+                      target.with_name(target.name + '.json')):
+        if candidate.is_file():
+            return candidate
+    if target.is_dir():
+        try:
+            with open(target / 'package.json', 'r', encoding='utf-8') as f:
+                main = json.load(f).get('main')
+        except (OSError, ValueError):
+            main = None
+        for candidate in ([target / main] if main else []) + [target / 'index.js']:
+            if candidate.is_file():
+                return Path(os.path.normpath(candidate))
+    return target if target.suffix else target.with_name(target.name + '.js')
+
+
+def require_targets(path, source):
+    """Normalized, unresolved targets of a script's relative require()s"""
+    found = set()
+    for match in _REQUIRE.finditer(source):
+        arg = match.group(1)
+        parts = [s for _, s in _STRING.findall(arg)]
+        if not parts:
+            continue
+        if not arg.startswith('path.join') and not parts[0].startswith(('./', '../')):
+            continue            # a package such as max-api or path
+        found.add(Path(os.path.normpath(Path(path).parent.joinpath(*parts))))
+    return found
+
+
+def script_requires(path, source=None):
+    """Resolved paths of the relative modules a script require()s"""
+    if source is None:
+        try:
+            source = Path(path).read_text(encoding='utf-8', errors='replace')
+        except OSError:
+            return set()
+    return {resolve_module(target) for target in require_targets(path, source)}
+
+
+def node_scripts(patcher):
+    """Script names referenced by the node.script boxes of a patcher"""
+    names = []
+    for ref in PatcherIndex(patcher).find_class('node.script'):
+        name = ref.box.get('textfile', {}).get('filename')
+        if not name:
+            args = ref.box.get('text', '').split()[1:]
+            name = args[0] if args and not args[0].startswith('@') else None
+        if name:
+            names.append(name)
+    return names
+
+
+def _key(text):
+    return _TEMPLATE.sub('*', text)
+
+
+def script_facts(path):
+    """requires, dict names and dict keys of one script"""
+    source = Path(path).read_text(encoding='utf-8', errors='replace')
+    consts = {name: value for name, _, value in _CONST.findall(source)}
+    dicts = {value for name, value in consts.items() if _DICT_NAME_VAR.search(name) and value}
+    keys = {_key(m.group(2)) for m in _DICT_CALL.finditer(source) if m.group(2)}
+
+    for match in _DICT_OUTLET.finditer(source):
+        args = [(literal, ident) for literal, ident in _ARG.findall(match.group(1))]
+        args = [a for a in args if a[0] not in DICT_MESSAGES]
+        if not args:
+            continue
+        literal, ident = args[0]
+        name = consts.get(ident) if ident else literal
+        if name and (name in dicts or name.startswith('---')):
+            dicts.add(name)
+            args = args[1:]
+        key = next((literal for literal, ident in args if literal), None)
+        if key:
+            keys.add(_key(key))
+
+    return {
+        'requires': sorted(str(p) for p in require_targets(path, source)),
+        'dicts': sorted(dicts),
+        'keys': sorted(keys),
+    }
+
+
+def device_facts(path):
+    """node.script targets and dict names of one device"""
+    _, patcher = extract_patcher(path)
+    if not patcher:
+        return {'error': "Could not read patcher data", 'scripts': [], 'dicts': []}
+    index = PatcherIndex(patcher)
+    dicts = set()
+    for ref in index.find_class('dict'):
+        args = ref.box.get('text', '').split()[1:]
+        if args and not args[0].startswith('@'):
+            dicts.add(args[0])
+    return {'scripts': node_scripts(patcher), 'dicts': sorted(dicts)}
+
+
+class ReferenceIndex:
+    """Per-file facts for a project tree and the queries built on them
+
+    Paths are kept relative to the root so the saved index is portable.
+    """
+
+    def __init__(self, root, files=None):
+        self.root = Path(root).resolve()
+        self.files = files or {}     # relative path -> {'kind', 'stat', facts...}
+        self._modules = {}           # require() target -> resolved relative path
+
+    @classmethod
+    def load(cls, path, root):
+        """Load a saved index, or an empty one if it is missing or stale"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls(root)
+        if data.get('version') != INDEX_VERSION or data.get('root') != str(Path(root).resolve()):
+            return cls(root)
+        return cls(root, data['files'])
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION, 'root': str(self.root), 'files': self.files},
+                      f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def rel(self, path):
+        """Root-relative string for a path (absolute paths outside stay absolute)"""
+        path = Path(os.path.normpath(self.root / path))
+        try:
+            return str(path.relative_to(self.root))
+        except ValueError:
+            return str(path)
+
+    def refresh(self):
+        """Re-parse new or changed files and forget deleted ones
+
+        Returns the number of files parsed.
+        """
+        seen = set()
+        parsed = 0
+        for path, st in iter_files([self.root], DEVICE_EXTENSIONS + SCRIPT_EXTENSIONS):
+            rel = self.rel(path)
+            seen.add(rel)
+            stat = [st.st_mtime_ns, st.st_size]
+            entry = self.files.get(rel)
+            if entry is not None and entry['stat'] == stat:
+                continue
+            if path.name.endswith(SCRIPT_EXTENSIONS):
+                facts = script_facts(path)
+                facts['requires'] = [self.rel(p) for p in facts['requires']]
+                self.files[rel] = {'kind': 'script', 'stat': stat, **facts}
+            else:
+                self.files[rel] = {'kind': 'device', 'stat': stat, **device_facts(path)}
+            parsed += 1
+        for rel in set(self.files) - seen:
+            del self.files[rel]
+        self._modules = {}
+        return parsed
+
+    def scripts(self):
+        return sorted(rel for rel, e in self.files.items() if e['kind'] == 'script')
+
+    def devices(self):
+        return sorted(rel for rel, e in self.files.items() if e['kind'] == 'device')
+
+    def resolve_script(self, name):
+        """Root-relative path of a node.script target
+
+        A name that is not found under the root is looked up by file name
+        among the known scripts, the way Max finds a bare 'logic.js'
+        through its search path.
+        """
+        rel = self.rel(name)
+        if rel not in self.files:
+            matches = [s for s in self.scripts() if Path(s).name == Path(rel).name]
+            if len(matches) == 1:
+                return matches[0]
+        return rel
+
+    def requires(self, script):
+        """Resolved, root-relative modules a script requires"""
+        found = []
+        for target in self.files.get(script, {}).get('requires', ()):
+            if target not in self._modules:
+                self._modules[target] = self.rel(resolve_module(self.root / target))
+            found.append(self._modules[target])
+        return found
+
+    def device_scripts(self, device):
+        return [self.resolve_script(n) for n in self.files[device].get('scripts', [])]
+
+    def closure(self, script):
+        """script plus everything it requires, transitively"""
+        seen = {script}
+        pending = [script]
+        while pending:
+            for dep in self.requires(pending.pop()):
+                if dep not in seen:
+                    seen.add(dep)
+                    pending.append(dep)
+        return seen
+
+    def impact(self, target):
+        """What references target: direct users and every affected device"""
+        target = self.rel(target)
+        requirers = [s for s in self.scripts() if target in self.requires(s)]
+        loaders = [d for d in self.devices() if target in self.device_scripts(d)]
+        affected = [d for d in self.devices()
+                    if any(target in self.closure(s) for s in self.device_scripts(d))]
+        return {'file': target, 'exists': (self.root / target).is_file(),
+                'required_by': requirers, 'node_script_in': loaders, 'devices': affected}
+
+    def dict_users(self, name):
+        """Devices with a [dict name] box and scripts addressing name"""
+        return {
+            'dict': name,
+            'devices': [d for d in self.devices() if name in self.files[d]['dicts']],
+            'scripts': {s: self.files[s]['keys'] for s in self.scripts()
+                        if name in self.files[s]['dicts']},
+        }
+
+    def problems(self):
+        """[(file, message)] for broken references and dict mismatches"""
+        found = []
+        for rel in self.scripts():
+            for dep in self.requires(rel):
+                if not (self.root / dep).is_file():
+                    found.append((rel, f"requires missing {dep}"))
+        for device in self.devices():
+            entry = self.files[device]
+            if entry.get('error'):
+                found.append((device, entry['error']))
+                continue
+            for script in self.device_scripts(device):
+                if script not in self.files:
+                    found.append((device, f"node.script target not found: {script}"))
+                    continue
+                used = set()
+                for dep in self.closure(script):
+                    used.update(self.files.get(dep, {}).get('dicts', ()))
+                for name in sorted(used - set(entry['dicts'])):
+                    found.append((device, f"{script} uses dict '{name}' but the device "
+                                          f"has no [dict {name}]"))
+        return found
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Power Trio Arranger - Reference Index")
+    parser.add_argument('--root', default=str(PROJECT_ROOT),
+                        help="project root (default: %(default)s)")
+    parser.add_argument('--index', default=str(DEFAULT_INDEX_PATH),
+                        help="saved index file (default: %(default)s)")
+    parser.add_argument('--no-refresh', action='store_true',
+                        help="answer from the saved index without checking for changes")
+    query = parser.add_mutually_exclusive_group()
+    query.add_argument('--impact', metavar='FILE',
+                       help="what breaks if FILE is moved, renamed or deleted")
+    query.add_argument('--dict', metavar='NAME', help="devices and scripts using dict NAME")
+    query.add_argument('--show', metavar='FILE', help="recorded facts for FILE")
+    parser.add_argument('--json', action='store_true', help="print the answer as JSON")
+    return parser.parse_args(argv)
+
+def _print_list(title, items):
+    print(f"\n{title}")
+    for item in items or ['(none)']:
+        print(f"   {item}")
+
+def main(argv=None):
+    args = parse_args(argv)
+    index = ReferenceIndex.load(args.index, args.root)
+    if not args.no_refresh:
+        parsed = index.refresh()
+        if parsed:
+            index.save(args.index)
+
+    if args.impact:
+        answer = index.impact(args.impact)
+    elif args.dict:
+        answer = index.dict_users(args.dict)
+    elif args.show:
+        rel = index.rel(args.show)
+        answer = {'file': rel, **index.files.get(rel, {'error': "not in the index"})}
+    else:
+        answer = {'devices': len(index.devices()), 'scripts': len(index.scripts()),
+                  'problems': [{'file': f, 'message': m} for f, m in index.problems()]}
+
+    if args.json:
+        print(json.dumps(answer, indent=2, ensure_ascii=False))
+    elif args.impact:
+        print(f"📄 {answer['file']}{'' if answer['exists'] else ' (missing)'}")
+        _print_list("Required by:", answer['required_by'])
+        _print_list("node.script in:", answer['node_script_in'])
+        _print_list("⚠️  Devices affected:", answer['devices'])
+    elif args.dict:
+        print(f"📚 dict {answer['dict']}")
+        _print_list("[dict] boxes in:", answer['devices'])
+        _print_list("Scripts and keys:", [f"{s}: {', '.join(k) or '-'}"
+                                          for s, k in answer['scripts'].items()])
+    elif args.show:
+        print(json.dumps(answer, indent=2, ensure_ascii=False))
+    else:
+        print(f"🗂️  {answer['devices']} device(s), {answer['scripts']} script(s)")
+        for problem in answer['problems']:
+            print(f"   ❌ {problem['file']}: {problem['message']}")
+        if not answer['problems']:
+            print("✅ All references resolve")
+    return 1 if answer.get('problems') else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Script Load Harness
+Replays message streams into node.script / [js] modules and times every handler
+
+test/helpers/mock_max_api.js is enough for functional tests but says
+nothing about load. This harness starts a script under Node with the host
+stand-in test/helpers/max_host.js: a local max-api (or Max [js] globals),
+and an in-memory ---power_trio_brain that answers ["dict", "get", ...]
+outlets through the dict_response loop the patchers wire up. The stream
+is replayed on its timestamps, one message at a time like Max's
+scheduler, and the host reports for each message how late it started,
+how long its handler ran, and when the dict round-trips it caused were
+done ("settle").
+
+A message whose cascade has not settled when the next one is due is an
+overrun: on stage that handler falls behind and ticks pile up or drop.
+
+Scenarios build a synthetic stream and Global Brain contents:
+
+    sequencer       track_2_sequencer/sequencer.js, transport_tick on
+                    every 16th note at --bpm (default 300) for --bars
+    lom-export      track_3_conductor/lom_exporter.js, --repeat full-song
+                    exports of a --song-length pattern timeline
+    arranger        track_3_conductor/arranger_bridge.js ([js]), an
+                    arrangement update then onBar at --bpm
+
+or replay a recorded stream (NDJSON lines {"t": ms, "name": handler,
+"args": [...]}) into any script with --script and --stream.
+"""
+
+import argparse
+import json
+import math
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+PROJECT_ROOT = Path("/Users/Matthew/PowerTrioArranger")
+HOST_PATH = Path(__file__).resolve().parent / 'test' / 'helpers' / 'max_host.js'
+
+SCENARIO_SCRIPTS = {
+    'sequencer': ('track_2_sequencer/sequencer.js', 'node'),
+    'lom-export': ('track_3_conductor/lom_exporter.js', 'node'),
+    'arranger': ('track_3_conductor/arranger_bridge.js', 'js'),
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+class HarnessError(RuntimeError):
+    """Raised when Node is missing or the host fails to produce a report"""
+
+
+# -- synthetic streams and dict contents ------------------------------------------
+
+def sixteenth_ms(bpm):
+    return 60000.0 / bpm / 4
+
+
+def _chord(step):
+    root = 48 + (step * 5) % 12
+    return {'root_midi': root, 'root_name': 'C', 'quality': 'maj', 'degree': 1,
+            'midi_notes': [root, root + 4, root + 7], 'voicing_style': 'close'}
+
+
+def _buffer(length=64):
+    return {'section_name': 'Working_Draft', 'length_beats': 16,
+            'events': [_chord(i) if i % 4 == 0 else None for i in range(length)]}
+
+
+def sequencer_scenario(bpm=300, bars=32):
+    """transport_tick 0-15 on every 16th note, with a chord every beat"""
+    interval = sixteenth_ms(bpm)
+    stream = [{'t': round(i * interval, 3), 'name': 'transport_tick', 'args': [i % 16]}
+              for i in range(bars * 16)]
+    brain = {'sequencer_buffer': _buffer(), 'clipboard': {'active_chord': _chord(0)},
+             'transport': {}}
+    return stream, brain
+
+
+def lom_export_scenario(song_length=64, repeat=1, interval_ms=1000):
+    """repeat export_to_live messages, each exporting the whole song"""
+    patterns = {f'pattern_{i}': _buffer(16) for i in range(song_length)}
+    brain = {'song_structure': {'timeline': list(patterns), 'pattern_bank': {}},
+             'patterns': patterns}
+    stream = [{'t': i * interval_ms, 'name': 'export_to_live', 'args': []}
+              for i in range(repeat)]
+    return stream, brain
+
+
+def arranger_scenario(bpm=300, bars=32, sections=8):
+    """One arrangement update, then onBar for every bar"""
+    bar_ms = sixteenth_ms(bpm) * 16
+    per_section = max(1, bars // sections)
+    arrangement = {
+        'key': 0, 'scale': 'ionian',
+        'sections': [{'name': f'Section_{i}', 'start_bar': i * per_section,
+                      'end_bar': (i + 1) * per_section} for i in range(sections)],
+        'chords': [{'bar': b, 'root': 48 + (b * 7) % 12, 'quality': 'maj'}
+                   for b in range(bars)],
+    }
+    stream = [{'t': 0, 'name': 'updateArrangement', 'args': [json.dumps(arrangement)]}]
+    stream += [{'t': round((b + 1) * bar_ms, 3), 'name': 'onBar', 'args': [b]}
+               for b in range(bars)]
+    return stream, {}
+
+
+def load_stream(path):
+    """Read a recorded NDJSON stream, sorted by time"""
+    stream = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            message = json.loads(line)
+            if not isinstance(message, dict) or 'name' not in message:
+                raise ValueError(f"{path}:{number}: expected {{\"t\", \"name\", \"args\"}}")
+            message.setdefault('t', 0)
+            message.setdefault('args', [])
+            stream.append(message)
+    return sorted(stream, key=lambda m: m['t'])
+
+
+# -- running ----------------------------------------------------------------------
+
+def run_host(script, stream, brain=None, mode='node', node='node', linger_ms=50,
+             timeout=600):
+    """Replay stream into script under the host stand-in; returns its raw report"""
+    if shutil.which(node) is None:
+        raise HarnessError(f"'{node}' not found; the harness needs Node.js")
+    with tempfile.TemporaryDirectory(prefix='powertrio-harness-') as tmp:
+        tmp = Path(tmp)
+        with open(tmp / 'stream.ndjson', 'w', encoding='utf-8') as f:
+            for message in stream:
+                f.write(json.dumps(message) + '\n')
+        config = {'script': str(Path(script).resolve()), 'mode': mode, 'dict': brain or {},
+                  'stream': str(tmp / 'stream.ndjson'), 'report': str(tmp / 'report.json'),
+                  'linger_ms': linger_ms}
+        (tmp / 'config.json').write_text(json.dumps(config), encoding='utf-8')
+        proc = subprocess.run([node, str(HOST_PATH), str(tmp / 'config.json')],
+                              capture_output=True, text=True, timeout=timeout)
+        if proc.returncode != 0 or not (tmp / 'report.json').exists():
+            raise HarnessError(f"Host exited with {proc.returncode}:\n"
+                               f"{(proc.stderr or proc.stdout).strip()[-2000:]}")
+        with open(tmp / 'report.json', 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return None
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
+
+
+def _summary(values):
+    values = sorted(v for v in values if v is not None)
+    out = {f'p{p}_ms': percentile(values, p) for p in PERCENTILES}
+    out['max_ms'] = values[-1] if values else None
+    return out
+
+
+def summarize(raw):
+    """Per-handler latency percentiles, throughput and overruns"""
+    messages = raw['messages']
+    overruns = {}
+    for message, following in zip(messages, messages[1:]):
+        settle = message['settle_ms']
+        due = following['t'] - message['t'] - message['late_ms']
+        if settle is None or settle > due:
+            overruns[message['name']] = overruns.get(message['name'], 0) + 1
+    if messages and messages[-1]['settle_ms'] is None:
+        overruns[messages[-1]['name']] = overruns.get(messages[-1]['name'], 0) + 1
+
+    handlers = {}
+    for name, entry in sorted(raw['handlers'].items()):
+        own = [m for m in messages if m['name'] == name]
+        busy = sum(entry['durations'])
+        handlers[name] = {
+            'calls': len(entry['durations']),
+            'errors': entry['errors'],
+            'error_messages': entry['messages'],
+            'handler': _summary(entry['durations']),
+            'late': _summary([m['late_ms'] for m in own]) if own else None,
+            'settle': _summary([m['settle_ms'] for m in own]) if own else None,
+            'overruns': overruns.get(name, 0),
+            'calls_per_s': len(entry['durations']) / (busy / 1000) if busy else None,
+        }
+    wall = raw['wall_ms']
+    return {
+        'messages': len(messages),
+        'wall_ms': wall,
+        'messages_per_s': len(messages) / (wall / 1000) if wall else None,
+        'handlers': handlers,
+        'outlets': raw['outlets'],
+        'posts': raw['posts'],
+    }
+
+
+def print_summary(title, summary):
+    def ms(value):
+        return '-' if value is None else f"{value:.3f}"
+
+    print(f"\n{'='*60}")
+    print(title)
+    print(f"{'='*60}")
+    print(f"{summary['messages']} message(s) in {summary['wall_ms']:.0f} ms "
+          f"({summary['messages_per_s'] or 0:.0f}/s)")
+    for name, h in summary['handlers'].items():
+        status = '❌' if h['errors'] or h['overruns'] else '✅'
+        print(f"\n{status} {name}: {h['calls']} call(s), "
+              f"{h['calls_per_s'] or 0:,.0f}/s of handler time")
+        print(f"   handler  p50 {ms(h['handler']['p50_ms'])}  p95 {ms(h['handler']['p95_ms'])}"
+              f"  p99 {ms(h['handler']['p99_ms'])}  max {ms(h['handler']['max_ms'])} ms")
+        if h['settle']:
+            print(f"   settle   p50 {ms(h['settle']['p50_ms'])}  p95 {ms(h['settle']['p95_ms'])}"
+                  f"  p99 {ms(h['settle']['p99_ms'])}  max {ms(h['settle']['max_ms'])} ms")
+            print(f"   late     p50 {ms(h['late']['p50_ms'])}  p99 {ms(h['late']['p99_ms'])} ms")
+        if h['overruns']:
+            print(f"   ⚠️  {h['overruns']} message(s) not settled before the next was due")
+        if h['errors']:
+            print(f"   ⚠️  {h['errors']} error(s): {'; '.join(h['error_messages'])}")
+    outlets = ', '.join(f"{k} {v}" for k, v in sorted(summary['outlets'].items()))
+    print(f"\n📤 Outlets: {outlets or 'none'}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Power Trio Arranger - Script Load Harness")
+    parser.add_argument('scenario', nargs='?', choices=sorted(SCENARIO_SCRIPTS),
+                        help="synthetic scenario (or use --script and --stream)")
+    parser.add_argument('--root', default=str(PROJECT_ROOT),
+                        help="project root holding the scripts (default: %(default)s)")
+    parser.add_argument('--script', help="script to load instead of the scenario's")
+    parser.add_argument('--mode', choices=('node', 'js'),
+                        help="node.script (max-api) or Max [js] globals")
+    parser.add_argument('--stream', help="recorded NDJSON stream to replay")
+    parser.add_argument('--dict', help="Global Brain dump to start from (JSON)")
+    parser.add_argument('--bpm', type=float, default=300)
+    parser.add_argument('--bars', type=int, default=32)
+    parser.add_argument('--song-length', type=int, default=64,
+                        help="patterns in the lom-export timeline (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=1, help="lom-export runs")
+    parser.add_argument('--node', default='node', help="Node.js executable")
+    parser.add_argument('--json', action='store_true', help="print the summary as JSON")
+    args = parser.parse_args(argv)
+    if not args.scenario and not (args.script and args.stream):
+        parser.error("give a scenario, or --script and --stream")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    root = Path(args.root)
+    if args.scenario == 'sequencer':
+        stream, brain = sequencer_scenario(args.bpm, args.bars)
+    elif args.scenario == 'lom-export':
+        stream, brain = lom_export_scenario(args.song_length, args.repeat)
+    elif args.scenario == 'arranger':
+        stream, brain = arranger_scenario(args.bpm, args.bars)
+    else:
+        stream, brain = [], {}
+    script, mode = SCENARIO_SCRIPTS.get(args.scenario, (None, 'node'))
+    script = Path(args.script) if args.script else root / script
+    mode = args.mode or mode
+
+    try:
+        if args.stream:
+            stream = load_stream(args.stream)
+        if args.dict:
+            with open(args.dict, 'r', encoding='utf-8') as f:
+                brain = dict(brain, **json.load(f))
+        if not script.exists():
+            raise HarnessError(f"Script not found: {script}")
+        summary = summarize(run_host(script, stream, brain, mode, args.node))
+    except (OSError, ValueError, HarnessError, subprocess.TimeoutExpired) as e:
+        print(f"❌ {e}")
+        return 2
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_summary(f"{script.name} ({args.scenario or Path(args.stream).name})", summary)
+    failed = any(h['errors'] or h['overruns'] for h in summary['handlers'].values())
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
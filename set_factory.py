@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Set Factory
+Renders many set variants from one parse of the template
+
+The template is streamed once and compiled into a SetPrototype: the
+template bytes with the parts a variant changes (the track list, the
+scenes, the main track's clip slots and automation envelopes,
+NextPointeeId and the tempo) cut out as named holes, plus a
+TrackPrototype of its first MIDI track. Rendering a variant is then a
+join of static segments with generated bytes; no gunzip or XML parse
+per output. Variants are rendered and compressed in parallel worker
+processes, each of which receives the prototype once.
+
+Manifest (JSON), either a list of variants or {"template", "output_dir",
+"sets": [...]}. Each variant:
+
+    {
+        "output": "Rig_Matthew.als",
+        "tracks": [{"name": ..., "color": ..., "annotation": ...}, ...],
+        "tempo": 98,
+        "scene_count": 16,            # or "scene_names": [...]
+        "song": "song_structure.json" # optional, see compile_song.py
+    }
+
+tracks defaults to create_power_trio_set.TRACK_CONFIGS. Sets whose
+inputs (template, song dump, devices, factory code) and variant settings
+are unchanged since they were last rendered are skipped (see
+build_tracker.py); --force renders everything.
+"""
+
+import argparse
+import copy
+import gzip
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from als_stream import AlsStream, ContainerRewrite, read_chunks, serialize_element
+from build_tracker import BuildTracker, module_files
+from create_power_trio_set import MAIN_CLIP_SLOTS, TEMPLATE_PATH, TRACK_CONFIGS, build_inputs
+from gzip_writer import DEFAULT_LEVEL, add_compression_args, header_mtime, open_gzip_writer
+from track_prototype import EMPTY_CLIP_SLOT, IdAllocator, TrackPrototype, scene_list
+
+OUTPUT_DIR = Path("/Users/Matthew/PowerTrioArranger/Sets")
+TEMPO_PATH = 'LiveSet/MainTrack/DeviceChain/Mixer/Tempo/Manual'
+TEMPO_TARGET_PATH = 'LiveSet/MainTrack/DeviceChain/Mixer/Tempo/AutomationTarget'
+MAIN_ENVELOPES = 'LiveSet/MainTrack/AutomationEnvelopes/Envelopes'
+CREATOR = 'Power Trio Arranger Generator'
+
+HOLES = ('tracks', 'scenes', 'main_slots', 'main_envelopes', 'next_pointee_id', 'tempo')
+
+
+def _hole(name):
+    return '\0%s\0' % name
+
+
+def _targets(envelope, target_id):
+    pointee = envelope.find('EnvelopeTarget/PointeeId')
+    return pointee is not None and pointee.get('Value') == target_id
+
+
+def _retimed(envelope, tempo):
+    """The tempo envelope with every event set to tempo
+
+    The envelope overrides Tempo/Manual when Live opens the set, so a
+    variant's tempo has to replace the template's automation as well.
+    """
+    envelope = copy.deepcopy(envelope)
+    for event in envelope.iter('FloatEvent'):
+        event.set('Value', str(tempo))
+    return serialize_element(envelope)
+
+
+class SetPrototype:
+    """A template set compiled into static segments and named holes"""
+
+    def __init__(self, segments, holes, track, next_id, tempo, scenes, main_slots,
+                 main_envelopes):
+        self.segments = segments
+        self.holes = holes
+        self.track = track
+        self.next_id = next_id
+        self.tempo = tempo
+        self.scenes = scenes
+        self.main_slots = main_slots
+        # Serialized envelopes; the tempo envelope stays an Element
+        self.main_envelopes = main_envelopes
+
+    def render(self, track_configs, tempo=None, scene_count=None, scene_names=None,
+               clips=None):
+        """Yield the decompressed bytes of one variant"""
+        if scene_count is None:
+            scene_count = len(scene_names) if scene_names else len(self.scenes)
+        resized = scene_count != len(self.scenes) or bool(scene_names)
+        clips = clips or {}
+        allocator = IdAllocator(self.next_id)
+
+        def tracks():
+            for idx, config in enumerate(track_configs):
+                yield self.track.render(
+                    idx, allocator.allocate(self.track.id_count),
+                    fields={'name': config['name'],
+                            'annotation': config.get('annotation', ''),
+                            'color': config.get('color', '-1'),
+                            'unfolded': True},
+                    scene_count=scene_count,
+                    clips=clips.get(idx))
+
+        values = {
+            'tracks': tracks,
+            'scenes': lambda: (scene_list(self.scenes[0], scene_count, scene_names)
+                               if resized else iter(self.scenes)),
+            'main_slots': lambda: ((EMPTY_CLIP_SLOT % i for i in range(scene_count))
+                                   if resized else iter(self.main_slots)),
+            'main_envelopes': lambda: (
+                _retimed(e, tempo) if tempo is not None and not isinstance(e, bytes)
+                else serialize_element(e) for e in self.main_envelopes),
+            'next_pointee_id': lambda: [
+                b'%d' % (self.next_id + self.track.id_count * len(track_configs))],
+            'tempo': lambda: [str(self.tempo if tempo is None else tempo).encode()],
+        }
+        previous = self.segments[0]
+        yield previous
+        for hole, segment in zip(self.holes, self.segments[1:]):
+            # Container holes sit after the first child's indentation;
+            # repeat it between children the way AlsStream does
+            indent = previous[previous.rfind(b'\n'):]
+            for i, data in enumerate(values[hole]()):
+                if i and not indent.strip():
+                    yield indent
+                yield data
+            yield segment
+            previous = segment
+
+
+def compile_template(path, tag='MidiTrack'):
+    """Stream the template once and return its SetPrototype"""
+    found = {'track': None, 'scenes': [], 'main_slots': [], 'main_envelopes': []}
+
+    def on_track(elem):
+        if found['track'] is None and elem.tag == tag:
+            found['track'] = TrackPrototype(elem)
+        return []
+
+    def keep(key):
+        def on_child(elem):
+            found[key].append(serialize_element(elem))
+            return []
+        return on_child
+
+    def fill(name):
+        return lambda: [_hole(name).encode()]
+
+    containers = {
+        'LiveSet/Tracks': ContainerRewrite(on_track, fill('tracks')),
+        'LiveSet/Scenes': ContainerRewrite(keep('scenes'), fill('scenes')),
+        MAIN_CLIP_SLOTS: ContainerRewrite(keep('main_slots'), fill('main_slots')),
+        # Kept parsed: the tempo target's id only follows in the DeviceChain
+        MAIN_ENVELOPES: ContainerRewrite(
+            lambda elem: found['main_envelopes'].append(elem) or [],
+            fill('main_envelopes')),
+    }
+    output = io.BytesIO()
+    stream = AlsStream(
+        containers, output=output, root_attrs={'Creator': CREATOR},
+        attr_overrides={'LiveSet/NextPointeeId': {'Value': _hole('next_pointee_id')},
+                        TEMPO_PATH: {'Value': _hole('tempo')}},
+        watch={'LiveSet/NextPointeeId', TEMPO_PATH, TEMPO_TARGET_PATH})
+    with gzip.open(path, 'rb') as f:
+        for data in read_chunks(f):
+            stream.feed(data)
+        stream.close()
+
+    if found['track'] is None:
+        raise ValueError(f"No {tag} found in {path}")
+    parts = output.getvalue().split(b'\0')
+    segments, holes = parts[0::2], [h.decode() for h in parts[1::2]]
+    missing = [h for h in HOLES if h not in holes]
+    if missing or len(holes) != len(set(holes)):
+        raise ValueError(f"Template is missing {', '.join(missing) or 'unique sections'}")
+    tempo_target = stream.values.get(TEMPO_TARGET_PATH, {}).get('Id')
+    envelopes = [envelope if _targets(envelope, tempo_target) else serialize_element(envelope)
+                 for envelope in found['main_envelopes']]
+    return SetPrototype(
+        segments, holes, found['track'],
+        int(stream.values['LiveSet/NextPointeeId']['Value']),
+        stream.values[TEMPO_PATH]['Value'],
+        found['scenes'], found['main_slots'], envelopes)
+
+
+# -- manifest and workers -------------------------------------------------------
+
+def load_manifest(path):
+    """Read a factory manifest; returns (settings, variants)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        data = {'sets': data}
+    base = Path(path).parent
+    for variant in data.get('sets', []):
+        if 'song' in variant:
+            variant['song'] = str(base / variant['song'])
+    return data, data.get('sets', [])
+
+
+_prototype = None
+
+
+def _init_worker(prototype):
+    global _prototype
+    _prototype = prototype
+
+
+def render_variant(variant, output_dir, prototype=None, compresslevel=DEFAULT_LEVEL,
+                   threads=None, mtime=None):
+    """Render and write one variant; returns a summary dict"""
+    prototype = prototype or _prototype
+    start = time.perf_counter()
+    tracks = variant.get('tracks') or TRACK_CONFIGS
+    scene_names = variant.get('scene_names')
+    clips = None
+    if variant.get('song'):
+        # Imported here so plain rigs do not depend on the compiler
+        from compile_song import CHORD_TRACK, compile_clips, load_song
+        timeline, bank = load_song(variant['song'])
+        color = tracks[CHORD_TRACK]['color'] if CHORD_TRACK < len(tracks) else -1
+        scene_names, chord_clips = compile_clips(timeline, bank, color)
+        clips = {CHORD_TRACK: chord_clips}
+
+    output = Path(output_dir) / variant['output']
+    output.parent.mkdir(parents=True, exist_ok=True)
+    size = 0
+    with open_gzip_writer(output, compresslevel, threads, mtime=mtime) as f:
+        for data in prototype.render(tracks, variant.get('tempo'),
+                                     variant.get('scene_count'), scene_names, clips):
+            f.write(data)
+            size += len(data)
+    return {'output': str(output), 'tracks': len(tracks), 'bytes': size,
+            'seconds': time.perf_counter() - start}
+
+
+def build_sets(prototype, variants, output_dir, workers=None,
+               compresslevel=DEFAULT_LEVEL, threads=None, mtime=None):
+    """Render every variant, in parallel when workers != 1
+    
+    With several worker processes each compresses on one thread unless
+    threads says otherwise.
+    """
+    if workers == 1 or len(variants) <= 1:
+        return [render_variant(v, output_dir, prototype, compresslevel, threads, mtime)
+                for v in variants]
+    workers = min(workers or os.cpu_count() or 1, len(variants))
+    n = len(variants)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(prototype,)) as pool:
+        return list(pool.map(render_variant, variants, [output_dir] * n, [None] * n,
+                             [compresslevel] * n, [threads or 1] * n, [mtime] * n))
+
+
+def variant_inputs(variant, template):
+    """Files one variant depends on"""
+    inputs = build_inputs(template) + module_files(__file__)
+    if variant.get('song'):
+        inputs.append(Path(variant['song']))
+    return inputs
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Power Trio Arranger - Set Factory")
+    parser.add_argument('manifest', help="JSON list of set variants (see module docstring)")
+    parser.add_argument('--template', help="template .als (default: manifest or built-in)")
+    parser.add_argument('--output-dir', '-o', help="directory for the rendered sets")
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help="worker processes (default: CPU count)")
+    parser.add_argument('--force', '-f', action='store_true',
+                        help="render every set, even those that are up to date")
+    add_compression_args(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    settings, variants = load_manifest(args.manifest)
+    if not variants:
+        print("❌ Manifest has no sets")
+        return 1
+    template = Path(args.template or settings.get('template') or TEMPLATE_PATH)
+    output_dir = Path(args.output_dir or settings.get('output_dir') or OUTPUT_DIR)
+    if not template.exists():
+        print(f"❌ Template set not found: {template}")
+        return 1
+
+    tracker = BuildTracker()
+    builds = []
+    for variant in variants:
+        params = {'variant': variant, 'compression': args.compression,
+                  'reproducible': args.reproducible}
+        inputs = variant_inputs(variant, template)
+        reason = tracker.stale_reason(output_dir / variant['output'], inputs, params)
+        if reason is None and not args.force:
+            continue
+        builds.append((variant, inputs, params))
+    skipped = len(variants) - len(builds)
+    if not builds:
+        print(f"✅ All {len(variants)} set(s) are up to date (--force to rebuild)")
+        tracker.save()
+        return 0
+
+    print(f"📖 Compiling template {template.name}...")
+    start = time.perf_counter()
+    prototype = compile_template(template)
+    print(f"✅ Template compiled in {time.perf_counter() - start:.2f}s "
+          f"({prototype.track.id_count} pointee ids per track)")
+
+    print(f"\n🏭 Rendering {len(builds)} set(s) to {output_dir}"
+          f"{f' ({skipped} up to date)' if skipped else ''}...\n")
+    start = time.perf_counter()
+    summaries = build_sets(prototype, [variant for variant, _, _ in builds], output_dir,
+                           args.jobs, args.compression, args.threads,
+                           header_mtime(args.reproducible))
+    for summary, (variant, inputs, params) in zip(summaries, builds):
+        tracker.record(summary['output'], inputs, params)
+        print(f"   ✅ {Path(summary['output']).name}: {summary['tracks']} tracks, "
+              f"{summary['bytes']:,} bytes in {summary['seconds']:.2f}s")
+    tracker.save()
+    print(f"\n⏱️  {len(builds)} set(s) in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Structural Diff
+Path-level diff of .als sets and .amxd devices using subtree hashes
+
+Both files are turned into trees whose nodes carry a digest of their
+whole subtree. Devices go through AmxdContainer's patcher JSON (each
+node hashes its value plus its children's digests). Sets are read as raw
+bytes, like the byte-level patch engine in als_patch.py: a node is the
+byte span of one element, hashed in C, and its children are only found
+when the digests of two nodes differ. Comparing two large sets that
+share most tracks therefore costs little more than hashing them.
+
+Children are aligned by digest (a longest-common-subsequence match), so
+an inserted track shows up as one added subtree rather than every later
+track changing. Patcher boxes are matched by box id and patchlines by
+their endpoints. Paths index same-tag siblings from 0:
+
+    ~ LiveSet/Tracks/MidiTrack[2]/Name/EffectiveName  Value: '2-Sequencer' -> 'Bass'
+    + LiveSet/Tracks/MidiTrack[5]
+    - patcher/boxes[obj-12]
+
+With one argument the file is compared against its .backup copy.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import sys
+import re
+import xml.etree.ElementTree as ET
+from difflib import SequenceMatcher
+from pathlib import Path
+
+from amxd_container import AmxdContainer, AmxdError
+
+DEFAULT_LIMIT = 200
+
+
+class Node:
+    """One tree node: label, own value, digest and ordered children"""
+
+    __slots__ = ('tag', 'key', 'value', 'digest', 'children')
+
+    def __init__(self, tag, value, children, key=None):
+        self.tag = tag
+        self.key = key          # match key among siblings (None: align by digest)
+        self.value = value
+        self.children = children
+        h = hashlib.blake2b(digest_size=16)
+        h.update(tag.encode('utf-8', 'surrogatepass'))
+        h.update(b'\0')
+        h.update(repr(value).encode('utf-8', 'surrogatepass'))
+        for child in children:
+            h.update(child.digest)
+        self.digest = h.digest()
+
+
+# -- tree builders ----------------------------------------------------------------
+
+def element_tree(elem):
+    """Node tree of a parsed ElementTree element"""
+    text = (elem.text or '').strip()
+    attrs = tuple(sorted(elem.attrib.items()))
+    return Node(elem.tag, (attrs, text) if text else attrs,
+                [element_tree(child) for child in elem])
+
+
+class Span:
+    """Lazily expanded node over the raw bytes of one .als element
+
+    Live writes one element per line, indented with one tab per level,
+    so the direct children of an element at depth d are the lines inside
+    it that start with d + 1 tabs and '<'. Finding them and hashing their
+    bytes are both single C-level passes (re, blake2b); the Python side
+    only ever touches the children of subtrees that differ. Elements
+    written on one line fall back to ElementTree.
+    """
+
+    __slots__ = ('data', 'start', 'end', 'depth', 'tag', 'key', '_digest', '_children')
+
+    def __init__(self, data, start, end, depth):
+        self.data = data
+        self.start = start
+        self.end = end
+        self.depth = depth
+        self.tag = _TAG_NAME.match(data, start + 1).group().decode()
+        self.key = None
+        self._digest = None
+        self._children = None
+
+    @property
+    def raw(self):
+        return self.data[self.start:self.end]
+
+    @property
+    def digest(self):
+        if self._digest is None:
+            self._digest = hashlib.blake2b(self.raw, digest_size=16).digest()
+        return self._digest
+
+    @property
+    def value(self):
+        head_end = _START_TAG.match(self.data, self.start).end()
+        head = bytes(self.data[self.start:head_end])
+        if head.endswith(b'/>') or not self.children:
+            elem = ET.fromstring(bytes(self.raw))
+            text = (elem.text or '').strip() if not len(elem) else ''
+        else:
+            elem = ET.fromstring(head[:-1] + b'/>')
+            text = ''
+        attrs = tuple(sorted(elem.attrib.items()))
+        return (attrs, text) if text else attrs
+
+    @property
+    def children(self):
+        if self._children is None:
+            self._children = self._expand()
+        return self._children
+
+    def _expand(self):
+        data, depth = self.data, self.depth
+        head_end = _START_TAG.match(data, self.start).end()
+        if data[head_end - 2:head_end] == b'/>':
+            return []
+        close = data.rfind(b'</', self.start, self.end)
+        pattern = _child_line(depth + 1)
+        starts = [m.end() - 1 for m in pattern.finditer(data, head_end, close)]
+        if not starts:
+            if data.find(b'<', head_end, close) < 0:
+                return []
+            # Children on one line: parse this (usually small) element
+            return element_tree(ET.fromstring(bytes(self.raw))).children
+        children = []
+        for i, start in enumerate(starts):
+            boundary = starts[i + 1] - depth - 2 if i + 1 < len(starts) else close
+            end = data.rfind(b'>', start, boundary) + 1
+            children.append(Span(data, start, end, depth + 1))
+        # Anything between the lines found means the indentation is not
+        # Live's; parse the element instead of guessing
+        gaps = [data[head_end:starts[0]]] + [
+            data[c.end:n.start] for c, n in zip(children, children[1:])]
+        gaps.append(data[children[-1].end:close])
+        if any(gap.strip() for gap in gaps):
+            return element_tree(ET.fromstring(bytes(self.raw))).children
+        return children
+
+
+_TAG_NAME = re.compile(rb'[A-Za-z_][\w.\-]*')
+_START_TAG = re.compile(rb'<[^>"]*(?:"[^"]*"[^>"]*)*>')
+_CHILD_LINES = {}
+
+
+def _child_line(depth):
+    pattern = _CHILD_LINES.get(depth)
+    if pattern is None:
+        pattern = _CHILD_LINES[depth] = re.compile(rb'\n\t{%d}<(?=[A-Za-z_])' % depth)
+    return pattern
+
+
+def als_tree(path):
+    """Lazy Merkle tree over a decompressed .als"""
+    with gzip.open(path, 'rb') as f:
+        data = f.read()
+    start = 0
+    while True:
+        start = data.index(b'<', start)
+        if data[start + 1:start + 2] not in (b'?', b'!'):
+            break
+        start += 1
+    end = data.rindex(b'>') + 1
+    return Span(data, start, end, 0)
+
+
+def _list_key(item):
+    if isinstance(item, dict):
+        box = item.get('box')
+        if isinstance(box, dict) and 'id' in box:
+            return f"[{box['id']}]"
+        line = item.get('patchline')
+        if isinstance(line, dict) and 'source' in line and 'destination' in line:
+            src, dst = line['source'], line['destination']
+            return f"[{src[0]}:{src[1]}->{dst[0]}:{dst[1]}]"
+    return None
+
+
+def json_tree(value, tag=''):
+    """Merkle tree of a parsed JSON value"""
+    if isinstance(value, dict):
+        children = [json_tree(v, k) for k, v in value.items()]
+        for child in children:
+            child.key = child.tag
+        return Node(tag, '{}', children)
+    if isinstance(value, list):
+        keys = [_list_key(v) for v in value]
+        keyed = all(keys) and len(set(keys)) == len(keys)
+        children = []
+        for i, item in enumerate(value):
+            child = json_tree(item, keys[i] if keyed else '')
+            child.key = keys[i] if keyed else None
+            children.append(child)
+        return Node(tag, '[]', children)
+    return Node(tag, value, [])
+
+
+def device_tree(path):
+    """Merkle tree of a device: chunk headers plus the patcher JSON"""
+    container = AmxdContainer.read(path)
+    chunks = [Node(chunk.tag.decode('latin-1'),
+                   bytes(container.payload(chunk.tag)).hex()
+                   if chunk.tag != b'ptch' else chunk.size, [])
+              for chunk in container.chunks]
+    for chunk in chunks:
+        chunk.key = chunk.tag
+    document = json_tree(container.patcher())
+    return Node('', (('bare', container.bare), ('stale_length', container.stale_length)),
+                [Node('chunks', '', chunks, key='chunks')] + document.children)
+
+
+def load_tree(path):
+    """Pick the builder from the file's magic bytes"""
+    with open(path, 'rb') as f:
+        magic = f.read(2)
+    if magic == b'\x1f\x8b':
+        return als_tree(path)
+    return device_tree(path)
+
+
+# -- comparison -------------------------------------------------------------------
+
+def _labels(children):
+    """Display label of each child: tag, indexed when the tag repeats"""
+    counts = {}
+    for child in children:
+        counts[child.tag] = counts.get(child.tag, 0) + 1
+    seen = {}
+    labels = []
+    for child in children:
+        if not child.tag:
+            labels.append(f"[{seen.get(child.tag, 0)}]")
+        elif child.key is not None or counts[child.tag] == 1:
+            labels.append(child.tag)
+        else:
+            labels.append(f"{child.tag}[{seen.get(child.tag, 0)}]")
+        seen[child.tag] = seen.get(child.tag, 0) + 1
+    return labels
+
+
+def _join(path, label):
+    if not path:
+        return label
+    if label.startswith('['):
+        return path + label
+    return f"{path}/{label}"
+
+
+def diff_trees(a, b, path='', out=None, limit=None):
+    """Return [(op, path, old, new)] for every differing subtree
+
+    op is '~' (value changed), '+' (added) or '-' (removed).
+    """
+    out = [] if out is None else out
+    if a.digest == b.digest or (limit is not None and len(out) >= limit):
+        return out
+    if a.value != b.value:
+        out.append(('~', path or a.tag or '/', a.value, b.value))
+
+    a_labels, b_labels = _labels(a.children), _labels(b.children)
+    pairs, removed, added = [], [], []
+
+    if a.children and all(c.key is not None for c in a.children + b.children):
+        b_by_key = {c.key: i for i, c in enumerate(b.children)}
+        matched = set()
+        for i, child in enumerate(a.children):
+            j = b_by_key.get(child.key)
+            if j is None:
+                removed.append(i)
+            else:
+                matched.add(j)
+                pairs.append((i, j))
+        added = [j for j in range(len(b.children)) if j not in matched]
+    else:
+        matcher = SequenceMatcher(None, [c.digest for c in a.children],
+                                  [c.digest for c in b.children], autojunk=False)
+        for op, i1, i2, j1, j2 in matcher.get_opcodes():
+            if op == 'equal':
+                continue
+            # Pair up same-tag children inside a replaced range in order
+            b_free = list(range(j1, j2))
+            for i in range(i1, i2):
+                j = next((j for j in b_free if b.children[j].tag == a.children[i].tag), None)
+                if j is None:
+                    removed.append(i)
+                else:
+                    b_free.remove(j)
+                    pairs.append((i, j))
+            added.extend(b_free)
+
+    for i, j in pairs:
+        diff_trees(a.children[i], b.children[j], _join(path, b_labels[j]), out, limit)
+    for i in removed:
+        if limit is not None and len(out) >= limit:
+            return out
+        out.append(('-', _join(path, a_labels[i]), None, None))
+    for j in added:
+        if limit is not None and len(out) >= limit:
+            return out
+        out.append(('+', _join(path, b_labels[j]), None, None))
+    return out
+
+
+def _describe(old, new):
+    if all(isinstance(v, tuple) and all(isinstance(p, tuple) and len(p) == 2 for p in v)
+           for v in (old, new)):
+        old_attrs, new_attrs = dict(old), dict(new)
+        parts = [f"{k}: {old_attrs.get(k)!r} -> {new_attrs.get(k)!r}"
+                 for k in sorted(set(old_attrs) | set(new_attrs))
+                 if old_attrs.get(k) != new_attrs.get(k)]
+        if parts:
+            return ', '.join(parts)
+    return f"{old!r} -> {new!r}"
+
+
+def format_changes(changes):
+    lines = []
+    for op, path, old, new in changes:
+        if op == '~':
+            lines.append(f"~ {path}  {_describe(old, new)}")
+        else:
+            lines.append(f"{op} {path}")
+    return lines
+
+
+def diff_files(old_path, new_path, limit=None):
+    """Diff two files of the same kind; returns the change list"""
+    return diff_trees(load_tree(old_path), load_tree(new_path), limit=limit)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Power Trio Arranger - Structural Diff")
+    parser.add_argument('old', help=".als or .amxd/.maxpat (alone: compared with its .backup)")
+    parser.add_argument('new', nargs='?', help="file to compare against")
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT,
+                        help="stop after this many changes (0: no limit)")
+    parser.add_argument('--json', action='store_true', help="print changes as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    old, new = Path(args.old), args.new
+    if new is None:
+        old, new = Path(str(old) + '.backup'), old
+    new = Path(new)
+    for path in (old, new):
+        if not path.exists():
+            print(f"❌ {path} not found")
+            return 2
+    try:
+        changes = diff_files(old, new, args.limit or None)
+    except (OSError, AmxdError, ET.ParseError) as e:
+        print(f"❌ Could not read: {e}")
+        return 2
+
+    if args.json:
+        print(json.dumps([{'op': op, 'path': path, 'old': old_value, 'new': new_value}
+                          for op, path, old_value, new_value in changes],
+                         indent=2, default=str))
+    else:
+        for line in format_changes(changes):
+            print(line)
+        if not changes:
+            print("✅ No structural differences")
+        elif args.limit and len(changes) >= args.limit:
+            print(f"... stopped after {args.limit} changes (--limit)")
+    return 1 if changes else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
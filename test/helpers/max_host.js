@@ -0,0 +1,240 @@
+// Max host stand-in for load testing node.script and [js] scripts
+//
+// Usage: node max_host.js <config.json>
+//
+// config: { script, mode: "node" | "js", dict: {...}, stream: "messages.ndjson",
+//           report: "report.json" }
+//
+// The script is loaded with a local max-api (node mode) or Max [js] globals
+// (js mode). Each stream line { t, name, args } is delivered at t ms after
+// start; messages are dispatched one at a time, like Max's scheduler.
+// Outlets of the form ["dict", op, (name,) path, value] are answered by an
+// in-memory ---power_trio_brain through the dict_response loop, one event
+// loop turn later. Per-message timings go to the report file.
+
+const fs = require('fs');
+const path = require('path');
+const vm = require('vm');
+const Module = require('module');
+
+const config = JSON.parse(fs.readFileSync(process.argv[2], 'utf8'));
+const now = () => Number(process.hrtime.bigint()) / 1e6;
+
+// ---- dict stand-in -------------------------------------------------------
+
+const brain = config.dict || {};
+
+function walk(keyPath, create) {
+    const keys = String(keyPath).split('::');
+    let node = brain;
+    for (const key of keys.slice(0, -1)) {
+        if (node[key] === undefined || node[key] === null || typeof node[key] !== 'object') {
+            if (!create) return [undefined, null];
+            node[key] = {};
+        }
+        node = node[key];
+    }
+    return [node, keys[keys.length - 1]];
+}
+
+function parseValue(value) {
+    if (typeof value !== 'string') return value;
+    try { return JSON.parse(value); } catch (e) { return value; }
+}
+
+function dictGet(keyPath) {
+    const [node, key] = walk(keyPath, false);
+    return node && node[key] !== undefined ? node[key] : null;
+}
+
+function dictOutlet(args) {
+    let [op, ...rest] = args;
+    if (typeof rest[0] === 'string' && rest[0].startsWith('---') && rest.length > 1) {
+        rest = rest.slice(1);       // explicit dict name
+    }
+    const [keyPath, ...values] = rest;
+    if (op === 'get') {
+        const value = dictGet(keyPath);
+        const out = value !== null && typeof value === 'object' ? JSON.stringify(value) : String(value);
+        respond('dict_response', [keyPath, out]);
+    } else if (op === 'replace' || op === 'set') {
+        const [node, key] = walk(keyPath, true);
+        node[key] = parseValue(values.length === 1 ? values[0] : values);
+    } else if (op === 'append') {
+        const [node, key] = walk(keyPath, true);
+        if (!Array.isArray(node[key])) node[key] = node[key] === undefined ? [] : [node[key]];
+        node[key].push(...values.map(parseValue));
+    }
+}
+
+// ---- dispatch and timing -------------------------------------------------
+
+const handlers = {};
+const stats = {};               // handler -> { durations: [], errors, messages: [] }
+const outlets = {};
+const posts = [];
+const queue = [];               // [{ name, args, cause }]
+const messages = [];            // per stream message timings
+let current = null;             // stream message whose cascade is running
+let draining = false;
+
+function stat(name) {
+    if (!stats[name]) stats[name] = { durations: [], errors: 0, messages: [] };
+    return stats[name];
+}
+
+function respond(name, args) {
+    if (current) current.pending += 1;
+    queue.push({ name, args, cause: current });
+    if (!draining) {
+        draining = true;
+        setImmediate(drain);
+    }
+}
+
+function invoke(name, args) {
+    const entry = stat(name);
+    const handler = handlers[name];
+    const start = now();
+    try {
+        if (typeof handler !== 'function') throw new Error(`no handler for '${name}'`);
+        handler(...args);
+    } catch (e) {
+        entry.errors += 1;
+        if (entry.messages.length < 3) entry.messages.push(String(e && e.message || e));
+    }
+    entry.durations.push(now() - start);
+}
+
+function settle(cause) {
+    cause.pending -= 1;
+    if (cause.pending === 0) cause.done = now();
+}
+
+function drain() {
+    draining = false;
+    const batch = queue.splice(0);
+    for (const { name, args, cause } of batch) {
+        current = cause;
+        invoke(name, args);
+        if (cause) settle(cause);
+    }
+    current = null;
+}
+
+function outlet(...args) {
+    const selector = String(args[0]);
+    outlets[selector] = (outlets[selector] || 0) + 1;
+    if (selector === 'dict') dictOutlet(args.slice(1));
+}
+
+function post(...args) {
+    if (posts.length < 50) posts.push(args.join(' '));
+}
+
+// ---- script loading ------------------------------------------------------
+
+const maxApi = {
+    addHandler: (name, fn) => { handlers[name] = fn; },
+    addHandlers: (map) => { Object.assign(handlers, map); },
+    removeHandler: (name) => { delete handlers[name]; },
+    outlet: (...args) => { outlet(...args); return Promise.resolve(); },
+    outletBang: () => { outlet('bang'); return Promise.resolve(); },
+    post: (...args) => { post(...args); return Promise.resolve(); },
+    getDict: (name) => Promise.resolve(brain),
+    setDict: (name, value) => { Object.keys(brain).forEach(k => delete brain[k]); Object.assign(brain, value); return Promise.resolve(brain); },
+    updateDict: (name, keyPath, value) => { dictOutlet(['replace', keyPath, value]); return Promise.resolve(brain); },
+    MESSAGE_TYPES: { ALL: 'all', BANG: 'bang', DICT: 'dict', NUMBER: 'number', LIST: 'list' },
+    POST_LEVELS: { ERROR: 'error', INFO: 'info', WARN: 'warn' },
+};
+
+function loadNode(script) {
+    const originalLoad = Module._load;
+    Module._load = function (request, ...rest) {
+        if (request === 'max-api') return maxApi;
+        return originalLoad.call(this, request, ...rest);
+    };
+    require(path.resolve(script));
+}
+
+function loadJs(script) {
+    const context = vm.createContext({
+        autowatch: 0, inlets: 1, outlets: 1, jsarguments: [], messagename: '',
+        post: (...args) => post(...args),
+        error: (...args) => post('error:', ...args),
+        outlet: (index, ...args) => outlet(...args),
+        arrayfromargs: (args) => Array.prototype.slice.call(args),
+        JSON, Math,
+    });
+    vm.runInContext(fs.readFileSync(script, 'utf8'), context, { filename: script });
+    return new Proxy({}, {
+        get: (target, name) => {
+            const fn = context[name];
+            if (typeof fn !== 'function') return undefined;
+            return (...args) => { context.messagename = name; return fn(...args); };
+        },
+    });
+}
+
+if (config.mode === 'js') {
+    // Max [js] routes a message to the global function of the same name
+    Object.setPrototypeOf(handlers, loadJs(config.script));
+} else {
+    loadNode(config.script);
+}
+
+// ---- replay --------------------------------------------------------------
+
+const stream = fs.readFileSync(config.stream, 'utf8').split('\n').filter(Boolean).map(JSON.parse);
+let started;
+
+function deliver(message) {
+    const record = { name: message.name, t: message.t, start: now() - started, pending: 1 };
+    messages.push(record);
+    current = record;
+    invoke(message.name, message.args || []);
+    current = null;
+    record.end = now() - started;
+    settle(record);
+}
+
+function finish() {
+    const wall = now() - started;
+    const report = {
+        wall_ms: wall,
+        handlers: stats,
+        outlets,
+        posts,
+        messages: messages.map(m => ({
+            name: m.name, t: m.t,
+            late_ms: m.start - m.t,
+            sync_ms: m.end - m.start,
+            settle_ms: m.done !== undefined ? m.done - started - m.start : null,
+        })),
+    };
+    fs.writeFileSync(config.report, JSON.stringify(report));
+    process.exit(0);
+}
+
+function run(index) {
+    while (index < stream.length) {
+        const wait = stream[index].t - (now() - started);
+        if (wait > 1) {
+            setTimeout(() => run(index), wait - 1);
+            return;
+        }
+        if (wait > 0 || queue.length) {
+            // Let pending dict responses run first; spin out the last millisecond
+            setImmediate(() => run(index));
+            return;
+        }
+        deliver(stream[index]);
+        index += 1;
+    }
+    // Let cascades settle, then give up on anything still waiting
+    const idle = () => (queue.length || draining ? setImmediate(idle) : setTimeout(finish, config.linger_ms || 50));
+    idle();
+}
+
+started = now();
+run(0);
@@ -0,0 +1,6 @@
+"""Puts the repo's top-level scripts on sys.path for the Python tests"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
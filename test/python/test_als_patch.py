@@ -0,0 +1,49 @@
+"""als_patch: track edits applied to a real template and re-gzipped"""
+
+import gzip
+import io
+from pathlib import Path
+
+from als_patch import patch_als_bytes, plan_patch
+from gzip_writer import GzipBlockWriter
+
+TEMPLATE = Path(__file__).resolve().parents[2] / 'Application Docs' / 'DefaultLiveSet.als'
+
+EDITS = [
+    {'track': 0, 'name': '1-Chord Lab', 'annotation': 'Chords "& voicings" <ii-V-I>\nline 2'},
+    {'track': 1, 'name': '2-Séquenceur ♪', 'color': '10'},
+    {'root': 'Creator', 'value': 'Power Trio Arranger'},
+]
+
+
+def _patch_gzipped(data, edits):
+    raw = io.BytesIO()
+    # Small blocks so the output spans several deflate blocks
+    with GzipBlockWriter(raw, threads=2, block_size=64 << 10, mtime=0) as out:
+        report = patch_als_bytes(data, edits, out)
+    return gzip.decompress(raw.getvalue()), report
+
+
+def _undo(report):
+    return [{'root': c['root'], 'value': c['old']} if 'root' in c
+            else {'track': c['track'], c['field']: c['old']} for c in report]
+
+
+def test_patch_roundtrips_through_gzip():
+    data = gzip.decompress(TEMPLATE.read_bytes())
+    patched, report = _patch_gzipped(data, EDITS)
+    assert len(report) == 5
+    assert b'Value="Chords &quot;&amp; voicings&quot; &lt;ii-V-I&gt;&#10;line 2"' in patched
+    assert 'Value="2-Séquenceur ♪"'.encode('utf-8') in patched
+
+    # Reading the patched set back finds every edit already applied
+    _, again = plan_patch(patched, EDITS)
+    assert [c['old'] for c in again] == [c['new'] for c in report]
+
+
+def test_undoing_edits_restores_template():
+    data = gzip.decompress(TEMPLATE.read_bytes())
+    patched, report = _patch_gzipped(data, EDITS)
+    assert all(c['old'] is not None for c in report)
+    restored, _ = _patch_gzipped(patched, _undo(report))
+    assert restored == data
@@ -0,0 +1,31 @@
+"""amxd_container: chunk indexing and the ptch payload stream"""
+
+import struct
+
+import pytest
+
+from amxd_container import AmxdContainer, AmxdError, open_patcher_stream
+
+PAYLOAD = b'{"patcher": {"boxes": [], "lines": []}}\n\0'
+
+
+def _chunk(tag, body):
+    return tag + struct.pack('<I', len(body)) + body
+
+
+def test_stale_ptch_length_extends_to_eof():
+    data = _chunk(b'ampf', b'aaaa') + b'ptch' + struct.pack('<I', 10) + PAYLOAD
+    container = AmxdContainer(data)
+    assert container.stale_length
+    assert bytes(container.payload()) == PAYLOAD
+    assert container.serialize(PAYLOAD) == _chunk(b'ampf', b'aaaa') + _chunk(b'ptch', PAYLOAD)
+    with pytest.raises(AmxdError):
+        AmxdContainer(data, strict=True)
+
+
+def test_patcher_stream_stops_at_payload_end(tmp_path):
+    device = tmp_path / 'device.amxd'
+    device.write_bytes(_chunk(b'ampf', b'mmmm') + _chunk(b'ptch', PAYLOAD) +
+                       _chunk(b'dlst', b'\xff' * 64))
+    with open_patcher_stream(device) as f:
+        assert f.read() == PAYLOAD
@@ -0,0 +1,62 @@
+"""fix_devices: dry run and write of a device with a stale ptch length"""
+
+import json
+import struct
+
+from amxd_container import AmxdContainer
+from backup_store import BackupStore
+from fix_devices import plan_device_fix
+
+EXPECTED = 'track_1_chord_lab/logic.js'
+PATCHER = {'patcher': {'boxes': [
+    {'box': {'id': 'obj-1', 'maxclass': 'newobj', 'text': 'node.script old.js',
+             'textfile': {'filename': 'old.js'}}},
+    {'box': {'id': 'obj-2', 'maxclass': 'comment', 'text': 'Accord ♪'}},
+], 'lines': []}}
+
+
+def _write_stale_device(path):
+    payload = json.dumps(PATCHER, indent='\t', ensure_ascii=False).encode('utf-8') + b'\n\0'
+    # Declared length stops short of the payload, as older fixers left it
+    data = (b'ampf' + struct.pack('<I', 4) + b'mmmm' +
+            b'meta' + struct.pack('<I', 4) + b'\x01\0\0\0' +
+            b'ptch' + struct.pack('<I', len(payload) - 20) + payload)
+    path.write_bytes(data)
+    return data
+
+
+def test_dry_run_leaves_device_alone(tmp_path):
+    device = tmp_path / 'Track_1_Chord_Lab.amxd'
+    original = _write_stale_device(device)
+    store = tmp_path / 'store.db'
+    result = plan_device_fix(device, 'Chord Lab', EXPECTED, dry_run=True, store_path=store)
+    assert result['error'] is None
+    assert result['repair_length'] is True
+    assert result['written'] is False and result['backup'] is None
+    assert result['changes'] == [{'path': ['patcher', 'boxes', 0, 'box', 'textfile', 'filename'],
+                                  'old': 'old.js', 'new': EXPECTED}]
+    added = [line for line in result['diff'].splitlines() if line.startswith('+\t')]
+    assert added == [f'+\t\t\t\t\t\t"filename": "{EXPECTED}"']
+    assert device.read_bytes() == original
+    assert not store.exists()
+
+
+def test_write_repairs_length_and_backs_up(tmp_path):
+    device = tmp_path / 'Track_1_Chord_Lab.amxd'
+    original = _write_stale_device(device)
+    store = tmp_path / 'store.db'
+    result = plan_device_fix(device, 'Chord Lab', EXPECTED, store_path=store)
+    assert result['error'] is None and result['written'] is True
+
+    container = AmxdContainer.read(device, strict=True)
+    assert not container.stale_length
+    patcher = container.patcher()
+    assert patcher['patcher']['boxes'][0]['box']['textfile']['filename'] == EXPECTED
+    assert patcher['patcher']['boxes'][1]['box']['text'] == 'Accord ♪'
+
+    with BackupStore(store) as backups:
+        assert backups.read(result['backup']) == original
+
+    # A second run finds nothing left to fix
+    again = plan_device_fix(device, 'Chord Lab', EXPECTED, store_path=store)
+    assert again['changes'] == [] and again['written'] is False
@@ -0,0 +1,53 @@
+"""json_spans: in-place value replacement on raw patcher bytes"""
+
+import json
+
+import pytest
+
+from json_spans import replace_values
+
+DOC = '''{
+\t"patcher" : {
+\t\t"boxes" : [ {
+\t\t\t"box" : {
+\t\t\t\t"code" : "post(\\"}]\\\\\\\\\\");\\n",
+\t\t\t\t"text" : "node.script \\"old\\".js",
+\t\t\t\t"textfile" : {
+\t\t\t\t\t"filename" : "C:\\\\Users\\\\old.js"
+\t\t\t\t}
+\t\t\t}
+\t\t}, {
+\t\t\t"box" : {
+\t\t\t\t"text" : "comment Accord ♪ 🎸"
+\t\t\t}
+\t\t} ]
+\t}
+}
+'''.encode('utf-8')
+
+
+def test_replace_escaped_string():
+    path = ('patcher', 'boxes', 0, 'box', 'textfile', 'filename')
+    out = replace_values(DOC, {path: 'track_1_chord_lab/"logic".js'})
+    box = json.loads(out)['patcher']['boxes'][0]['box']
+    assert box['textfile']['filename'] == 'track_1_chord_lab/"logic".js'
+    assert box['code'] == 'post("}]\\\\");\n'
+    assert out.replace(b'"track_1_chord_lab/\\"logic\\".js"', b'"C:\\\\Users\\\\old.js"') == DOC
+
+
+def test_replace_after_unicode_and_with_unicode():
+    changes = {
+        ('patcher', 'boxes', 0, 'box', 'text'): 'node.script "new".js',
+        ('patcher', 'boxes', 1, 'box', 'text'): 'comment Café ♫',
+    }
+    out = replace_values(DOC, changes)
+    boxes = json.loads(out)['patcher']['boxes']
+    assert boxes[0]['box']['text'] == 'node.script "new".js'
+    assert boxes[1]['box']['text'] == 'comment Café ♫'
+    # Non-ASCII is written as UTF-8, the way Max saves it
+    assert 'Café ♫'.encode('utf-8') in out
+
+
+def test_missing_path():
+    with pytest.raises(KeyError):
+        replace_values(DOC, {('patcher', 'boxes', 2, 'box', 'text'): 'x'})
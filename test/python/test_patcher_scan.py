@@ -0,0 +1,45 @@
+"""patcher_scan: pruning and streaming of device payloads"""
+
+import json
+import tracemalloc
+
+from patcher_scan import scan_patcher
+
+BLOB = 4 << 20
+
+
+def _write_device(path, boxes):
+    patcher = {'patcher': {'boxes': [{'box': box} for box in boxes], 'lines': []}}
+    path.write_text(json.dumps(patcher, indent='\t'), encoding='utf-8')
+    return path
+
+
+def _scan_peak(path, classes):
+    tracemalloc.start()
+    try:
+        patcher = scan_patcher(path, classes, chunk_size=4096)
+        return patcher, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_box_level_blob_is_skipped(tmp_path):
+    # "data" sorts before "text", so the box is not yet known to match
+    device = _write_device(tmp_path / 'blob.maxpat', [
+        {'data': 'x' * BLOB, 'id': 'obj-1', 'maxclass': 'newobj', 'text': 'node.script a.js'},
+        {'data': 'y' * BLOB, 'id': 'obj-2', 'maxclass': 'newobj', 'text': 'print'},
+    ])
+    patcher, peak = _scan_peak(device, ['node.script'])
+    boxes = patcher['patcher']['boxes']
+    assert boxes == [{'box': {'id': 'obj-1', 'maxclass': 'newobj', 'text': 'node.script a.js'}}]
+    assert peak < BLOB // 4
+
+
+def test_small_box_blob_is_dropped(tmp_path):
+    device = _write_device(tmp_path / 'small.maxpat', [
+        {'code': 'out1 = in1;', 'id': 'obj-1', 'maxclass': 'newobj', 'text': 'node.script a.js',
+         'textfile': {'filename': 'a.js', 'text': 'inlets = 1;'}},
+    ])
+    box = scan_patcher(device, ['node.script'])['patcher']['boxes'][0]['box']
+    assert box == {'id': 'obj-1', 'maxclass': 'newobj', 'text': 'node.script a.js',
+                   'textfile': {'filename': 'a.js'}}
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Resident Tool Service
+Keeps the compiled template and device analyses warm behind JSON-RPC
+
+Every generator and checker otherwise starts a fresh interpreter and
+re-parses the same template and devices. The service is started once:
+
+    python3 tool_service.py serve                  # Unix socket (default)
+    python3 tool_service.py serve --port 8765      # or 127.0.0.1 TCP
+
+and answers line-delimited JSON-RPC 2.0, one request object (or batch
+array) per line:
+
+    {"jsonrpc": "2.0", "id": 1, "method": "analyze", "params": {}}
+
+Methods:
+
+    analyze   {paths?, manifest?, rules?}      check_device() results
+    fix       {paths?, manifest?, dry_run?}    plan_device_fix() results (a dry
+                                               run unless dry_run is false)
+    generate  {output, tracks?, tempo?, scene_count?, scene_names?,
+               song?, template?, compression?, threads?}
+                                               render_variant() summary
+    export    {song, output, template?, compression?, threads?}
+                                               a song dump rendered as a set
+    validate  {dump, schema?}                  Global Brain dump violations
+    stats / invalidate / ping / shutdown
+
+Kept in memory, each keyed by the file's size and mtime so edits are
+picked up on the next call: the SetPrototype per template, the check
+result per device and job, and the compiled schema. From a build script
+use call(); from node.script, write the line to
+net.createConnection(socketPath) and read one line back.
+"""
+
+import argparse
+import inspect
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from pathlib import Path
+
+import analyze_devices
+from device_rules import load_rule_config, rules_for_role
+from fix_devices import plan_device_fix
+from gzip_writer import compression_level
+from set_factory import compile_template, render_variant
+from create_power_trio_set import TEMPLATE_PATH
+from validate_brain import SCHEMA_PATH, format_path, load_schema, validate_file
+
+SOCKET_PATH = Path.home() / '.cache' / 'powertrio' / 'tool_service.sock'
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+
+class RpcError(Exception):
+    """An error returned to the caller as a JSON-RPC error object"""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+class WarmCache:
+    """path-keyed values rebuilt whenever the file's size or mtime changes"""
+
+    def __init__(self, build):
+        self.build = build
+        self.entries = {}       # key -> (stat, value)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, path, *args):
+        """build(path, *args), reused until the file changes"""
+        key = (str(path),) + args
+        stat = _stat_key(path)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == stat:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = self.build(path, *args)
+        with self.lock:
+            self.entries[key] = (stat, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+def _check_job(path, job):
+    return analyze_devices.check_device(*job)
+
+
+class ToolService:
+    """The methods behind the socket, with their warm state"""
+
+    def __init__(self):
+        self.templates = WarmCache(compile_template)
+        self.devices = WarmCache(_check_job)
+        self.schemas = WarmCache(load_schema)
+        self.started = time.time()
+        self.calls = 0
+        self.stopping = False
+
+    def dispatch(self, method, params):
+        func = getattr(self, f'rpc_{method}', None)
+        if func is None:
+            raise RpcError(METHOD_NOT_FOUND, f"Unknown method '{method}'")
+        if not isinstance(params, dict):
+            raise RpcError(INVALID_PARAMS, "params must be an object")
+        try:
+            inspect.signature(func).bind(**params)
+        except TypeError as e:
+            raise RpcError(INVALID_PARAMS, f"{method}: {e}") from None
+        self.calls += 1
+        return func(**params)
+
+    # -- devices --------------------------------------------------------------
+
+    def _jobs(self, paths=None, manifest=None, rules=None):
+        manifest = (analyze_devices.load_manifest(manifest) if manifest
+                    else analyze_devices.default_manifest())
+        rule_config = load_rule_config(rules) if rules else None
+        if paths:
+            return analyze_devices.build_jobs(analyze_devices.expand_paths(paths),
+                                              manifest, rule_config)
+        jobs = []
+        for filename, name, script, role in analyze_devices.DEVICES:
+            path = analyze_devices.DEVICES_DIR / filename
+            if path.exists():
+                jobs.append((str(path), name, script, role,
+                             tuple(rules_for_role(role, rule_config))))
+        return jobs
+
+    def rpc_analyze(self, paths=None, manifest=None, rules=None):
+        """check_device() for every device, answered from memory when unchanged"""
+        return [self.devices.get(job[0], job) for job in self._jobs(paths, manifest, rules)]
+
+    def rpc_fix(self, paths=None, manifest=None, dry_run=True):
+        """plan_device_fix() for every device
+
+        Devices are only rewritten when the caller passes dry_run false,
+        the counterpart of fix_devices.py --yes.
+        """
+        return [plan_device_fix(job[0], job[1], job[2], dry_run)
+                for job in self._jobs(paths, manifest)]
+
+    # -- sets -----------------------------------------------------------------
+
+    def rpc_generate(self, output, tracks=None, tempo=None, scene_count=None,
+                     scene_names=None, song=None, template=None, compression='max',
+                     threads=None):
+        """Render one set from the warm template prototype"""
+        prototype = self.templates.get(Path(template or TEMPLATE_PATH))
+        output = Path(output)
+        variant = {'output': output.name, 'tracks': tracks, 'tempo': tempo,
+                   'scene_count': scene_count, 'scene_names': scene_names, 'song': song}
+        return render_variant(variant, output.parent, prototype,
+                              compression_level(str(compression)), threads)
+
+    def rpc_export(self, song, output, template=None, compression='max', threads=None):
+        """A Global Brain song dump as a set with its chord clips"""
+        if not Path(song).exists():
+            raise RpcError(INVALID_PARAMS, f"Song dump not found: {song}")
+        return self.rpc_generate(output, song=song, template=template,
+                                 compression=compression, threads=threads)
+
+    # -- dumps ----------------------------------------------------------------
+
+    def rpc_validate(self, dump, schema=None):
+        """Violations of a Global Brain dump against the schema"""
+        node = self.schemas.get(Path(schema or SCHEMA_PATH))
+        violations = validate_file(dump, node)
+        return {'valid': not violations,
+                'violations': [{'path': format_path(v.path), 'message': v.message}
+                               for v in violations]}
+
+    # -- housekeeping ---------------------------------------------------------
+
+    def rpc_ping(self):
+        return {'pid': os.getpid(), 'uptime_s': round(time.time() - self.started, 1)}
+
+    def rpc_stats(self):
+        return {'calls': self.calls, 'templates': self.templates.stats(),
+                'devices': self.devices.stats(), 'schemas': self.schemas.stats()}
+
+    def rpc_invalidate(self):
+        """Drop every warm entry"""
+        for cache in (self.templates, self.devices, self.schemas):
+            cache.clear()
+        return True
+
+    def rpc_shutdown(self):
+        """Stop once the reply has been sent"""
+        self.stopping = True
+        return True
+
+
+def handle_request(service, request):
+    """One JSON-RPC request object -> response object (None for a notification)"""
+    req_id = request.get('id') if isinstance(request, dict) else None
+    try:
+        if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+            raise RpcError(INVALID_REQUEST, "Expected a JSON-RPC request object")
+        result = service.dispatch(request['method'], request.get('params') or {})
+        response = {'jsonrpc': '2.0', 'id': req_id, 'result': result}
+    except RpcError as e:
+        response = {'jsonrpc': '2.0', 'id': req_id,
+                    'error': {'code': e.code, 'message': str(e)}}
+    except Exception as e:      # keep serving; the caller gets the error
+        response = {'jsonrpc': '2.0', 'id': req_id,
+                    'error': {'code': SERVER_ERROR, 'message': f"{type(e).__name__}: {e}"}}
+    if isinstance(request, dict) and 'id' not in request:
+        return None
+    return response
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        service = self.server.service
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            started = time.perf_counter()
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                request = None
+                reply = {'jsonrpc': '2.0', 'id': None,
+                         'error': {'code': PARSE_ERROR, 'message': str(e)}}
+            else:
+                if request == []:
+                    reply = {'jsonrpc': '2.0', 'id': None,
+                             'error': {'code': INVALID_REQUEST, 'message': "Empty batch"}}
+                elif isinstance(request, list):
+                    reply = [r for r in (handle_request(service, q) for q in request) if r]
+                else:
+                    reply = handle_request(service, request)
+            if reply:
+                self.wfile.write(json.dumps(reply, ensure_ascii=False).encode('utf-8') + b'\n')
+                self.wfile.flush()
+            if not self.server.quiet:
+                requests = request if isinstance(request, list) else [request]
+                methods = [q.get('method') if isinstance(q, dict) else '?' for q in requests]
+                elapsed = (time.perf_counter() - started) * 1000
+                print(f"📨 {', '.join(map(str, methods))} ({elapsed:.1f} ms)", file=sys.stderr)
+            if service.stopping:
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TcpServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def _claim_socket(path):
+    """Remove a stale socket file; refuse if a service is listening on it"""
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(str(path))
+    except OSError:
+        path.unlink()
+    else:
+        raise OSError(f"A service is already listening on {path}")
+    finally:
+        probe.close()
+
+
+def serve(socket_path=SOCKET_PATH, port=None, quiet=False):
+    """Run the service until shutdown or Ctrl-C"""
+    service = ToolService()
+    if port is not None:
+        server = _TcpServer(('127.0.0.1', port), _Handler)
+        where = f"127.0.0.1:{port}"
+    else:
+        socket_path = Path(socket_path)
+        _claim_socket(socket_path)
+        server = _UnixServer(str(socket_path), _Handler)
+        os.chmod(socket_path, 0o600)
+        where = str(socket_path)
+    server.service = service
+    server.quiet = quiet
+    print(f"🛎️  Tool service listening on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if port is None:
+            Path(socket_path).unlink(missing_ok=True)
+        print("👋 Tool service stopped")
+
+
+def call(method, params=None, socket_path=SOCKET_PATH, port=None, timeout=300):
+    """Call one method on a running service and return its result
+
+    Raises RpcError for an error response and OSError if no service is
+    listening.
+    """
+    if port is not None:
+        sock = socket.create_connection(('127.0.0.1', port), timeout=timeout)
+    else:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(str(socket_path))
+    with sock, sock.makefile('rwb') as f:
+        request = {'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': params or {}}
+        f.write(json.dumps(request).encode('utf-8') + b'\n')
+        f.flush()
+        line = f.readline()
+    if not line:
+        raise OSError("Service closed the connection")
+    reply = json.loads(line)
+    if 'error' in reply:
+        raise RpcError(reply['error']['code'], reply['error']['message'])
+    return reply['result']
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Power Trio Arranger - Resident Tool Service")
+    parser.add_argument('--socket', default=str(SOCKET_PATH),
+                        help="Unix socket path (default: %(default)s)")
+    parser.add_argument('--port', type=int, help="use 127.0.0.1:PORT instead of the socket")
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve_cmd = sub.add_parser('serve', help="run the service")
+    serve_cmd.add_argument('--quiet', '-q', action='store_true', help="do not log requests")
+    call_cmd = sub.add_parser('call', help="call a method on a running service")
+    call_cmd.add_argument('method')
+    call_cmd.add_argument('params', nargs='?', default='{}', help="JSON object of parameters")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'serve':
+        try:
+            serve(args.socket, args.port, args.quiet)
+        except OSError as e:
+            print(f"❌ {e}")
+            return 1
+        return 0
+
+    try:
+        result = call(args.method, json.loads(args.params), args.socket, args.port)
+    except (OSError, ValueError, RpcError) as e:
+        print(f"❌ {e}")
+        return 1
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -36,7 +36,7 @@ const HW = require(
 );
 const {
   getActiveChord,
-  getSequencerBuffer,
+  getSequencerBuffer: requestSequencerBuffer,
   setSequencerBuffer,
   dictReplace,
 } = require(path.join(__dirname, "..", "shared", "dict_helpers.js"));
@@ -97,7 +97,7 @@ function pasteChordToStep(step, chordData) {
 }
 
 function getSequencerBuffer() {
-  getSequencerBuffer();
+  requestSequencerBuffer();
   
   // Check if dict response loop is wired
   if (!dictResponseReceived && !wiringWarningShown) {
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Track Prototypes and Pointee ID Allocation
+Stamps out tracks from a template track without deepcopy
+
+Every automatable parameter in a Live set owns a globally unique pointee
+id (AutomationTarget, ModulationTarget and its *ModulationTarget
+variants, ControllerTargets.N, Pointee), allocated below
+LiveSet/NextPointeeId, and PointeeId elements refer back to them.
+Copying a track therefore means giving all of these fresh ids and
+raising NextPointeeId past them.
+
+TrackPrototype serializes the template track once and precomputes where
+every id, pointee reference and header field sits in the bytes. A clone
+is then a join of the static segments with the new values: no deepcopy,
+no tree walk, linear in the track size. IdAllocator hands out contiguous
+id blocks starting at NextPointeeId.
+
+ClipSlotList contents are regenerated on render (one empty slot per
+scene, optionally filled with clip XML), so template clips are not
+carried into clones and the slot count always matches the scene count.
+"""
+
+import gzip
+import re
+import xml.etree.ElementTree as ET
+
+from als_patch import TRACK_FIELDS, encode_value
+from als_stream import AlsStream, ContainerRewrite, read_chunks, serialize_element
+
+# Elements whose Id attribute comes from the set-wide pointee id pool
+POINTEE_ID = re.compile(
+    rb'<(?:AutomationTarget|Pointee|[A-Za-z]*ModulationTarget|ControllerTargets\.\d+)'
+    rb' Id="(\d+)"')
+POINTEE_REF = re.compile(rb'<PointeeId Value="(\d+)"')
+CLIP_SLOT_LIST = re.compile(rb'<ClipSlotList>(.*?)</ClipSlotList>|<ClipSlotList />', re.S)
+TRACK_ID = re.compile(rb'^<\w+ Id="(\d+)"')
+
+EMPTY_CLIP_SLOT = (b'<ClipSlot Id="%d"><LomId Value="0" /><ClipSlot><Value />'
+                   b'</ClipSlot><HasStop Value="true" /><NeedRefreeze Value="true" />'
+                   b'</ClipSlot>')
+FILLED_CLIP_SLOT = (b'<ClipSlot Id="%d"><LomId Value="0" /><ClipSlot><Value>%s</Value>'
+                    b'</ClipSlot><HasStop Value="true" /><NeedRefreeze Value="true" />'
+                    b'</ClipSlot>')
+
+
+class IdAllocator:
+    """Contiguous pointee id blocks starting at a set's NextPointeeId"""
+
+    def __init__(self, next_id):
+        self.next_id = int(next_id)
+
+    def allocate(self, count):
+        """Reserve count ids and return the first one"""
+        first = self.next_id
+        self.next_id += count
+        return first
+
+
+def clip_slots(count, clips=None):
+    """Serialized ClipSlot elements for a ClipSlotList
+
+    clips maps slot index -> serialized clip XML (e.g. a MidiClip).
+    """
+    clips = clips or {}
+    parts = []
+    for i in range(count):
+        if i in clips:
+            parts.append(FILLED_CLIP_SLOT % (i, serialize_element(clips[i])))
+        else:
+            parts.append(EMPTY_CLIP_SLOT % i)
+    return b''.join(parts)
+
+
+def scene_list(scene, count, names=None):
+    """Yield count serialized Scene elements cloned from one template scene
+
+    names optionally sets each scene's Name by index.
+    """
+    scene = serialize_element(scene)
+    for i in range(count):
+        xml = re.sub(rb'^<Scene Id="\d+"', b'<Scene Id="%d"' % i, scene)
+        if names and i < len(names):
+            name = b'<Name Value="' + encode_value(names[i]) + b'" />'
+            xml = re.sub(rb'<Name Value="[^"]*" />', lambda m: name, xml, count=1)
+        yield xml
+
+
+class TrackPrototype:
+    """A template track precompiled into static segments and value slots"""
+
+    def __init__(self, track):
+        raw = serialize_element(track) if isinstance(track, ET.Element) else bytes(track)
+        self.tag = re.match(rb'<(\w+)', raw).group(1).decode()
+
+        slot_lists = [(m.start(), m.end()) for m in CLIP_SLOT_LIST.finditer(raw)]
+        self.scene_count = 0
+        for m in CLIP_SLOT_LIST.finditer(raw):
+            self.scene_count = max(self.scene_count, (m.group(1) or b'').count(b'<ClipSlot Id="'))
+
+        def outside_slot_lists(pos):
+            return not any(start <= pos < end for start, end in slot_lists)
+
+        ops = []  # (start, end, op)
+        m = TRACK_ID.match(raw)
+        if m:
+            ops.append((m.start(1), m.end(1), ('track_id',)))
+
+        ordinals = {}
+        for m in POINTEE_ID.finditer(raw):
+            if outside_slot_lists(m.start()):
+                ordinal = ordinals.setdefault(m.group(1), len(ordinals))
+                ops.append((m.start(1), m.end(1), ('id', ordinal)))
+        for m in POINTEE_REF.finditer(raw):
+            if m.group(1) in ordinals and outside_slot_lists(m.start()):
+                ops.append((m.start(1), m.end(1), ('id', ordinals[m.group(1)])))
+        self.id_count = len(ordinals)
+
+        for key, tag in TRACK_FIELDS.items():
+            m = re.search(b'<' + tag.encode() + rb' Value="([^"]*)"', raw)
+            if m and not any(s <= m.start() < e for s, e, _ in ops):
+                ops.append((m.start(1), m.end(1), ('field', key, m.group(1))))
+
+        for start, end in slot_lists:
+            ops.append((start, end, ('slots',)))
+
+        ops.sort()
+        self._segments = []
+        self._ops = []
+        pos = 0
+        for start, end, op in ops:
+            self._segments.append(raw[pos:start])
+            self._ops.append(op)
+            pos = end
+        self._segments.append(raw[pos:])
+
+    def render(self, track_id, first_id, fields=None, scene_count=None, clips=None):
+        """Serialize one clone
+
+        first_id is the start of a block of id_count pointee ids (see
+        IdAllocator). fields maps TRACK_FIELDS keys to new values.
+        scene_count sets the number of clip slots (default: as in the
+        template); clips fills main-sequencer slots by index.
+        """
+        fields = fields or {}
+        scene_count = self.scene_count if scene_count is None else scene_count
+        out = [self._segments[0]]
+        slot_list = 0
+        for op, segment in zip(self._ops, self._segments[1:]):
+            kind = op[0]
+            if kind == 'id':
+                out.append(b'%d' % (first_id + op[1]))
+            elif kind == 'track_id':
+                out.append(b'%d' % track_id)
+            elif kind == 'field':
+                value = fields.get(op[1])
+                out.append(op[2] if value is None else encode_value(value))
+            else:
+                # First ClipSlotList is the MainSequencer, later ones
+                # (FreezeSequencer) stay empty
+                slot_clips = clips if slot_list == 0 else None
+                out.append(b'<ClipSlotList>' + clip_slots(scene_count, slot_clips) +
+                           b'</ClipSlotList>')
+                slot_list += 1
+            out.append(segment)
+        return b''.join(out)
+
+
+def load_track_prototype(path, tag='MidiTrack'):
+    """Stream a set until its first `tag` track
+
+    Returns (TrackPrototype, next_pointee_id, scene_count); only the
+    beginning of the file is decompressed.
+    """
+    stream = AlsStream({'LiveSet/Tracks': ContainerRewrite()},
+                       watch={'LiveSet/NextPointeeId'})
+    with gzip.open(path, 'rb') as f:
+        for data in read_chunks(f):
+            stream.feed(data)
+            for _, elem in stream.ready:
+                if elem.tag == tag:
+                    next_id = int(stream.values['LiveSet/NextPointeeId']['Value'])
+                    prototype = TrackPrototype(elem)
+                    return prototype, next_id, prototype.scene_count
+            stream.ready.clear()
+    raise ValueError(f"No {tag} found in {path}")
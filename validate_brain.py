@@ -0,0 +1,688 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Global Brain Validator
+Validates ---power_trio_brain dumps against track_3_conductor/schema.json
+
+The schema is compiled once into a tree of SchemaNode objects. Each
+node's check() is a closure chain built from only the keywords that
+node uses, and properties/items are lookup tables. The dump is then
+read in chunks and walked key by key and item by item, with scalars
+decoded by the json module's C scanner and checked as they are read:
+
+- subtrees the schema does not constrain (pattern_bank with
+  additionalProperties: true, a bare {"type": "object"}) are only
+  scanned, whole if they fit in a chunk, else one level at a time
+- oneOf/anyOf whose branches differ by type (e.g. null or object
+  events) stream into the branch the token selects; other combinators
+  decode just that subtree and check it as a value
+
+Memory therefore stays at about two read chunks plus the largest
+combinator subtree, however many patterns the dump holds. Every
+violation is reported with its path, e.g. sequencer_buffer.events[12].
+
+Supported draft-07 keywords: type, enum, const, minimum, maximum,
+exclusiveMinimum, exclusiveMaximum, minLength, maxLength, pattern,
+properties, required, additionalProperties, items, minItems, maxItems,
+oneOf, anyOf, allOf and local $ref. Any other constraint keyword raises
+SchemaError rather than being ignored.
+"""
+
+import argparse
+import io
+import json
+import json.scanner
+import re
+import sys
+import time
+from collections import namedtuple
+from pathlib import Path
+
+PROJECT_ROOT = Path("/Users/Matthew/PowerTrioArranger")
+SCHEMA_PATH = PROJECT_ROOT / "track_3_conductor" / "schema.json"
+
+CHUNK_SIZE = 1 << 20
+
+# Keywords that document the schema without constraining values
+ANNOTATIONS = {'$schema', '$id', '$comment', 'title', 'description', 'default',
+               'examples', 'definitions'}
+
+Violation = namedtuple('Violation', ['path', 'message'])
+
+
+class SchemaError(ValueError):
+    """Raised when schema.json uses something the compiler does not support"""
+
+
+class DumpError(ValueError):
+    """Raised when a dump is not well-formed JSON"""
+
+
+# -- paths --------------------------------------------------------------------
+
+_IDENT = re.compile(r'[A-Za-z_][A-Za-z0-9_]*\Z')
+
+
+def format_path(path):
+    """('events', 12) -> 'events[12]'; the root is '$'"""
+    parts = []
+    for part in path:
+        if isinstance(part, int):
+            parts.append(f'[{part}]')
+        elif _IDENT.match(part):
+            parts.append(f'.{part}' if parts else part)
+        else:
+            parts.append(f'[{json.dumps(part)}]')
+    return ''.join(parts) or '$'
+
+
+# -- compiler -----------------------------------------------------------------
+
+def kind_of(value):
+    """JSON type name of a decoded value"""
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, int):
+        return 'integer'
+    if isinstance(value, float):
+        return 'number'
+    if isinstance(value, str):
+        return 'string'
+    if isinstance(value, list):
+        return 'array'
+    return 'object'
+
+
+def _is_integer(value):
+    return isinstance(value, int) and not isinstance(value, bool) or \
+        isinstance(value, float) and value.is_integer()
+
+
+TYPE_TESTS = {
+    'null': lambda v: v is None,
+    'boolean': lambda v: isinstance(v, bool),
+    'integer': _is_integer,
+    'number': lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    'string': lambda v: isinstance(v, str),
+    'array': lambda v: isinstance(v, list),
+    'object': lambda v: isinstance(v, dict),
+}
+
+# Token kinds each declared type accepts ('integer' tokens are numbers too)
+TYPE_KINDS = {
+    'null': {'null'}, 'boolean': {'boolean'}, 'integer': {'integer', 'number'},
+    'number': {'integer', 'number'}, 'string': {'string'},
+    'array': {'array'}, 'object': {'object'},
+}
+
+ANY = None            # child slot that accepts anything
+FORBIDDEN = False     # child slot that is not allowed at all
+
+
+class SchemaNode:
+    """One compiled schema: a check() closure plus streaming tables
+
+    stream is how the validator walks a container matched to this node:
+    'skip' (nothing to check inside), 'walk' (key/item tables below),
+    'select' (oneOf/anyOf branch chosen by token kind) or 'decode'
+    (decode the subtree and call check()).
+    """
+
+    def __init__(self):
+        self.types = None            # declared type names, None for any
+        self.kinds = None            # token kinds those types accept
+        self.check = None            # check(value, path, report)
+        self.properties = {}
+        self.extra = ANY             # additionalProperties
+        self.required = ()
+        self.items = ANY
+        self.tuple_items = None
+        self.min_items = None
+        self.max_items = None
+        self.by_kind = None          # token kind -> branch, for 'select'
+        self.stream = 'skip'
+
+
+def _type_name(node):
+    return ' or '.join(node.types)
+
+
+def _checks(checks):
+    """Fold a list of checks into one callable"""
+    if not checks:
+        return None
+    if len(checks) == 1:
+        return checks[0]
+
+    def check(value, path, report):
+        for c in checks:
+            c(value, path, report)
+    return check
+
+
+class _Compiler:
+
+    def __init__(self, root):
+        self.root = root
+        self.refs = {}
+
+    def resolve(self, ref):
+        if not ref.startswith('#'):
+            raise SchemaError(f"Only local $ref is supported, got {ref!r}")
+        if ref in self.refs:
+            return self.refs[ref]
+        target = self.root
+        for part in filter(None, ref[1:].split('/')):
+            part = part.replace('~1', '/').replace('~0', '~')
+            try:
+                target = target[int(part) if isinstance(target, list) else part]
+            except (KeyError, IndexError, ValueError):
+                raise SchemaError(f"Unresolvable $ref {ref!r}") from None
+        # Registered before compiling so recursive schemas terminate
+        node = self.refs[ref] = SchemaNode()
+        self.compile(target, node)
+        return node
+
+    def child(self, schema):
+        """Compile a subschema; True / {} accept anything, False nothing"""
+        if schema is True or schema == {}:
+            return ANY
+        if schema is False:
+            return FORBIDDEN
+        return self.compile(schema)
+
+    def compile(self, schema, node=None):
+        if not isinstance(schema, dict):
+            raise SchemaError(f"Schema must be an object, got {schema!r}")
+        node = node or SchemaNode()
+        if '$ref' in schema:
+            target = self.resolve(schema['$ref'])
+            node.__dict__.update(target.__dict__)
+            if target.check is None:        # recursive reference
+                node.check = lambda v, p, r: target.check(v, p, r)
+                node.stream = 'decode'
+            return node
+
+        unknown = set(schema) - ANNOTATIONS - _KEYWORDS
+        if unknown:
+            raise SchemaError(f"Unsupported schema keyword(s): {', '.join(sorted(unknown))}")
+
+        value_checks = []
+
+        types = schema.get('type')
+        if types is not None:
+            node.types = [types] if isinstance(types, str) else list(types)
+            tests = [TYPE_TESTS[t] for t in node.types]
+            node.kinds = set().union(*(TYPE_KINDS[t] for t in node.types))
+            name = _type_name(node)
+
+            def type_check(value, path, report, tests=tests, name=name):
+                if not any(test(value) for test in tests):
+                    report(Violation(path, f"expected {name}, got {kind_of(value)}"))
+            value_checks.append(type_check)
+
+        for keyword, build in _SCALAR_KEYWORDS.items():
+            if keyword in schema:
+                value_checks.append(build(schema[keyword], schema))
+
+        self._compile_object(schema, node, value_checks)
+        self._compile_array(schema, node, value_checks)
+        combinator = self._compile_branches(schema, node, value_checks)
+
+        node.check = _checks(value_checks) or (lambda v, p, r: None)
+
+        if combinator:
+            node.stream = 'select' if node.by_kind is not None else 'decode'
+        elif node.properties or node.extra is not ANY or node.required or \
+                node.items is not ANY or node.tuple_items is not None or \
+                node.min_items is not None or node.max_items is not None:
+            node.stream = 'walk'
+        return node
+
+    def _compile_object(self, schema, node, value_checks):
+        node.properties = {k: self.child(s) for k, s in schema.get('properties', {}).items()}
+        node.extra = self.child(schema.get('additionalProperties', True))
+        node.required = tuple(schema.get('required', ()))
+        if not (node.properties or node.extra is not ANY or node.required):
+            return
+        properties, extra, required = node.properties, node.extra, node.required
+
+        def object_check(value, path, report):
+            if not isinstance(value, dict):
+                return
+            for key, item in value.items():
+                child = properties.get(key, extra)
+                if child is FORBIDDEN:
+                    report(Violation(path + (key,), "unexpected key"))
+                elif child is not ANY:
+                    child.check(item, path + (key,), report)
+            for key in required:
+                if key not in value:
+                    report(Violation(path, f"missing required key '{key}'"))
+        value_checks.append(object_check)
+
+    def _compile_array(self, schema, node, value_checks):
+        items = schema.get('items', True)
+        if isinstance(items, list):
+            node.tuple_items = [self.child(s) for s in items]
+            node.items = self.child(schema.get('additionalItems', True))
+        else:
+            node.items = self.child(items)
+        node.min_items = schema.get('minItems')
+        node.max_items = schema.get('maxItems')
+        if node.items is ANY and node.tuple_items is None and \
+                node.min_items is None and node.max_items is None:
+            return
+        tuple_items, items = node.tuple_items or [], node.items
+
+        def array_check(value, path, report):
+            if not isinstance(value, list):
+                return
+            for i, item in enumerate(value):
+                child = tuple_items[i] if i < len(tuple_items) else items
+                if child is FORBIDDEN:
+                    report(Violation(path + (i,), "unexpected item"))
+                elif child is not ANY:
+                    child.check(item, path + (i,), report)
+            _count_check(len(value), node, path, report)
+        value_checks.append(array_check)
+
+    def _compile_branches(self, schema, node, value_checks):
+        found = False
+        for keyword in ('allOf', 'anyOf', 'oneOf'):
+            if keyword not in schema:
+                continue
+            found = True
+            branches = [self.compile(s) if isinstance(s, dict) else self.child(s)
+                        for s in schema[keyword]]
+            value_checks.append(_branch_check(keyword, branches))
+            if keyword != 'allOf' and len(schema.keys() - ANNOTATIONS) == 1:
+                node.by_kind = _branches_by_kind(branches)
+        return found
+
+
+def _count_check(count, node, path, report):
+    if node.min_items is not None and count < node.min_items:
+        report(Violation(path, f"has {count} items, fewer than minItems {node.min_items}"))
+    if node.max_items is not None and count > node.max_items:
+        report(Violation(path, f"has {count} items, more than maxItems {node.max_items}"))
+
+
+def _branch_check(keyword, branches):
+    def failures(value, path, branch):
+        if branch is ANY:
+            return []
+        if branch is FORBIDDEN:
+            return [Violation(path, "not allowed")]
+        found = []
+        branch.check(value, path, found.append)
+        return found
+
+    if keyword == 'allOf':
+        def check(value, path, report):
+            for branch in branches:
+                for violation in failures(value, path, branch):
+                    report(violation)
+        return check
+
+    def check(value, path, report):
+        matched = sum(1 for branch in branches if not failures(value, path, branch))
+        if matched == 0:
+            report(Violation(path, f"matches none of the {keyword} schemas"))
+        elif keyword == 'oneOf' and matched > 1:
+            report(Violation(path, f"matches {matched} of the oneOf schemas"))
+    return check
+
+
+def _branches_by_kind(branches):
+    """token kind -> branch when every branch has its own distinct types"""
+    by_kind = {}
+    for branch in branches:
+        if not isinstance(branch, SchemaNode) or branch.kinds is None:
+            return None
+        for kind in branch.kinds:
+            if kind in by_kind:
+                return None
+            by_kind[kind] = branch
+    return by_kind
+
+
+def _enum(values, schema):
+    allowed = list(values)
+
+    def check(value, path, report):
+        if not any(value == a and kind_of(value) == kind_of(a) or
+                   _is_number(value) and _is_number(a) and value == a for a in allowed):
+            report(Violation(path, f"{value!r} is not one of {allowed!r}"))
+    return check
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _bound(keyword, op, text):
+    def build(limit, schema):
+        def check(value, path, report):
+            if _is_number(value) and not op(value, limit):
+                report(Violation(path, f"{value!r} is {text} {keyword} {limit!r}"))
+        return check
+    return build
+
+
+def _length(keyword, op, text):
+    def build(limit, schema):
+        def check(value, path, report):
+            if isinstance(value, str) and not op(len(value), limit):
+                report(Violation(path, f"length {len(value)} is {text} {keyword} {limit}"))
+        return check
+    return build
+
+
+def _pattern(expr, schema):
+    regex = re.compile(expr)
+
+    def check(value, path, report):
+        if isinstance(value, str) and not regex.search(value):
+            report(Violation(path, f"{value!r} does not match pattern {expr!r}"))
+    return check
+
+
+_SCALAR_KEYWORDS = {
+    'enum': _enum,
+    'const': lambda value, schema: _enum([value], schema),
+    'minimum': _bound('minimum', lambda v, l: v >= l, 'below'),
+    'maximum': _bound('maximum', lambda v, l: v <= l, 'above'),
+    'exclusiveMinimum': _bound('exclusiveMinimum', lambda v, l: v > l, 'not above'),
+    'exclusiveMaximum': _bound('exclusiveMaximum', lambda v, l: v < l, 'not below'),
+    'minLength': _length('minLength', lambda n, l: n >= l, 'below'),
+    'maxLength': _length('maxLength', lambda n, l: n <= l, 'above'),
+    'pattern': _pattern,
+}
+
+_KEYWORDS = set(_SCALAR_KEYWORDS) | {
+    'type', 'properties', 'required', 'additionalProperties', 'items', 'additionalItems',
+    'minItems', 'maxItems', 'oneOf', 'anyOf', 'allOf', '$ref',
+}
+
+
+def compile_schema(schema):
+    """Compile a JSON schema (dict) into its root SchemaNode"""
+    return _Compiler(schema).compile(schema)
+
+
+def load_schema(path=SCHEMA_PATH):
+    """Read and compile a schema file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return compile_schema(json.load(f))
+
+
+# -- streaming validator ------------------------------------------------------
+
+_PUNCT = re.compile(r'[ \t\r\n]*([{}\[\],:])')
+_WS = re.compile(r'[ \t\r\n]*')
+_NUMBER_TAIL = re.compile(r'[0-9.eE+-]*')
+# The json module's C scanner decodes one complete value at an offset
+_scan = json.scanner.make_scanner(json.JSONDecoder())
+
+
+class _StreamValidator:
+    """Recursive descent over a chunked text buffer, driven by SchemaNodes
+
+    Punctuation is matched here; every scalar and every skipped or
+    decoded subtree that fits in the buffer goes through the C scanner.
+    """
+
+    def __init__(self, fileobj, report, chunk_size=CHUNK_SIZE):
+        self.fileobj = io.TextIOWrapper(fileobj, encoding='utf-8')
+        self.report = report
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.base = 0            # dump offset (characters) of buf[0]
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.fileobj.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+        self.base += self.pos
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+
+    def error(self, message):
+        return DumpError(f"{message} at character {self.base + self.pos}")
+
+    def peek(self):
+        """Next non-whitespace character ('' at the end of the dump)"""
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos:self.pos + 1]
+            self._fill()
+
+    def punct(self, allowed):
+        self.peek()
+        m = _PUNCT.match(self.buf, self.pos)
+        if m is None or m.group(1) not in allowed:
+            raise self.error(f"Expected one of {allowed!r}")
+        self.pos = m.end()
+        return m.group(1)
+
+    def _try_scan(self):
+        try:
+            value, end = _scan(self.buf, self.pos)
+        except (StopIteration, ValueError):
+            return False, None
+        # A number cut off by the end of the buffer ("2." of "2.5") may
+        # continue in the next chunk
+        if not self.eof and _is_number(value) and \
+                _NUMBER_TAIL.match(self.buf, end).end() == len(self.buf):
+            return False, None
+        self.pos = end
+        return True, value
+
+    def decode(self):
+        """Decode the next complete value, reading as far as it extends"""
+        self.peek()
+        while True:
+            ok, value = self._try_scan()
+            if ok:
+                return value
+            if self.eof:
+                raise self.error("Invalid JSON")
+            self._fill()
+
+    def skip(self):
+        """Skip the next value without checking it
+
+        Containers that fit in the buffer (after at most one more chunk)
+        are scanned whole; larger ones are walked one level at a time, so
+        memory stays bounded.
+        """
+        if self.peek() not in ('{', '['):
+            return self.decode()
+        while True:
+            ok, _ = self._try_scan()
+            if ok:
+                return
+            if self.eof:
+                raise self.error("Invalid JSON")
+            if len(self.buf) - self.pos >= self.chunk_size:
+                break
+            self._fill()
+        if self.punct('{[') == '{':
+            if self.peek() == '}':
+                return self.punct('}')
+            while True:
+                self.key()
+                self.skip()
+                if self.punct(',}') == '}':
+                    return
+        if self.peek() == ']':
+            return self.punct(']')
+        while True:
+            self.skip()
+            if self.punct(',]') == ']':
+                return
+
+    def key(self):
+        if self.peek() != '"':
+            raise self.error("Expected an object key")
+        key = self.decode()
+        self.punct(':')
+        return key
+
+    def value(self, node, path):
+        char = self.peek()
+        if char not in ('{', '['):
+            if node is ANY:
+                self.decode()
+            else:
+                node.check(self.decode(), path, self.report)
+            return
+        if node is ANY:
+            return self.skip()
+        kind = 'object' if char == '{' else 'array'
+        if node.kinds is not None and kind not in node.kinds:
+            self.report(Violation(path, f"expected {_type_name(node)}, got {kind}"))
+            return self.skip()
+        stream = node.stream
+        if stream == 'select':
+            branch = node.by_kind.get(kind)
+            if branch is None:
+                self.report(Violation(path, "matches none of the oneOf schemas"))
+                return self.skip()
+            node, stream = branch, branch.stream
+        if stream == 'skip':
+            return self.skip()
+        if stream == 'decode':
+            return node.check(self.decode(), path, self.report)
+        self.punct(char)
+        if kind == 'object':
+            return self.object(node, path)
+        return self.array(node, path)
+
+    def object(self, node, path):
+        properties, extra = node.properties, node.extra
+        seen = set()
+        if self.peek() == '}':
+            self.punct('}')
+        else:
+            while True:
+                key = self.key()
+                child = properties.get(key, extra)
+                if child is FORBIDDEN:
+                    self.report(Violation(path + (key,), "unexpected key"))
+                    child = ANY
+                self.value(child, path + (key,))
+                seen.add(key)
+                if self.punct(',}') == '}':
+                    break
+        for key in node.required:
+            if key not in seen:
+                self.report(Violation(path, f"missing required key '{key}'"))
+
+    def array(self, node, path):
+        tuple_items = node.tuple_items or ()
+        count = 0
+        if self.peek() == ']':
+            self.punct(']')
+        else:
+            while True:
+                child = tuple_items[count] if count < len(tuple_items) else node.items
+                if child is FORBIDDEN:
+                    self.report(Violation(path + (count,), "unexpected item"))
+                    child = ANY
+                self.value(child, path + (count,))
+                count += 1
+                if self.punct(',]') == ']':
+                    break
+        _count_check(count, node, path, self.report)
+
+    def run(self, node):
+        if self.peek() == '':
+            raise self.error("Empty dump")
+        self.value(node, ())
+        if self.peek() != '':
+            raise self.error("Trailing data after the dump")
+
+
+def validate_stream(fileobj, node, report, chunk_size=CHUNK_SIZE):
+    """Validate a binary JSON stream against a compiled schema
+
+    report(Violation) is called for each violation as it is found.
+    Returns the number of characters read; raises DumpError on malformed
+    JSON.
+    """
+    validator = _StreamValidator(fileobj, report, chunk_size)
+    try:
+        validator.run(node)
+    finally:
+        validator.fileobj.detach()      # leave fileobj open for the caller
+    return validator.base + len(validator.buf)
+
+
+def validate_file(path, node, chunk_size=CHUNK_SIZE):
+    """Validate a dump file; returns the list of violations"""
+    violations = []
+    with open(path, 'rb') as f:
+        validate_stream(f, node, violations.append, chunk_size)
+    return violations
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Power Trio Arranger - Global Brain Validator")
+    parser.add_argument('dumps', nargs='+', help="dict dump JSON files ('-' for stdin)")
+    parser.add_argument('--schema', default=str(SCHEMA_PATH),
+                        help="JSON schema (default: %(default)s)")
+    parser.add_argument('--ndjson', action='store_true',
+                        help="print each violation as an NDJSON line")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        node = load_schema(args.schema)
+    except (OSError, ValueError) as e:
+        print(f"❌ Could not load schema {args.schema}: {e}")
+        return 2
+
+    status = 0
+    for dump in args.dumps:
+        count = 0
+
+        def report(violation):
+            nonlocal count
+            count += 1
+            if args.ndjson:
+                print(json.dumps({'file': dump, 'path': format_path(violation.path),
+                                  'message': violation.message}, ensure_ascii=False))
+            else:
+                print(f"   ❌ {format_path(violation.path)}: {violation.message}")
+
+        if not args.ndjson:
+            print(f"📋 {dump}")
+        started = time.perf_counter()
+        try:
+            if dump == '-':
+                size = validate_stream(sys.stdin.buffer, node, report)
+            else:
+                with open(dump, 'rb') as f:
+                    size = validate_stream(f, node, report)
+        except (OSError, DumpError) as e:
+            print(f"   ❌ {e}", file=sys.stderr if args.ndjson else sys.stdout)
+            status = 2
+            continue
+        elapsed = (time.perf_counter() - started) * 1000
+        if count:
+            status = max(status, 1)
+        if not args.ndjson:
+            verdict = f"{count} violation(s)" if count else "valid"
+            print(f"   {'❌' if count else '✅'} {verdict} "
+                  f"({size / 1e6:.1f}M characters, {elapsed:.0f} ms)")
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Power Trio Arranger - Device Watcher
+Re-checks devices incrementally while .amxd files and scripts are edited
+
+The watcher checks every device once at startup, then keeps the parsed
+patchers, results and the script dependency graph in memory:
+
+- a changed device is re-read and re-checked on its own
+- a changed .js file re-checks only the devices whose node.script is
+  that file, or requires it (directly or through other scripts); their
+  cached patchers are re-checked without reading the device again
+- node.script targets and relative require()s that do not resolve to a
+  file under the project root are reported as issues
+
+Changes come from inotify on Linux (through libc, no extra packages) and
+from polling size/mtime everywhere else or with --poll.
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+from amxd_container import extract_patcher
+from analyze_devices import (DEVICE_EXTENSIONS, DEVICES_DIR, build_jobs, check_device,
+                             default_manifest, expand_paths, load_manifest)
+from device_rules import load_rule_config
+from reference_index import (IGNORED_DIRS, SCRIPT_EXTENSIONS, iter_files, node_scripts,
+                             script_requires)
+
+PROJECT_ROOT = Path("/Users/Matthew/PowerTrioArranger")
+
+# -- change sources -----------------------------------------------------------
+
+class PollingWatcher:
+    """Finds changed files by comparing size and mtime on every scan"""
+
+    def __init__(self, roots, extensions, interval=0.25):
+        self.roots = roots
+        self.extensions = extensions
+        self.interval = interval
+        self._stats = self._scan()
+
+    def _scan(self):
+        return {path: (st.st_mtime_ns, st.st_size)
+                for path, st in iter_files(self.roots, self.extensions)}
+
+    def wait(self, timeout=None):
+        """Block until something changed; return the set of changed paths"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            time.sleep(self.interval)
+            stats = self._scan()
+            changed = {p for p in stats.keys() | self._stats.keys()
+                       if stats.get(p) != self._stats.get(p)}
+            self._stats = stats
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Linux inotify watches on every directory under the roots"""
+
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_ISDIR = 0x40000000
+    IN_CLOEXEC = 0o2000000
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, roots, extensions, settle=0.01):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.extensions = extensions
+        self.settle = settle
+        self.fd = self._libc.inotify_init1(self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}
+        for root in roots:
+            self._add_tree(Path(root))
+
+    @classmethod
+    def available(cls):
+        return sys.platform.startswith('linux') and ctypes.util.find_library('c') is not None
+
+    def _add_tree(self, root):
+        pending = [root]
+        while pending:
+            directory = pending.pop()
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+            if wd < 0:
+                continue
+            self._dirs[wd] = directory
+            try:
+                pending += [Path(e.path) for e in os.scandir(directory)
+                            if e.is_dir(follow_symlinks=False) and e.name not in IGNORED_DIRS]
+            except OSError:
+                pass
+
+    def _read(self, changed):
+        data = os.read(self.fd, 64 << 10)
+        pos = 0
+        while pos < len(data):
+            wd, mask, _, length = self.EVENT.unpack_from(data, pos)
+            pos += self.EVENT.size
+            name = data[pos:pos + length].rstrip(b'\0')
+            pos += length
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = directory / os.fsdecode(name)
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO) and path.name not in IGNORED_DIRS:
+                    self._add_tree(path)
+                    changed.update(p for p, _ in iter_files([path], self.extensions))
+            elif path.name.endswith(self.extensions):
+                changed.add(path)
+
+    def wait(self, timeout=None):
+        """Block until something changed; return the set of changed paths
+
+        Events arriving within the settle window of each other are
+        collected into one batch, so an editor's save is a single change.
+        """
+        changed = set()
+        wait = timeout
+        while True:
+            ready, _, _ = select.select([self.fd], [], [], wait)
+            if not ready:
+                return changed
+            self._read(changed)
+            if changed:
+                wait = self.settle
+
+    def close(self):
+        os.close(self.fd)
+
+
+def open_watcher(roots, extensions, poll=False, interval=0.25):
+    """inotify where available, else polling"""
+    if not poll and InotifyWatcher.available():
+        try:
+            return InotifyWatcher(roots, extensions)
+        except OSError as e:
+            print(f"⚠️  inotify unavailable ({e}), polling instead")
+    return PollingWatcher(roots, extensions, interval)
+
+
+# -- in-memory device index ---------------------------------------------------
+
+class DeviceState:
+    """Parsed patcher, last result and script references of one device"""
+
+    def __init__(self, job):
+        self.job = job
+        self.patcher = None
+        self.scripts = set()
+        self.result = None
+
+
+class DeviceIndex:
+    """Devices, their results and the script dependency graph"""
+
+    def __init__(self, root, device_paths, device_dirs, manifest, rule_config=None):
+        self.root = Path(root).resolve()
+        self.device_dirs = {Path(d).resolve() for d in device_dirs}
+        self.manifest = manifest
+        self.rule_config = rule_config
+        self.devices = {}
+        self.requires = {}       # script -> scripts it requires
+        for path, _ in iter_files([self.root], SCRIPT_EXTENSIONS):
+            self.requires[path.resolve()] = script_requires(path)
+        for path in device_paths:
+            self._add_device(Path(path).resolve())
+
+    def _add_device(self, path):
+        job = build_jobs([path], self.manifest, self.rule_config)[0]
+        self.devices[path] = DeviceState(job)
+
+    def resolve_script(self, name):
+        """Absolute path of a node.script target
+
+        Paths are relative to the root; a name that is not found there is
+        looked up by file name among the known scripts, the way Max finds
+        a bare 'logic.js' through its search path.
+        """
+        path = Path(name)
+        if not path.is_absolute():
+            path = Path(os.path.normpath(self.root / path))
+        if not path.is_file():
+            matches = [s for s in self.requires if s.name == path.name]
+            if len(matches) == 1:
+                return matches[0]
+        return path
+
+    def check(self, path, reread=True):
+        """(Re-)check one device; reread=False reuses the parsed patcher"""
+        state = self.devices[path]
+        if reread or state.patcher is None:
+            _, state.patcher = extract_patcher(path)
+            state.scripts = {self.resolve_script(n)
+                             for n in node_scripts(state.patcher or {})}
+        result = check_device(*state.job, patcher=state.patcher)
+        if state.patcher:
+            self._check_scripts(state, result)
+        state.result = result
+        return result
+
+    def _check_scripts(self, state, result):
+        for script in sorted(state.scripts):
+            if not script.is_file():
+                result['issues'].append(f"Script not found: {self._display(script)}")
+                continue
+            for dep in sorted(self.closure(script) - {script}):
+                if not dep.is_file():
+                    result['issues'].append(
+                        f"{self._display(script)} requires missing {self._display(dep)}")
+        result['scripts'] = [self._display(s) for s in sorted(state.scripts)]
+        result['ok'] = not result['issues']
+
+    def _display(self, path):
+        try:
+            return str(path.relative_to(self.root))
+        except ValueError:
+            return str(path)
+
+    def closure(self, script):
+        """script plus everything it requires, transitively"""
+        seen = {script}
+        pending = [script]
+        while pending:
+            for dep in self.requires.get(pending.pop(), ()):
+                if dep not in seen:
+                    seen.add(dep)
+                    pending.append(dep)
+        return seen
+
+    def dependents(self, script):
+        """Devices whose node.script is script or requires it"""
+        return [path for path, state in self.devices.items()
+                if any(script in self.closure(s) for s in state.scripts)]
+
+    def check_all(self):
+        return [self.check(path) for path in sorted(self.devices)]
+
+    def apply(self, changed):
+        """Re-check whatever the changed paths affect
+
+        Returns [(path, result or None)]; None means the device is gone.
+        """
+        reread, rerun = set(), set()
+        for path in changed:
+            path = Path(path).resolve()
+            if path.name.endswith(SCRIPT_EXTENSIONS):
+                if path.is_file():
+                    self.requires[path] = script_requires(path)
+                else:
+                    self.requires.pop(path, None)
+                rerun.update(self.dependents(path))
+            elif path.suffix in DEVICE_EXTENSIONS:
+                if path in self.devices or path.parent in self.device_dirs:
+                    reread.add(path)
+        report = []
+        for path in sorted(reread | rerun):
+            if not path.is_file():
+                if self.devices.pop(path, None) is not None:
+                    report.append((path, None))
+                continue
+            if path not in self.devices:
+                self._add_device(path)
+            report.append((path, self.check(path, reread=path in reread)))
+        return report
+
+
+# -- CLI ----------------------------------------------------------------------
+
+def print_result(path, result, elapsed_ms=None):
+    timing = f" ({elapsed_ms:.1f} ms)" if elapsed_ms is not None else ''
+    if result is None:
+        print(f"🗑️  {path.name} removed{timing}")
+        return
+    if result['ok']:
+        print(f"✅ {path.name}{timing}")
+        return
+    print(f"❌ {path.name}{timing}")
+    for issue in [result['error']] if result['error'] else result['issues']:
+        print(f"   ❌ {issue}")
+
+def emit_ndjson(path, result, elapsed_ms=None):
+    print(json.dumps({'file': str(path), 'removed': result is None,
+                      'elapsed_ms': elapsed_ms, 'result': result},
+                     ensure_ascii=False), flush=True)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Power Trio Arranger - Device Watcher")
+    parser.add_argument('paths', nargs='*',
+                        help=f"device files, directories or globs (default: {DEVICES_DIR})")
+    parser.add_argument('--root', default=str(PROJECT_ROOT),
+                        help="project root that node.script paths are relative to "
+                             "(default: %(default)s)")
+    parser.add_argument('--manifest', help="JSON manifest: filename -> {script, role, name}")
+    parser.add_argument('--rules', help="JSON rule config: role -> [rule names]")
+    parser.add_argument('--poll', action='store_true',
+                        help="poll for changes instead of using inotify")
+    parser.add_argument('--interval', type=float, default=0.25,
+                        help="polling interval in seconds (default: %(default)s)")
+    parser.add_argument('--ndjson', action='store_true',
+                        help="print each result as an NDJSON line instead of a report")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    manifest = load_manifest(args.manifest) if args.manifest else default_manifest()
+    rule_config = load_rule_config(args.rules) if args.rules else None
+    patterns = args.paths or [str(DEVICES_DIR)]
+    device_dirs = [p if Path(p).is_dir() else Path(p).parent for p in patterns]
+
+    started = time.perf_counter()
+    index = DeviceIndex(args.root, expand_paths(patterns), device_dirs, manifest, rule_config)
+    emit = emit_ndjson if args.ndjson else print_result
+    for path in sorted(index.devices):
+        emit(path, index.check(path))
+    if not args.ndjson:
+        print(f"\n👀 Watching {len(index.devices)} device(s) and {len(index.requires)} script(s) "
+              f"({(time.perf_counter() - started) * 1000:.0f} ms to index)")
+
+    roots = [index.root] + sorted(d for d in index.device_dirs
+                                  if index.root not in (d, *d.parents))
+    watcher = open_watcher(roots, DEVICE_EXTENSIONS + SCRIPT_EXTENSIONS,
+                           args.poll, args.interval)
+    try:
+        while True:
+            changed = watcher.wait()
+            if not changed:
+                continue
+            started = time.perf_counter()
+            report = index.apply(changed)
+            elapsed = (time.perf_counter() - started) * 1000
+            for path, result in report:
+                emit(path, result, elapsed)
+    except KeyboardInterrupt:
+        print("\n👋 Stopped watching")
+    finally:
+        watcher.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())